@@ -0,0 +1,184 @@
+-- Migration: server-side attendance summaries
+-- /api/attendance/summary/* call these functions through PostgREST (rpc) instead of
+-- the frontend pulling raw attendance_logs. Requires update_attendance_logs.sql
+-- (date, section_id, course_catalog_id columns).
+
+-- 1. Every summary filters on section, then subject and date
+CREATE INDEX IF NOT EXISTS attendance_logs_section_course_date_idx
+ON attendance_logs (section_id, course_catalog_id, date);
+
+-- 2. Per-section change counter, bumped once per statement that touches attendance_logs.
+-- The backend polls it (changed_at > last seen) to drop cached summaries of those sections.
+CREATE TABLE IF NOT EXISTS attendance_versions (
+    section_id UUID PRIMARY KEY,
+    version BIGINT DEFAULT 1 NOT NULL,
+    changed_at TIMESTAMPTZ DEFAULT now() NOT NULL
+);
+CREATE INDEX IF NOT EXISTS attendance_versions_changed_at_idx ON attendance_versions (changed_at);
+
+CREATE OR REPLACE FUNCTION bump_attendance_versions() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO attendance_versions AS v (section_id)
+        SELECT DISTINCT section_id FROM new_rows WHERE section_id IS NOT NULL
+        ON CONFLICT (section_id) DO UPDATE SET version = v.version + 1, changed_at = now();
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO attendance_versions AS v (section_id)
+        SELECT DISTINCT section_id FROM old_rows WHERE section_id IS NOT NULL
+        ON CONFLICT (section_id) DO UPDATE SET version = v.version + 1, changed_at = now();
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS attendance_logs_version_insert ON attendance_logs;
+CREATE TRIGGER attendance_logs_version_insert
+AFTER INSERT ON attendance_logs
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION bump_attendance_versions();
+
+DROP TRIGGER IF EXISTS attendance_logs_version_update ON attendance_logs;
+CREATE TRIGGER attendance_logs_version_update
+AFTER UPDATE ON attendance_logs
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION bump_attendance_versions();
+
+DROP TRIGGER IF EXISTS attendance_logs_version_delete ON attendance_logs;
+CREATE TRIGGER attendance_logs_version_delete
+AFTER DELETE ON attendance_logs
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION bump_attendance_versions();
+
+-- 3. Summaries. A session is a (routine, date) with at least one log in the section, so a
+-- double period (two routine slots of a subject on one day) is two sessions; a student
+-- attended it with a 'present' or 'late' row, matching the (student_id, routine_id, date)
+-- key of attendance_logs. Dates are inclusive, NULL = open.
+
+-- Per student and subject of one section (students with no logs included)
+CREATE OR REPLACE FUNCTION attendance_student_summary(
+    p_section_id UUID,
+    p_course_catalog_id UUID DEFAULT NULL,
+    p_from DATE DEFAULT NULL,
+    p_to DATE DEFAULT NULL
+)
+RETURNS TABLE (
+    student_id UUID,
+    roll_no TEXT,
+    student_name TEXT,
+    course_catalog_id UUID,
+    subject_code TEXT,
+    subject_name TEXT,
+    sessions BIGINT,
+    attended BIGINT,
+    last_present DATE
+)
+LANGUAGE sql STABLE AS $$
+    WITH logs AS (
+        SELECT al.student_id, al.routine_id, al.course_catalog_id, al.date, al.status
+        FROM attendance_logs al
+        WHERE al.section_id = p_section_id
+          AND al.course_catalog_id IS NOT NULL
+          AND (p_course_catalog_id IS NULL OR al.course_catalog_id = p_course_catalog_id)
+          AND (p_from IS NULL OR al.date >= p_from)
+          AND (p_to IS NULL OR al.date <= p_to)
+    ),
+    held AS (
+        SELECT course_catalog_id, count(DISTINCT (routine_id, date)) AS sessions FROM logs GROUP BY course_catalog_id
+    ),
+    present AS (
+        SELECT student_id, course_catalog_id, count(DISTINCT (routine_id, date)) AS attended, max(date) AS last_present
+        FROM logs WHERE status IN ('present', 'late')
+        GROUP BY student_id, course_catalog_id
+    )
+    SELECT st.id, st.student_id, p.name, h.course_catalog_id, cc.subject_code, cc.subject_name,
+           h.sessions, COALESCE(pr.attended, 0), pr.last_present
+    FROM students st
+    CROSS JOIN held h
+    JOIN course_catalog cc ON cc.id = h.course_catalog_id
+    LEFT JOIN profiles p ON p.id = st.profile_id
+    LEFT JOIN present pr ON pr.student_id = st.id AND pr.course_catalog_id = h.course_catalog_id
+    WHERE st.section_id = p_section_id
+$$;
+
+-- Per subject of one section
+CREATE OR REPLACE FUNCTION attendance_subject_summary(
+    p_section_id UUID,
+    p_from DATE DEFAULT NULL,
+    p_to DATE DEFAULT NULL
+)
+RETURNS TABLE (
+    course_catalog_id UUID,
+    subject_code TEXT,
+    subject_name TEXT,
+    sessions BIGINT,
+    students BIGINT,
+    attended BIGINT,
+    first_date DATE,
+    last_date DATE
+)
+LANGUAGE sql STABLE AS $$
+    SELECT al.course_catalog_id, cc.subject_code, cc.subject_name,
+           count(DISTINCT (al.routine_id, al.date)),
+           (SELECT count(*) FROM students st WHERE st.section_id = p_section_id),
+           count(DISTINCT (al.student_id, al.routine_id, al.date)) FILTER (WHERE al.status IN ('present', 'late')),
+           min(al.date), max(al.date)
+    FROM attendance_logs al
+    JOIN course_catalog cc ON cc.id = al.course_catalog_id
+    WHERE al.section_id = p_section_id
+      AND (p_from IS NULL OR al.date >= p_from)
+      AND (p_to IS NULL OR al.date <= p_to)
+    GROUP BY al.course_catalog_id, cc.subject_code, cc.subject_name
+$$;
+
+-- Per section of a faculty and/or batch (all sections when both are NULL)
+CREATE OR REPLACE FUNCTION attendance_section_summary(
+    p_faculty_id UUID DEFAULT NULL,
+    p_batch_id UUID DEFAULT NULL,
+    p_from DATE DEFAULT NULL,
+    p_to DATE DEFAULT NULL
+)
+RETURNS TABLE (
+    section_id UUID,
+    section_name TEXT,
+    batch_id UUID,
+    batch_name TEXT,
+    students BIGINT,
+    subjects BIGINT,
+    sessions BIGINT,
+    attended BIGINT
+)
+LANGUAGE sql STABLE AS $$
+    WITH scope AS (
+        SELECT s.id, s.name, b.id AS batch_id, b.name AS batch_name
+        FROM sections s JOIN batches b ON b.id = s.batch_id
+        WHERE (p_faculty_id IS NULL OR b.faculty_id = p_faculty_id)
+          AND (p_batch_id IS NULL OR b.id = p_batch_id)
+    ),
+    logs AS (
+        SELECT al.section_id,
+               count(DISTINCT al.course_catalog_id) AS subjects,
+               count(DISTINCT (al.routine_id, al.date)) AS sessions,
+               count(DISTINCT (al.student_id, al.routine_id, al.date))
+                   FILTER (WHERE al.status IN ('present', 'late')) AS attended
+        FROM attendance_logs al
+        WHERE al.section_id IN (SELECT id FROM scope)
+          AND al.course_catalog_id IS NOT NULL
+          AND (p_from IS NULL OR al.date >= p_from)
+          AND (p_to IS NULL OR al.date <= p_to)
+        GROUP BY al.section_id
+    ),
+    roster AS (
+        SELECT st.section_id, count(*) AS students
+        FROM students st WHERE st.section_id IN (SELECT id FROM scope)
+        GROUP BY st.section_id
+    )
+    SELECT sc.id, sc.name, sc.batch_id, sc.batch_name,
+           COALESCE(r.students, 0), COALESCE(l.subjects, 0), COALESCE(l.sessions, 0), COALESCE(l.attended, 0)
+    FROM scope sc
+    LEFT JOIN logs l ON l.section_id = sc.id
+    LEFT JOIN roster r ON r.section_id = sc.id
+$$;
+
+-- Let PostgREST see the new functions right away
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,37 @@
+-- Migration: idempotent server-side attendance writes
+-- /api/face/recognize with write_attendance=true upserts one row per
+-- (student, routine, day). Requires update_attendance_logs.sql (date column).
+
+-- 1. Drop duplicate rows left by client retries, keeping the most confident one
+DELETE FROM attendance_logs a
+USING attendance_logs b
+WHERE a.routine_id IS NOT NULL
+  AND a.student_id = b.student_id
+  AND a.routine_id = b.routine_id
+  AND a.date = b.date
+  AND (COALESCE(a.confidence, 0), a.ctid) < (COALESCE(b.confidence, 0), b.ctid);
+
+-- 2. Upsert target. Rows without a routine_id never conflict (NULLs are distinct).
+ALTER TABLE attendance_logs DROP CONSTRAINT IF EXISTS attendance_logs_student_routine_date_key;
+ALTER TABLE attendance_logs
+ADD CONSTRAINT attendance_logs_student_routine_date_key UNIQUE (student_id, routine_id, date);
+
+-- 3. Write path used by services/attendance_writer.py. A repeated recognition
+-- only raises the confidence of a row that is still 'present'; statuses set
+-- by hand (absent, late, excused...) are never overwritten.
+CREATE OR REPLACE FUNCTION record_attendance(p_rows jsonb)
+RETURNS integer
+LANGUAGE sql
+AS $$
+    WITH written AS (
+        INSERT INTO attendance_logs (student_id, routine_id, section_id, teacher_id, course_catalog_id, date, status, confidence)
+        SELECT student_id, routine_id, section_id, teacher_id, course_catalog_id, date, status, confidence
+        FROM jsonb_populate_recordset(NULL::attendance_logs, p_rows)
+        ON CONFLICT (student_id, routine_id, date) DO UPDATE
+            SET confidence = EXCLUDED.confidence
+            WHERE attendance_logs.status = 'present'
+              AND COALESCE(attendance_logs.confidence, 0) < EXCLUDED.confidence
+        RETURNING 1
+    )
+    SELECT count(*)::integer FROM written;
+$$;
@@ -0,0 +1,84 @@
+"""
+Recall vs latency of the FAISS index types at several index sizes.
+
+    python benchmarks/bench_ann.py --sizes 10000 100000
+    python benchmarks/bench_ann.py --sizes 1000000 --types flat ivf ivfpq   # needs ~4 GB RAM
+
+Recall@1 is measured against exact (flat) search on noisy copies of enrolled
+vectors, which is what a recognition query looks like. IVF kinds are swept
+over nprobe, HNSW over efSearch.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.index_factory import INDEX_TYPES
+from services.vector_search import VectorSearch
+
+SWEEPS = {
+    "flat": [None],
+    "ivf": [1, 4, 16, 64],
+    "ivfpq": [1, 4, 16, 64],
+    "hnsw": [16, 64, 256],
+}
+
+
+def synthetic(n, dimension=512, seed=0):
+    vecs = np.random.default_rng(seed).standard_normal((n, dimension), dtype=np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    return vecs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--noise", type=float, default=0.03)
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.sizes:
+        vecs = synthetic(n)
+        rng = np.random.default_rng(1)
+        picked = rng.choice(n, size=min(args.queries, n), replace=False)
+        queries = vecs[picked] + rng.normal(0, args.noise, (len(picked), vecs.shape[1])).astype(np.float32)
+        ids = [str(i) for i in range(n)]
+
+        with tempfile.TemporaryDirectory() as workdir:
+            truth = None
+            for kind in ["flat"] + [t for t in args.types if t != "flat"]:
+                vs = VectorSearch(index_path=os.path.join(workdir, f"{kind}.bin"), mapping_path=os.path.join(workdir, f"{kind}.json"), index_type=kind)
+                start = time.perf_counter()
+                vs.bulk_load(ids, vecs)
+                build_s = time.perf_counter() - start
+
+                for knob in SWEEPS[kind]:
+                    if kind == "hnsw":
+                        vs.set_search_params(ef_search=knob)
+                    elif knob:
+                        vs.set_search_params(nprobe=knob)
+                    start = time.perf_counter()
+                    found, _ = vs.search_batch(queries, k=1)
+                    query_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+                    if truth is None:
+                        truth = found[:, 0]
+                    if kind in args.types:
+                        recall = float(np.mean(found[:, 0] == truth))
+                        rows.append((n, kind, knob, build_s, query_ms, recall))
+
+    print(f"\n{'vectors':>8} | {'type':>6} | {'knob':>5} | {'build (s)':>9} | {'ms/query':>8} | {'recall@1':>8}")
+    print("-" * 60)
+    for n, kind, knob, build_s, query_ms, recall in rows:
+        print(f"{n:>8} | {kind:>6} | {knob if knob else '-':>5} | {build_s:>9.2f} | {query_ms:>8.4f} | {recall:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
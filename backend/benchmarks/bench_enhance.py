@@ -0,0 +1,86 @@
+"""
+Latency and face detection rate of the low-light enhancement modes.
+
+    python benchmarks/bench_enhance.py                       # backend/debug_images
+    python benchmarks/bench_enhance.py --dir photos/ --darken 0.15 --width 4032
+    python benchmarks/bench_enhance.py --modes fast_retinex clahe gamma   # skip the slow reference
+
+--darken scales pixel values to simulate dim classrooms from normal photos,
+--width resizes to phone-camera resolution first. Detection rate needs
+insightface installed; otherwise only latency is reported.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.image_enhancement import ENHANCEMENT_MODES, ImageEnhancer
+
+
+def load_images(directory, darken, width):
+    images = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.jpg")) + glob.glob(os.path.join(directory, "*.png"))):
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        if width:
+            img = cv2.resize(img, (width, round(img.shape[0] * width / img.shape[1])), interpolation=cv2.INTER_CUBIC)
+        if darken != 1.0:
+            img = cv2.convertScaleAbs(img, alpha=darken)
+        images.append((os.path.basename(path), img))
+    return images
+
+
+def load_detector():
+    try:
+        from insightface.app import FaceAnalysis
+    except ImportError:
+        print("ℹ️ insightface not installed, skipping detection rate.")
+        return None
+    app = FaceAnalysis(name='buffalo_l', allowed_modules=['detection'], providers=['CPUExecutionProvider'])
+    app.prepare(ctx_id=0, det_size=(640, 640))
+    return app.det_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=os.path.join(os.path.dirname(__file__), "..", "debug_images"))
+    parser.add_argument("--modes", nargs="+", default=list(ENHANCEMENT_MODES), choices=ENHANCEMENT_MODES)
+    parser.add_argument("--darken", type=float, default=1.0)
+    parser.add_argument("--width", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    images = load_images(args.dir, args.darken, args.width)
+    if not images:
+        sys.exit(f"No images in {args.dir}")
+    detector = load_detector()
+
+    print(f"\n{len(images)} images, {images[0][1].shape[1]}x{images[0][1].shape[0]}, "
+          f"mean brightness {np.mean([cv2.cvtColor(img, cv2.COLOR_BGR2HSV)[:, :, 2].mean() for _, img in images]):.1f}")
+    print(f"{'mode':>13} | {'ms/image':>9} | {'faces found':>11}")
+    print("-" * 40)
+
+    for mode in ["none"] + args.modes:
+        enhancer = None if mode == "none" else ImageEnhancer(mode=mode)
+        total, faces = 0.0, 0
+        for _, img in images:
+            brightness = float(cv2.cvtColor(img, cv2.COLOR_BGR2HSV)[:, :, 2].mean())
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                out = img if enhancer is None else enhancer.enhance(img, brightness)
+            total += (time.perf_counter() - start) / args.repeat
+            if detector is not None:
+                faces += len(detector.detect(out, max_num=0, metric='default')[0])
+        found = faces if detector is not None else "-"
+        print(f"{mode:>13} | {total / len(images) * 1000:>9.1f} | {found:>11}")
+
+
+if __name__ == "__main__":
+    main()
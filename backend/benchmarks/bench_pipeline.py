@@ -0,0 +1,371 @@
+"""
+Reproducible benchmarks of the recognition pipeline, written as JSON so runs
+can be diffed across commits.
+
+    python benchmarks/bench_pipeline.py --output bench.json
+    python benchmarks/bench_pipeline.py --suites search --vectors 1000 100000 1000000
+    python benchmarks/bench_pipeline.py --compare bench.json          # ratios vs an earlier run
+    python benchmarks/bench_pipeline.py --quick                       # smoke run, a few seconds
+
+Suites:
+    decode   FaceLogic._decode_image on synthetic JPEGs at several resolutions
+    enhance  enhance_if_needed on a dark and a bright image
+    embed    get_embeddings_batch with 1/10/50 faces
+    search   VectorSearch.rebuild_index + search/search_batch on synthetic vectors
+    e2e      POST /api/face/recognize through an in-process ASGI client, fake Supabase
+
+The embed and e2e suites use a stub detector/recognizer by default, so they
+measure everything around the models. --real-model runs the real ArcFace
+(insightface required) on the stub detector's crops instead.
+All inputs are generated from fixed seeds.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.face_logic import FaceLogic
+from services.image_enhancement import enhancer
+from services.vector_search import VectorSearch
+
+SUITES = ("decode", "enhance", "embed", "search", "e2e")
+
+
+# --- Stub models ---
+
+class StubDetector:
+    """
+    Returns `faces` boxes in a grid over the image, with five landmarks each.
+    """
+    def __init__(self, faces):
+        self.faces = faces
+
+    def detect(self, img, max_num=0, metric='default'):
+        h, w = img.shape[:2]
+        cols = int(np.ceil(np.sqrt(self.faces)))
+        size = min(w, h) // (cols + 1)
+        bboxes, kpss = [], []
+        for i in range(self.faces):
+            x, y = (i % cols) * size, (i // cols) * size
+            bboxes.append([x, y, x + size, y + size, 0.99])
+            kpss.append([[x + size * fx, y + size * fy] for fx, fy in
+                         ((0.3, 0.4), (0.7, 0.4), (0.5, 0.55), (0.35, 0.75), (0.65, 0.75))])
+        return np.array(bboxes, dtype=np.float32).reshape(-1, 5), np.array(kpss, dtype=np.float32).reshape(-1, 5, 2)
+
+
+class StubRecognizer:
+    """
+    Fixed random projection of a 16x16 thumbnail of each crop to 512-D.
+    """
+    def __init__(self):
+        self.projection = np.random.default_rng(0).standard_normal((16 * 16 * 3, 512)).astype(np.float32)
+
+    def get_feat(self, crops):
+        thumbs = np.stack([cv2.resize(c, (16, 16), interpolation=cv2.INTER_AREA) for c in crops]).reshape(len(crops), -1)
+        return thumbs.astype(np.float32) @ self.projection
+
+
+class StubApp:
+    def __init__(self, faces, recognizer=None):
+        self.det_model = StubDetector(faces)
+        self.models = {'recognition': recognizer or StubRecognizer()}
+
+
+class BenchFaceLogic(FaceLogic):
+    """
+    FaceLogic on stub models; alignment is a plain crop + resize around the landmarks.
+    """
+    def __init__(self, faces, recognizer=None):
+        super().__init__()
+        self.app = StubApp(faces, recognizer)
+
+    @staticmethod
+    def _align(img, kpss, indices):
+        crops = []
+        for i in indices:
+            (x0, y0), (x1, y1) = kpss[i].min(axis=0).astype(int), kpss[i].max(axis=0).astype(int)
+            pad = max(x1 - x0, y1 - y0)
+            crop = img[max(0, y0 - pad):y1 + pad, max(0, x0 - pad):x1 + pad]
+            crops.append(cv2.resize(crop, (112, 112)))
+        return crops
+
+
+def real_recognizer():
+    from insightface.app import FaceAnalysis
+    app = FaceAnalysis(name='buffalo_l', allowed_modules=['recognition'], providers=['CPUExecutionProvider'])
+    app.prepare(ctx_id=0)
+    return app.models['recognition']
+
+
+# --- Inputs ---
+
+def synthetic_photo(width, height, brightness=1.0, seed=0):
+    """
+    Smooth gradients plus noise, so JPEG sizes and decode costs resemble photos.
+    """
+    rng = np.random.default_rng(seed)
+    small = rng.integers(40, 220, (max(2, height // 64), max(2, width // 64), 3), dtype=np.uint8)
+    img = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    img = cv2.add(img, rng.integers(0, 12, img.shape, dtype=np.uint8))
+    return cv2.convertScaleAbs(img, alpha=brightness)
+
+
+def jpeg(img, quality=90):
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def unit_vectors(n, seed=0):
+    vecs = np.random.default_rng(seed).standard_normal((n, 512)).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+# --- Measurement ---
+
+def measure(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    samples = np.array(samples)
+    return {
+        "repeat": repeat,
+        "mean_ms": round(float(samples.mean()), 3),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "min_ms": round(float(samples.min()), 3),
+    }
+
+
+def result(name, params, stats, **extra):
+    row = {"name": name, "params": params, **stats, **extra}
+    label = " ".join(f"{k}={v}" for k, v in params.items())
+    print(f"{name:>22} {label:<28} mean {row['mean_ms']:>9.2f} ms  p95 {row['p95_ms']:>9.2f} ms"
+          + "".join(f"  {k} {v}" for k, v in extra.items()))
+    return row
+
+
+# --- Suites ---
+
+def bench_decode(args):
+    service = FaceLogic()
+    rows = []
+    for width, height in args.resolutions:
+        data = jpeg(synthetic_photo(width, height))
+        stats = measure(lambda: service._decode_image(data), args.repeat)
+        rows.append(result("decode", {"width": width, "height": height, "jpeg_kb": len(data) // 1024}, stats))
+    return rows
+
+
+def bench_enhance(args):
+    rows = []
+    for label, brightness in (("dark", 0.15), ("bright", 1.0)):
+        img = synthetic_photo(1280, 960, brightness)
+        stats = measure(lambda: enhancer.enhance_if_needed(img), args.repeat)
+        rows.append(result("enhance_if_needed", {"image": label, "mode": enhancer.mode}, stats))
+    return rows
+
+
+def bench_embed(args):
+    recognizer = real_recognizer() if args.real_model else None
+    data = jpeg(synthetic_photo(1920, 1080))
+    rows = []
+    for faces in args.faces:
+        service = BenchFaceLogic(faces, recognizer)
+        stats = measure(lambda: service.get_embeddings_batch(data), args.repeat)
+        rows.append(result("get_embeddings_batch", {"faces": faces, "model": "real" if recognizer else "stub"}, stats,
+                           faces_per_s=round(faces / stats["mean_ms"] * 1000, 1)))
+    return rows
+
+
+def bench_search(args):
+    rows = []
+    for n in args.vectors:
+        vecs = unit_vectors(n)
+        queries = unit_vectors(50, seed=1)
+        with tempfile.TemporaryDirectory() as tmp:
+            vs = VectorSearch(index_path=os.path.join(tmp, "idx.bin"), mapping_path=os.path.join(tmp, "labels.json"),
+                              index_type=args.index_type, load_on_init=False)
+            embeddings = {f"s{i}": vecs[i] for i in range(n)}
+            stats = measure(lambda: vs.rebuild_index(embeddings), 1 if n >= 100000 else min(args.repeat, 3), warmup=0)
+            rows.append(result("rebuild_index", {"vectors": n, "index": args.index_type}, stats))
+            stats = measure(lambda: vs.search(queries[0]), args.repeat * 5)
+            rows.append(result("search", {"vectors": n, "index": args.index_type}, stats))
+            stats = measure(lambda: vs.search_batch(queries), args.repeat)
+            rows.append(result("search_batch", {"vectors": n, "queries": 50, "index": args.index_type}, stats))
+    return rows
+
+
+def bench_e2e(args):
+    import httpx
+    import main
+    from services.attendance_writer import AttendanceWriter
+    from services.index_share import IndexShare
+    from services.inference import InferenceExecutor
+    from services.metrics import Metrics
+    from core.async_database import AsyncDB
+    from tests.fake_supabase import FakeSupabase
+    from tests.postgrest_server import PostgrestStandIn
+
+    faces, students = args.e2e_faces, args.e2e_students
+    service = BenchFaceLogic(faces, real_recognizer() if args.real_model else None)
+    data = jpeg(synthetic_photo(1920, 1080))
+    db = FakeSupabase({"routines": [{"id": "r1", "section_id": "A", "teacher_id": "t1", "course_catalog_id": "c1"}],
+                       "attendance_logs": []})
+    server = PostgrestStandIn(db).start()
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        vs = VectorSearch(index_path=os.path.join(tmp, "idx.bin"), load_on_init=False)
+        vs.bulk_load([f"s{i}" for i in range(students)], unit_vectors(students), ["A"] * students)
+        # Enroll the stub embeddings of this photo's faces so they match
+        enrolled, _ = service.analyze_all(data)
+        vs.upsert_vectors([f"s{i}" for i in range(len(enrolled))], np.vstack(enrolled), ["A"] * len(enrolled))
+
+        patched = {
+            "vector_search": vs,
+            "index_share": IndexShare(index=vs),
+            "inference": InferenceExecutor(service=service, workers=args.workers, queue_size=args.concurrency * 2),
+            "attendance_writer": AttendanceWriter(client_factory=lambda: db),
+            "supabase": lambda: db,
+            "db": AsyncDB(server.url, server.key),
+            "metrics": Metrics(enabled=True),
+        }
+        saved = {name: getattr(main, name) for name in patched}
+        for name, value in patched.items():
+            setattr(main, name, value)
+
+        async def run():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                async def one():
+                    t = time.perf_counter()
+                    response = await client.post("/api/face/recognize", files={"image": ("a.jpg", data)},
+                                                 data={"routine_id": "r1", "write_attendance": "true"})
+                    response.raise_for_status()
+                    return (time.perf_counter() - t) * 1000, len(response.json()["matches"])
+
+                await one()
+                # `concurrency` clients, each sending its share of the requests back to back
+                async def client_loop(count):
+                    return [await one() for _ in range(count)]
+
+                shares = [len(range(i, args.requests, args.concurrency)) for i in range(args.concurrency)]
+                t = time.perf_counter()
+                done = [r for rs in await asyncio.gather(*(client_loop(n) for n in shares)) for r in rs]
+                elapsed = time.perf_counter() - t
+                return elapsed, np.array([ms for ms, _ in done]), sum(m for _, m in done)
+
+        try:
+            main._routine_sections.clear()
+            elapsed, latencies, matched = asyncio.run(run())
+        finally:
+            main.inference.shutdown()
+            for name, value in saved.items():
+                setattr(main, name, value)
+            main._routine_sections.clear()
+            server.stop()
+
+    stats = {"repeat": args.requests, "mean_ms": round(float(latencies.mean()), 3),
+             "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+             "p95_ms": round(float(np.percentile(latencies, 95)), 3), "min_ms": round(float(latencies.min()), 3)}
+    rows.append(result("recognize_e2e", {"faces": faces, "students": students, "concurrency": args.concurrency,
+                                          "model": "real" if args.real_model else "stub"}, stats,
+                       requests_per_s=round(args.requests / elapsed, 1),
+                       matched_per_request=round(matched / args.requests, 1)))
+    return rows
+
+
+# --- Reporting ---
+
+def environment():
+    import faiss
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "faiss": faiss.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _key(row):
+    return row["name"] + json.dumps(row["params"], sort_keys=True)
+
+
+def compare(rows, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {_key(row): row for row in json.load(f)["results"]}
+    print(f"\nvs {baseline_path} (new / old mean, < 1 is faster)")
+    for row in rows:
+        old = baseline.get(_key(row))
+        if old and old["mean_ms"] > 0:
+            label = " ".join(f"{k}={v}" for k, v in row["params"].items())
+            print(f"{row['name']:>22} {label:<28} {row['mean_ms'] / old['mean_ms']:>6.2f}x")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", nargs="+", default=list(SUITES), choices=SUITES)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--resolutions", nargs="+", type=lambda s: tuple(map(int, s.split("x"))),
+                        default=[(640, 480), (1920, 1080), (4032, 3024)], help="WxH")
+    parser.add_argument("--faces", nargs="+", type=int, default=[1, 10, 50])
+    parser.add_argument("--vectors", nargs="+", type=int, default=[1000, 10000, 100000],
+                        help="index sizes; 1000000 needs ~4 GB RAM")
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--e2e-faces", type=int, default=30)
+    parser.add_argument("--e2e-students", type=int, default=5000)
+    parser.add_argument("--real-model", action="store_true", help="real ArcFace instead of the stub recognizer")
+    parser.add_argument("--quick", action="store_true", help="small sizes and few repeats")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="earlier JSON output to compare against")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.repeat, args.requests = 3, 8
+        args.resolutions = args.resolutions[:2]
+        args.vectors = [v for v in args.vectors if v <= 10000]
+        args.e2e_students = min(args.e2e_students, 1000)
+
+    suites = {"decode": bench_decode, "enhance": bench_enhance, "embed": bench_embed,
+              "search": bench_search, "e2e": bench_e2e}
+    rows = []
+    for name in args.suites:
+        print(f"\n== {name} ==")
+        rows += suites[name](args)
+
+    report = {"environment": environment(), "results": rows}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+    if args.compare:
+        compare(rows, args.compare)
+    return report
+
+
+if __name__ == "__main__":
+    main_cli()
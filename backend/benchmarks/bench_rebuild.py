@@ -0,0 +1,68 @@
+"""
+Benchmark FAISS index rebuild time.
+
+    python benchmarks/bench_rebuild.py --sizes 1000 10000 100000
+    python benchmarks/bench_rebuild.py --sizes 1000 --legacy
+
+--legacy also times the old path (add_vector per student, which rewrites the
+index file every time). It is O(N^2) in disk I/O, so keep it to small sizes.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.vector_search import VectorSearch
+
+
+def synthetic_embeddings(n, dimension=512, seed=0):
+    vecs = np.random.default_rng(seed).standard_normal((n, dimension), dtype=np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    return vecs
+
+
+def bench_bulk(n, workdir):
+    vs = VectorSearch(index_path=os.path.join(workdir, "bulk.bin"), mapping_path=os.path.join(workdir, "bulk.json"))
+    embeddings = {str(i): vec for i, vec in enumerate(synthetic_embeddings(n))}
+    start = time.perf_counter()
+    vs.rebuild_index(embeddings)
+    return time.perf_counter() - start
+
+
+def bench_legacy(n, workdir):
+    vs = VectorSearch(index_path=os.path.join(workdir, "legacy.bin"), mapping_path=os.path.join(workdir, "legacy.json"))
+    vecs = synthetic_embeddings(n)
+    start = time.perf_counter()
+    for i, vec in enumerate(vecs):
+        vs.add_vector(str(i), vec)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--legacy", action="store_true", help="also time per-vector add + save")
+    args = parser.parse_args()
+
+    results = []
+    for n in args.sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            row = {"vectors": n, "bulk_s": bench_bulk(n, workdir)}
+            if args.legacy:
+                row["legacy_s"] = bench_legacy(n, workdir)
+            results.append(row)
+
+    print(f"\n{'vectors':>10} | {'bulk (s)':>10} | {'legacy (s)':>10}")
+    print("-" * 38)
+    for row in results:
+        legacy = f"{row['legacy_s']:.3f}" if "legacy_s" in row else "-"
+        print(f"{row['vectors']:>10} | {row['bulk_s']:>10.3f} | {legacy:>10}")
+
+
+if __name__ == "__main__":
+    main()
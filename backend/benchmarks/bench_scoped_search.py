@@ -0,0 +1,78 @@
+"""
+Compare global vs section-scoped recognition latency and accuracy.
+
+    python benchmarks/bench_scoped_search.py --students 20000 --section-size 60
+
+Synthetic identities are random unit vectors; a class photo holds the
+section's students plus a few visitors from other sections, all with Gaussian
+noise. Accuracy counts enrolled students matched to themselves; "wrong" counts
+accepted matches to anyone else, including visitors that a global search
+happily marks present in a class they don't belong to.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.vector_search import VectorSearch
+
+MATCH_THRESHOLD = 1.6
+
+
+def normalize(vecs):
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--section-size", type=int, default=60)
+    parser.add_argument("--noise", type=float, default=0.06, help="per-dimension noise on query faces")
+    parser.add_argument("--classes", type=int, default=50, help="class photos to simulate")
+    parser.add_argument("--visitors", type=int, default=3, help="students from other sections per photo")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    enrolled = normalize(rng.standard_normal((args.students, 512)).astype(np.float32))
+    student_ids = [str(i) for i in range(args.students)]
+    sections = [str(i // args.section_size) for i in range(args.students)]
+    n_sections = (args.students + args.section_size - 1) // args.section_size
+
+    with tempfile.TemporaryDirectory() as workdir:
+        vs = VectorSearch(index_path=os.path.join(workdir, "idx.bin"), mapping_path=os.path.join(workdir, "labels.json"))
+        vs.bulk_load(student_ids, enrolled, sections)
+
+        results = {"global": {"time": 0.0, "correct": 0, "wrong": 0}, "scoped": {"time": 0.0, "correct": 0, "wrong": 0}}
+        total_faces = 0
+        for section in rng.choice(n_sections, size=args.classes):
+            members = np.arange(section * args.section_size, min((section + 1) * args.section_size, args.students))
+            outsiders = np.setdiff1d(np.arange(args.students), members)
+            visitors = rng.choice(outsiders, size=args.visitors, replace=False)
+            people = np.concatenate([members, visitors])
+            faces = normalize(enrolled[people] + rng.normal(0, args.noise, (len(people), 512)).astype(np.float32))
+            expected = np.array([str(m) for m in members] + [None] * len(visitors), dtype=object)
+            total_faces += len(members)
+
+            for mode, scope in (("global", None), ("scoped", str(section))):
+                start = time.perf_counter()
+                ids, distances = vs.search_batch(faces, k=1, section_id=scope)
+                results[mode]["time"] += time.perf_counter() - start
+                accepted = distances[:, 0] < MATCH_THRESHOLD
+                correct = ids[:, 0] == expected
+                results[mode]["correct"] += int((accepted & correct).sum())
+                results[mode]["wrong"] += int((accepted & ~correct).sum())
+
+    print(f"\n{args.students} students, sections of {args.section_size}, {args.classes} class photos ({total_faces} enrolled faces, {args.visitors} visitors each)")
+    print(f"{'mode':>8} | {'ms/photo':>9} | {'accuracy':>8} | {'wrong matches':>13}")
+    print("-" * 48)
+    for mode, r in results.items():
+        print(f"{mode:>8} | {r['time'] / args.classes * 1000:>9.3f} | {r['correct'] / total_faces:>8.2%} | {r['wrong']:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Accuracy and latency of the model runtime options against the FP32 baseline.
+
+    python benchmarks/compare_model_runtime.py                         # backend/debug_images
+    python benchmarks/compare_model_runtime.py --dir photos/ --output runtime.json
+    python benchmarks/compare_model_runtime.py --detector-packs buffalo_s
+
+The FP32 pack detects and aligns every face in the photos once. Each variant
+then embeds the same crops:
+    cosine drift    1 - cos(variant, FP32) per face (mean / p99 / max)
+    self-match      share of faces whose variant embedding finds its own FP32
+                    embedding as nearest neighbour, i.e. whether a quantized
+                    server still recognizes students enrolled with FP32
+Detector variants (INT8 SCRFD, other packs) report recall of the FP32 boxes at
+IoU >= 0.5. Latency is per call, with the threads/optimization of --threads.
+Needs insightface + onnxruntime.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.face_tracker import box_iou
+from services.model_runtime import ModelRuntime, module_of, pack_files
+
+
+def load_images(directory):
+    paths = sorted(glob.glob(os.path.join(directory, "*.jpg")) + glob.glob(os.path.join(directory, "*.png")))
+    return [img for img in (cv2.imread(p) for p in paths) if img is not None]
+
+
+def timed(fn, repeat):
+    fn()
+    t = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return out, (time.perf_counter() - t) / repeat * 1000
+
+
+def normalized(feats):
+    feats = np.asarray(feats, dtype=np.float32)
+    return feats / np.linalg.norm(feats, axis=1, keepdims=True)
+
+
+def model_file(pack, module):
+    return next(f for f in pack_files(pack) if module_of(f) == module)
+
+
+def compare_recognition(baseline, crops, runtime, label, repeat):
+    model = runtime.build_model('recognition', model_file(runtime.pack, 'recognition'))
+    feats, ms = timed(lambda: model.get_feat(crops), repeat)
+    feats = normalized(feats)
+    drift = 1.0 - np.sum(feats * baseline, axis=1)
+    self_match = float(np.mean(np.argmax(feats @ baseline.T, axis=1) == np.arange(len(crops))))
+    row = {
+        "variant": label,
+        "module": "recognition",
+        "faces": len(crops),
+        "ms_per_batch": round(ms, 2),
+        "drift_mean": float(drift.mean()),
+        "drift_p99": float(np.percentile(drift, 99)),
+        "drift_max": float(drift.max()),
+        "self_match": self_match,
+    }
+    print(f"{label:>24} | {ms:>9.1f} ms | drift mean {row['drift_mean']:.5f} p99 {row['drift_p99']:.5f} "
+          f"max {row['drift_max']:.5f} | self-match {self_match:.3f}")
+    return row
+
+
+def compare_detection(baseline_boxes, images, runtime, label, repeat):
+    model = runtime.build_model('detection', model_file(runtime.detector_pack, 'detection'))
+    model.prepare(0, input_size=(640, 640), det_thresh=0.5)
+    found, total, ms_total = 0, 0, 0.0
+    for img, expected in zip(images, baseline_boxes):
+        (boxes, _), ms = timed(lambda: model.detect(img, max_num=0, metric='default'), repeat)
+        ms_total += ms
+        total += len(expected)
+        if len(expected) and len(boxes):
+            found += int(np.sum(box_iou(expected[:, :4], boxes[:, :4]).max(axis=1) >= 0.5))
+    recall = found / total if total else None
+    row = {"variant": label, "module": "detection", "faces": total,
+           "ms_per_image": round(ms_total / len(images), 2), "recall": recall}
+    print(f"{label:>24} | {row['ms_per_image']:>9.1f} ms | recall of FP32 boxes {recall if recall is None else round(recall, 3)}")
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=os.path.join(os.path.dirname(__file__), "..", "debug_images"))
+    parser.add_argument("--pack", default="buffalo_l")
+    parser.add_argument("--detector-packs", nargs="*", default=[], help="other packs to try for detection only")
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--optimization", default="all")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cache-dir", default="onnx_cache")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    from insightface.utils import face_align
+
+    images = load_images(args.dir)
+    if not images:
+        sys.exit(f"No images in {args.dir}")
+
+    def runtime(**kwargs):
+        return ModelRuntime(pack=args.pack, intra_op_threads=args.threads, optimization=args.optimization,
+                            cache_dir=args.cache_dir, cache_optimized=False, **kwargs)
+
+    base = runtime(optimization="disable").load(['detection', 'recognition'])
+    baseline_boxes, crops = [], []
+    for img in images:
+        boxes, kpss = base.det_model.detect(img, max_num=0, metric='default')
+        baseline_boxes.append(boxes)
+        crops += [face_align.norm_crop(img, landmark=k, image_size=112) for k in kpss]
+    if not crops:
+        sys.exit("The FP32 detector found no faces; use photos with faces.")
+    baseline = normalized(base.models['recognition'].get_feat(crops))
+    print(f"\n{len(images)} images, {len(crops)} faces, pack {args.pack}\n")
+
+    rows = [
+        compare_recognition(baseline, crops, runtime(), f"fp32 opt={args.optimization}", args.repeat),
+        compare_recognition(baseline, crops, runtime(quantize="recognition"), "int8 recognition", args.repeat),
+        compare_detection(baseline_boxes, images, runtime(), f"fp32 opt={args.optimization}", args.repeat),
+        compare_detection(baseline_boxes, images, runtime(quantize="detection"), "int8 detection", args.repeat),
+    ]
+    for pack in args.detector_packs:
+        rows.append(compare_detection(baseline_boxes, images, runtime(detector_pack=pack), f"detector {pack}", args.repeat))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"pack": args.pack, "images": len(images), "faces": len(crops), "results": rows}, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
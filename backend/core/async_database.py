@@ -0,0 +1,164 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+
+from core.config import settings
+
+
+class DatabaseError(Exception):
+    """
+    A PostgREST request failed for good (client error, or still failing after all retries).
+    """
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class Routine:
+    id: str
+    section_id: Optional[str]
+    teacher_id: Optional[str] = None
+    course_catalog_id: Optional[str] = None
+    day_of_week: Optional[str] = None
+    start_time: Optional[str] = None
+    end_time: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(**{k: (None if row.get(k) is None else str(row[k])) for k in cls.__dataclass_fields__})
+
+
+class AsyncDB:
+    def __init__(self, url=None, key=None, timeout=5.0, retries=3, backoff_seconds=0.25, pool_size=10,
+                 transport=None, sleep=asyncio.sleep):
+        """
+        Non-blocking access to Supabase's PostgREST API for request handlers.
+
+        One pooled httpx.AsyncClient per process (keep-alive connections,
+        at most `pool_size` at once) with a timeout on every request.
+        Connection errors, timeouts, 5xx and 429 are retried with exponential
+        backoff; other 4xx fail immediately. The synchronous supabase client
+        (core/database.py) stays in use for background jobs that already run
+        in worker threads.
+        """
+        self.url = (url or "").rstrip("/")
+        self.key = key or ""
+        self.timeout = timeout
+        self.retries = max(1, retries)
+        self.backoff_seconds = backoff_seconds
+        self.pool_size = pool_size
+        self.transport = transport
+        self.sleep = sleep
+        self._client = None
+        self._loop = None
+
+    @property
+    def configured(self):
+        return bool(self.url and self.key)
+
+    def _http(self):
+        # A pool belongs to the event loop it was opened in; scripts and tests may run several loops
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                base_url=f"{self.url}/rest/v1",
+                headers={"apikey": self.key, "Authorization": f"Bearer {self.key}"},
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                transport=self.transport,
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            if self._loop is asyncio.get_running_loop():
+                await self._client.aclose()
+            self._client = None
+
+    async def _send(self, method, path, params=None, json=None, headers=None):
+        """
+        One PostgREST call with retries. Returns the successful httpx.Response.
+        """
+        if not self.configured:
+            raise DatabaseError("Database not configured (SUPABASE_URL / SUPABASE_KEY)")
+        for attempt in range(1, self.retries + 1):
+            try:
+                response = await self._http().request(method, f"/{path}", params=params, json=json, headers=headers)
+                if response.status_code < 400:
+                    return response
+                retryable = response.status_code >= 500 or response.status_code == 429
+                error = DatabaseError(f"{method} {path}: HTTP {response.status_code} {response.text[:200]}", response.status_code)
+            except httpx.TransportError as e:
+                # Connect/read/pool timeouts and dropped connections
+                retryable = True
+                error = DatabaseError(f"{method} {path}: {type(e).__name__} {e}")
+            if not retryable or attempt == self.retries:
+                raise error
+            delay = self.backoff_seconds * 2 ** (attempt - 1)
+            print(f"⚠️ {error}, retrying in {delay:.2f}s...")
+            await self.sleep(delay)
+
+    async def request(self, method, table, params=None, json=None, headers=None):
+        """
+        One PostgREST call with retries. Returns the decoded JSON body (or None).
+        """
+        response = await self._send(method, table, params, json, headers)
+        return response.json() if response.content else None
+
+    async def rpc(self, function, params=None, order=None, limit=None, offset=0, count=False):
+        """
+        Call a set-returning SQL function, paged server-side. Arguments that
+        are None are left out so the function's defaults apply.
+        Returns (rows, total); total is the row count before paging when
+        count=True, else None.
+        """
+        query = {}
+        if order:
+            query["order"] = order
+        if limit:
+            query["limit"] = str(limit)
+        if offset:
+            query["offset"] = str(offset)
+        response = await self._send(
+            "POST", f"rpc/{function}", params=query,
+            json={k: v for k, v in (params or {}).items() if v is not None},
+            headers={"Prefer": "count=exact"} if count else None,
+        )
+        rows = response.json() if response.content else []
+        total = None
+        if count:
+            # Content-Range: 0-99/1234 (or */0 for an empty result)
+            total_text = response.headers.get("Content-Range", "").rpartition("/")[2]
+            total = int(total_text) if total_text.isdigit() else None
+        return rows, total
+
+    async def select(self, table, columns="*", filters=None, order=None, limit=None):
+        params = {"select": columns, **(filters or {})}
+        if order:
+            params["order"] = order
+        if limit:
+            params["limit"] = str(limit)
+        return await self.request("GET", table, params=params) or []
+
+    # --- Typed helpers ---
+
+    async def routine(self, routine_id) -> Optional[Routine]:
+        rows = await self.select(
+            "routines", "id,section_id,teacher_id,course_catalog_id,day_of_week,start_time,end_time",
+            {"id": f"eq.{routine_id}"}, limit=1,
+        )
+        return Routine.from_row(rows[0]) if rows else None
+
+
+# Global instance
+db = AsyncDB(
+    settings.SUPABASE_URL,
+    settings.SUPABASE_KEY,
+    timeout=settings.DB_TIMEOUT_SECONDS,
+    retries=settings.DB_RETRIES,
+    pool_size=settings.DB_POOL_SIZE,
+)
@@ -4,6 +4,107 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "Attendance System AI"
     SUPABASE_URL: str = ""
     SUPABASE_KEY: str = ""
+    # Async PostgREST client used by request handlers (see core/async_database.py)
+    DB_POOL_SIZE: int = 10
+    DB_TIMEOUT_SECONDS: float = 5.0
+    # Attempts per request; connection errors, timeouts, 5xx and 429 back off exponentially
+    DB_RETRIES: int = 3
+
+    # Inference executor
+    # INFERENCE_MODE: "thread" shares one set of ONNX sessions across worker threads,
+    # "process" gives every worker process its own FaceAnalysis instance.
+    INFERENCE_MODE: str = "thread"
+    INFERENCE_WORKERS: int = 1
+    # Requests allowed to wait for a free worker before we answer 503.
+    INFERENCE_QUEUE_SIZE: int = 16
+    INFERENCE_RETRY_AFTER: int = 2
+    # 0 = pick automatically (cpu_count // INFERENCE_WORKERS)
+    ONNX_INTRA_OP_THREADS: int = 0
+    ONNX_INTER_OP_THREADS: int = 1
+    # disable | basic | extended | all
+    ONNX_GRAPH_OPTIMIZATION: str = "all"
+    # Optimized graphs and INT8 models are written here and reused on the next start
+    ONNX_CACHE_DIR: str = "onnx_cache"
+    ONNX_CACHE_OPTIMIZED: bool = True
+
+    # InsightFace pack for recognition; changing it means re-enrolling every student
+    MODEL_PACK: str = "buffalo_l"
+    # Pack for SCRFD only, e.g. "buffalo_s" for the smaller det_500m ("" = MODEL_PACK)
+    DETECTOR_PACK: str = ""
+    # "" | recognition | detection | all: run dynamically quantized INT8 copies
+    MODEL_QUANTIZE: str = ""
+
+    # Index sync
+    INDEX_SYNC_PAGE_SIZE: int = 1000
+    INDEX_SYNC_OVERLAP_SECONDS: int = 5
+    # Periodic delta sync in the background, 0 = off
+    INDEX_REFRESH_SECONDS: int = 0
+
+    # Section-scoped recognition: how many per-section sub-indexes to keep
+    SECTION_CACHE_SIZE: int = 64
+
+    # FAISS index: flat | ivf | ivfpq | hnsw (see services/index_factory.py)
+    INDEX_TYPE: str = "flat"
+    # IVF clusters, 0 = ~4*sqrt(N)
+    INDEX_NLIST: int = 0
+    INDEX_NPROBE: int = 16
+    INDEX_EF_SEARCH: int = 64
+    # Local index snapshot (see services/index_snapshot.py); mmap shares it across worker processes
+    INDEX_SNAPSHOT_DIR: str = "faiss_index.snapshot"
+    INDEX_MMAP: bool = True
+    INDEX_SNAPSHOT_VERIFY: bool = True
+    # Registrations within this window share one snapshot (0 = save after every write)
+    INDEX_SAVE_DELAY_SECONDS: float = 2.0
+    # Several workers (uvicorn --workers N): one owner syncs and publishes snapshots,
+    # the others follow them (see services/index_share.py). Needs a shared INDEX_SNAPSHOT_DIR.
+    INDEX_SHARED: bool = False
+    INDEX_FOLLOW_SECONDS: float = 1.0
+
+    # Pipeline results of recent uploads, keyed by a hash of the bytes (0 entries = off)
+    EMBEDDING_CACHE_SIZE: int = 256
+    EMBEDDING_CACHE_TTL_SECONDS: int = 600
+
+    # Live stream recognition (/ws/face/stream): votes a track needs, and the share of its recognitions they must be
+    STREAM_MIN_VOTES: int = 2
+    STREAM_MIN_SHARE: float = 0.6
+    # Recognition attempts for an unidentified track, and how often identified tracks are re-checked (frames)
+    STREAM_MAX_RECOGNITIONS: int = 5
+    STREAM_RECHECK_FRAMES: int = 30
+    # Process every Nth frame; frames arriving while this many wait are dropped (oldest first)
+    STREAM_FRAME_STRIDE: int = 1
+    STREAM_MAX_QUEUED_FRAMES: int = 2
+
+    # Stage latency histograms + face counters served at /metrics (Prometheus text format)
+    METRICS_ENABLED: bool = True
+    # Per-request Server-Timing header with the same stage times (visible in browser devtools)
+    SERVER_TIMING: bool = False
+
+    # Face templates per student (students.face_embedding + student_face_templates)
+    MAX_FACE_TEMPLATES: int = 6
+    # max | centroid
+    TEMPLATE_AGGREGATION: str = "max"
+
+    # Large JPEGs are decoded at 1/2, 1/4 or 1/8 scale while the longer side
+    # stays >= this many pixels (0 = always full resolution)
+    DECODE_TARGET_SIDE: int = 1600
+    # Faces smaller than this (shorter bbox side, original-photo pixels) are not recognized
+    MIN_FACE_SIZE: int = 24
+    # Photos accepted by /api/face/recognize/batch
+    MAX_BATCH_IMAGES: int = 8
+
+    # Server-side attendance write-back (write_attendance=true on recognize)
+    ATTENDANCE_WRITE_RETRIES: int = 3
+
+    # Attendance summaries (/api/attendance/summary/*, needs attendance_summary.sql)
+    ATTENDANCE_SUMMARY_CACHE_SIZE: int = 512
+    ATTENDANCE_SUMMARY_TTL_SECONDS: int = 300
+    # How often attendance_versions is polled for writes made outside this process
+    ATTENDANCE_SUMMARY_VERSION_CHECK_SECONDS: float = 5.0
+    # Rows per DB round trip when streaming a CSV export
+    ATTENDANCE_SUMMARY_PAGE_SIZE: int = 500
+
+    # Low-light enhancement: retinex | fast_retinex | clahe | gamma (see services/image_enhancement.py)
+    ENHANCEMENT_MODE: str = "fast_retinex"
     
     class Config:
         env_file = ".env"
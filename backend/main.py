@@ -1,7 +1,14 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, BackgroundTasks
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, BackgroundTasks, Request, WebSocket, WebSocketDisconnect, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from typing import List, Optional, Dict
+from datetime import date
+import asyncio
 import json
+from collections import OrderedDict, deque
 import os
 import sys
 import numpy as np
@@ -12,7 +19,20 @@ sys.path.append(os.getcwd())
 
 from services.face_logic import face_service
 from services.vector_search import vector_search
+from services.index_share import index_share
+from services.metrics import metrics
+from services.embedding_cache import embedding_cache
+from services.inference import inference, InferenceQueueFull
+from services.index_sync import index_sync
+from services.attendance_writer import attendance_writer
+from services.attendance_summary import attendance_summary
+from services.stream_session import StreamSession
+from core.config import settings
 from core.database import supabase
+from core.async_database import db, DatabaseError
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+print(f"⏱️ Imports done in {IMPORT_SECONDS:.2f}s.")
 
 app = FastAPI(
     title="Attendance System AI Backend",
@@ -28,6 +48,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if metrics.active:
+    @app.middleware("http")
+    async def time_requests(request: Request, call_next):
+        t = time.perf_counter()
+        timings = metrics.begin_request()
+        response = await call_next(request)
+        elapsed = time.perf_counter() - t
+        if metrics.enabled:
+            # Label by route template, not the raw URL, so the number of series stays bounded
+            route = request.scope.get("route")
+            metrics.request_seconds.observe(elapsed, path=route.path if route is not None else "unmatched")
+        if metrics.server_timing and timings:
+            response.headers["Server-Timing"] = metrics.server_timing_header(timings, elapsed)
+        return response
+
+# Squared L2 distance between normalized ArcFace embeddings
+MATCH_THRESHOLD = 1.6
+
 # --- Pydantic Models ---
 class MatchInfo(BaseModel):
     student_id: str
@@ -39,41 +77,178 @@ class RecognitionResponse(BaseModel):
     detected_faces: int
     matches: List[MatchInfo]
     message: str
+    # Per-stage milliseconds (decode/enhance/detect/embed/search) and face counts
+    timings: Optional[Dict[str, float]] = None
+    # Sampled mean brightness (0-255) and whether low-light enhancement ran
+    brightness: Optional[float] = None
+    enhanced: Optional[bool] = None
+    # True when matches were queued for writing to attendance_logs
+    attendance_queued: bool = False
+
+class BatchMatchInfo(MatchInfo):
+    # Photo the best match came from
+    image_index: int
+
+class BatchRecognitionResponse(BaseModel):
+    success: bool
+    images: int
+    detected_faces: int
+    faces_per_image: List[int]
+    matches: List[BatchMatchInfo]
+    message: str
+    timings: Optional[Dict[str, float]] = None
+    attendance_queued: bool = False
 
 class RegisterResponse(BaseModel):
     success: bool
     embedding: List[float]
     message: str
 
+class MultiRegisterResponse(BaseModel):
+    success: bool
+    embedding: List[float]
+    templates: List[List[float]]
+    faces_found: List[bool]
+    message: str
+
 # --- Lifecycle ---
+_refresh_task = None
+_boot_task = None
+_share_task = None
+# Startup progress, served by /ready. Times are seconds.
+_boot = {
+    "index": False,
+    "model": False,
+    "import_seconds": round(IMPORT_SECONDS, 3),
+    "index_seconds": None,
+    "model_seconds": None,
+    "ready_seconds": None,
+}
+
+async def full_sync():
+    print("🚀 Syncing FAISS index with Database...")
+    try:
+        # Paged network I/O + parsing, keep it off the event loop
+        with metrics.timer("db_sync"):
+            await asyncio.to_thread(index_sync.full_sync)
+    except Exception as e:
+        print(f"❌ Full sync failed: {e}")
+
+async def delta_sync():
+    try:
+        with metrics.timer("db_sync"):
+            await asyncio.to_thread(index_sync.delta_sync)
+    except Exception as e:
+        print(f"❌ Delta sync failed: {e}")
+
+async def refresh_index_periodically(interval):
+    while True:
+        await asyncio.sleep(interval)
+        await delta_sync()
+
+def _sync(mode):
+    # Inbox requests from follower workers, already on a worker thread
+    (index_sync.full_sync if mode == "full" else index_sync.delta_sync)()
+
+async def load_index():
+    global _share_task, _refresh_task
+    t = time.perf_counter()
+    role = await asyncio.to_thread(index_share.claim)
+    if role == "follower":
+        # The owner worker pulls from Supabase; just map what it publishes
+        await index_share.wait_for_snapshot()
+        _share_task = asyncio.create_task(index_share.follow())
+    else:
+        # Local copy first so search works while the DB sync is still running
+        await asyncio.to_thread(vector_search.load_index)
+        await full_sync()
+        if role == "owner":
+            if vector_search.generation == 0:
+                # Publish even an empty index so followers become ready
+                await asyncio.to_thread(vector_search.save_index)
+            _share_task = asyncio.create_task(index_share.own(_sync))
+        # Followers get changes through the owner's snapshots instead
+        if settings.INDEX_REFRESH_SECONDS > 0 and _refresh_task is None:
+            _refresh_task = asyncio.create_task(refresh_index_periodically(settings.INDEX_REFRESH_SECONDS))
+            print(f"🔄 Background index refresh every {settings.INDEX_REFRESH_SECONDS}s.")
+    _boot["index"] = True
+    _boot["index_seconds"] = round(time.perf_counter() - t, 3)
+
+async def warm_models():
+    t = time.perf_counter()
+    try:
+        _boot["model"] = await inference.warmup()
+    except Exception as e:
+        print(f"❌ Model warmup failed: {e}")
+    _boot["model_seconds"] = round(time.perf_counter() - t, 3)
+
+async def boot():
+    """
+    Load the index and the models concurrently after the server is already
+    listening, so platform health checks pass during a cold start.
+    """
+    await asyncio.gather(load_index(), warm_models())
+    _boot["ready_seconds"] = round(time.perf_counter() - _IMPORT_STARTED, 3)
+    print(f"🟢 Ready {_boot['ready_seconds']:.2f}s after import "
+          f"(index {_boot['index_seconds']}s, models {_boot['model_seconds']}s).")
+
+def _is_ready():
+    return _boot["index"] and (_boot["model"] or face_service.ready)
+
 @app.on_event("startup")
 async def startup_event():
-    print("🚀 Starting up... Syncing FAISS index with Database...")
+    global _boot_task
+    _boot_task = asyncio.create_task(boot())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in (_refresh_task, _boot_task, _share_task):
+        if task is not None:
+            task.cancel()
+    inference.shutdown()
+    # Keep registrations made since the last snapshot
+    await asyncio.to_thread(index_share.owned.flush)
+    await db.close()
+
+def _busy(e: InferenceQueueFull):
+    return HTTPException(
+        status_code=503,
+        detail="Server is busy processing other images. Please retry shortly.",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+# routine_id -> section_id. Routines rarely move, so keep them for the process lifetime.
+_routine_sections: "OrderedDict[str, str]" = OrderedDict()
+_ROUTINE_CACHE_SIZE = 1024
+
+async def _routine_section(routine_id: str):
+    """
+    Section a routine (class slot) belongs to, through the pooled async DB client.
+    """
+    if routine_id in _routine_sections:
+        _routine_sections.move_to_end(routine_id)
+        return _routine_sections[routine_id]
+    if not db.configured:
+        raise HTTPException(status_code=503, detail="Database not configured, cannot resolve routine_id")
     try:
-        if supabase():
-            # Fetch all students with embeddings
-            # Note: This checks if 'face_embedding' is not null
-            response = supabase().table("students").select("id, face_embedding").not_.is_("face_embedding", "null").execute()
-            data = response.data
-            
-            if data:
-                embeddings_dict = {}
-                for record in data:
-                    s_id = str(record['id'])
-                    # Parse string vector if needed, supabase-py might return string or list
-                    emb = record['face_embedding']
-                    if isinstance(emb, str):
-                        emb = json.loads(emb)
-                    embeddings_dict[s_id] = emb
-                
-                vector_search.rebuild_index(embeddings_dict)
-                print(f"✅ Synced {len(embeddings_dict)} students from DB to FAISS.")
-            else:
-                print("⚠️ No students found in DB to sync.")
-        else:
-            print("⚠️ Supabase not configured, skipping sync.")
-    except Exception as e:
-        print(f"❌ Startup sync failed: {e}")
+        with metrics.timer("db_routine"):
+            routine = await db.routine(routine_id)
+    except DatabaseError as e:
+        print(f"❌ Routine lookup failed: {e}")
+        raise HTTPException(status_code=503, detail="Database unavailable, cannot resolve routine_id")
+    if routine is None:
+        raise HTTPException(status_code=404, detail=f"Routine {routine_id} not found")
+    _routine_sections[routine_id] = routine.section_id
+    if len(_routine_sections) > _ROUTINE_CACHE_SIZE:
+        _routine_sections.popitem(last=False)
+    return routine.section_id
+
+async def _resolve_section(routine_id: Optional[str], section_id: Optional[str]):
+    if section_id:
+        return section_id
+    if routine_id:
+        return await _routine_section(routine_id)
+    return None
 
 # --- Endpoints ---
 
@@ -81,26 +256,59 @@ async def startup_event():
 async def root():
     return {
         "message": "AI Attendance Backend (InsightFace + FAISS)",
-        "vectors_loaded": vector_search.index.ntotal
+        "vectors_loaded": index_share.index.index.ntotal
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness, as opposed to /health (liveness): 200 only once the models are
+    warm and the index has been loaded, 503 while still booting.
+    """
+    ready = _is_ready()
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, **_boot})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """
+    Stage latency histograms and face counters in the Prometheus text format.
+    """
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (METRICS_ENABLED=false)")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "engine": "insightface", "vectors": vector_search.index.ntotal}
+    return {
+        "status": "healthy",
+        "ready": _is_ready(),
+        "engine": "insightface",
+        "vectors": index_share.index.index.ntotal,
+        "index_type": index_share.index.index_kind,
+        "index_share": index_share.stats(),
+        "inference": inference.stats(),
+        "model_runtime": face_service.runtime.describe(),
+        "embedding_cache": embedding_cache.stats(),
+        "attendance_summary": attendance_summary.stats(),
+        "last_attendance_write": attendance_writer.last_stats
+    }
 
 @app.post("/api/face/register", response_model=RegisterResponse)
 async def register_face(
     image: UploadFile = File(...),
-    student_id: Optional[str] = Form(None)
+    student_id: Optional[str] = Form(None),
+    section_id: Optional[str] = Form(None)
 ):
     """
     Detect face and return 512-D embedding.
     If student_id is provided, it also adds it to the FAISS index immediately 
-    (assuming the caller will save to DB).
+    (assuming the caller will save to DB). Pass section_id too so the student
+    is found by section-scoped recognition before the next sync.
     """
     try:
         image_bytes = await image.read()
-        embedding = face_service.get_embedding(image_bytes)
+        embedding, timings = await inference.run("analyze_largest", image_bytes)
+        metrics.record_pipeline(timings)
         
         if embedding is None:
             raise HTTPException(status_code=400, detail="No face detected. Ensure good lighting and clear face.")
@@ -109,29 +317,148 @@ async def register_face(
         
         # If ID provided, update cache immediately
         if student_id:
-            vector_search.add_vector(student_id, embedding)
+            # One photo replaces the whole face: drop any multi-photo templates too,
+            # or the next sync would load them back next to the new embedding
+            await asyncio.to_thread(_save_templates, student_id, [])
+            # Index write + snapshot (owner) or inbox spool (follower): file I/O, keep it off the loop
+            await asyncio.to_thread(
+                index_share.upsert, [student_id], embedding.reshape(1, -1), None if section_id is None else [section_id]
+            )
         
         return {
             "success": True,
             "embedding": embedding_list,
             "message": "Face processed successfully"
         }
+    except InferenceQueueFull as e:
+        raise _busy(e)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _save_templates(student_id, templates):
+    """
+    Replace a student's rows in student_face_templates (template_no 1..n).
+    New rows are upserted first and only surplus ones deleted after, so a
+    failed write never leaves the student without templates. Raises on
+    failure; callers update the index only after this succeeded.
+    """
+    client = supabase()
+    if not client:
+        return
+    rows = [
+        {"student_id": student_id, "template_no": no, "embedding": template.tolist()}
+        for no, template in enumerate(templates, start=1)
+    ]
+    if rows:
+        client.table("student_face_templates").upsert(rows, on_conflict="student_id,template_no").execute()
+    client.table("student_face_templates").delete().eq("student_id", student_id).gt("template_no", len(rows)).execute()
+
+@app.post("/api/face/register/multi", response_model=MultiRegisterResponse)
+async def register_face_multi(
+    images: List[UploadFile] = File(...),
+    student_id: Optional[str] = Form(None),
+    section_id: Optional[str] = Form(None)
+):
+    """
+    Enroll a student from several photos (different angles / lighting) in one request.
+    All photos are embedded in a single inference call. Returns the normalized
+    centroid as `embedding` (store it in students.face_embedding) and one
+    template per usable photo. With student_id, the templates are saved to
+    student_face_templates and added to the FAISS index right away.
+    """
+    if not 1 <= len(images) < settings.MAX_FACE_TEMPLATES:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {settings.MAX_FACE_TEMPLATES - 1} images")
+
+    try:
+        payloads = await asyncio.gather(*(image.read() for image in images))
+        embeddings = await inference.run("get_template_embeddings", list(payloads))
+
+        found = [e is not None for e in embeddings]
+        if not any(found):
+            raise HTTPException(status_code=400, detail="No face detected in any image. Ensure good lighting and clear face.")
+
+        templates = np.vstack([e for e in embeddings if e is not None])
+        centroid = templates.mean(axis=0)
+        centroid /= np.linalg.norm(centroid)
+
+        if student_id:
+            await asyncio.to_thread(_save_templates, student_id, templates)
+            matrix = np.vstack([centroid, templates])
+            await asyncio.to_thread(
+                index_share.upsert, [student_id] * len(matrix), matrix, None if section_id is None else [section_id] * len(matrix)
+            )
+
+        return {
+            "success": True,
+            "embedding": centroid.tolist(),
+            "templates": templates.tolist(),
+            "faces_found": found,
+            "message": f"Face found in {len(templates)} of {len(images)} images"
+        }
+    except InferenceQueueFull as e:
+        raise _busy(e)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _match(embeddings, scope, timings):
+    """
+    Search an (N, 512) matrix in one FAISS call. Blocking (a global search
+    at 20k students takes ~135 ms and waits for index writers), so handlers
+    call it through asyncio.to_thread.
+    Returns (student_ids, distances, confidences, hit mask), each of length N.
+    """
+    t = time.perf_counter()
+    student_ids, distances = index_share.index.search_batch(embeddings, k=1, section_id=scope)
+    student_ids, distances = student_ids[:, 0], distances[:, 0]
+    timings["search_ms"] = (time.perf_counter() - t) * 1000
+
+    hit = (student_ids != None) & (distances < MATCH_THRESHOLD)
+    metrics.record_match(timings["search_ms"], hit.sum())
+    confidences = np.maximum(0, (MATCH_THRESHOLD - distances) / MATCH_THRESHOLD)
+    return student_ids, distances, confidences, hit
+
+def _lighting(timings):
+    if "brightness" not in timings:
+        return {}
+    return {"brightness": round(timings["brightness"], 1), "enhanced": bool(timings["enhanced"])}
+
+def _queue_attendance(background_tasks, write_attendance, routine_id, matches):
+    """
+    Schedule the bulk attendance upsert to run after the response is sent.
+    """
+    if not (write_attendance and routine_id and matches):
+        return False
+    pairs = [(m["student_id"], m["confidence"]) for m in matches]
+    background_tasks.add_task(attendance_writer.write, routine_id, pairs)
+    return True
+
 @app.post("/api/face/recognize", response_model=RecognitionResponse)
-async def recognize_face(image: UploadFile = File(...)):
+async def recognize_face(
+    background_tasks: BackgroundTasks,
+    image: UploadFile = File(...),
+    routine_id: Optional[str] = Form(None),
+    section_id: Optional[str] = Form(None),
+    write_attendance: bool = Form(False)
+):
     """
     Recognize ALL faces in the image against the server-side FAISS index.
     Optimized for group photos.
+    With routine_id or section_id, only students of that section are
+    considered, which is faster and avoids matches from other classes.
+    With routine_id and write_attendance=true, matched students are marked
+    present in attendance_logs in one upsert after the response is sent.
     """
     try:
+        scope = await _resolve_section(routine_id, section_id)
         image_bytes = await image.read()
         
-        # 1. Get ALL embeddings from image
-        embeddings = face_service.get_embeddings_batch(image_bytes)
+        # 1. Detect, then embed only faces large enough to recognize
+        embeddings, timings = await inference.run("analyze_all", image_bytes)
+        metrics.record_pipeline(timings)
         detected_count = len(embeddings)
         
         if detected_count == 0:
@@ -139,41 +466,314 @@ async def recognize_face(image: UploadFile = File(...)):
                 "success": False,
                 "detected_faces": 0,
                 "matches": [],
-                "message": "No faces detected"
+                "message": "No faces detected",
+                "timings": timings,
+                **_lighting(timings)
             }
 
-        THRESHOLD = 1.6 
-        matches = []
-        
-        # 2. Search each face in FAISS
-        for emb in embeddings:
-            student_id, distance = face_service.recognize_face(emb)
-            
-            if student_id and distance < THRESHOLD:
-                confidence = max(0, (THRESHOLD - distance) / THRESHOLD)
-                matches.append({
-                    "student_id": student_id,
-                    "distance": float(distance),
-                    "confidence": float(confidence)
-                })
+        # 2. Search all faces in a single FAISS call
+        student_ids, distances, confidences, hit = await asyncio.to_thread(_match, np.vstack(embeddings), scope, timings)
+
+        matches = [
+            {
+                "student_id": student_id,
+                "distance": float(distance),
+                "confidence": float(confidence)
+            }
+            for student_id, distance, confidence in zip(student_ids[hit], distances[hit], confidences[hit])
+        ]
         
         return {
             "success": len(matches) > 0,
             "detected_faces": detected_count,
             "matches": matches,
-            "message": f"Found {len(matches)} matches from {detected_count} faces" if matches else "No matches found"
+            "message": f"Found {len(matches)} matches from {detected_count} faces" if matches else "No matches found",
+            "timings": timings,
+            "attendance_queued": _queue_attendance(background_tasks, write_attendance, routine_id, matches),
+            **_lighting(timings)
         }
             
+    except InferenceQueueFull as e:
+        raise _busy(e)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Recognition Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/face/recognize/batch", response_model=BatchRecognitionResponse)
+async def recognize_batch(
+    background_tasks: BackgroundTasks,
+    images: List[UploadFile] = File(...),
+    routine_id: Optional[str] = Form(None),
+    section_id: Optional[str] = Form(None),
+    write_attendance: bool = Form(False)
+):
+    """
+    Recognize a whole session from several photos (e.g. one per row of a large room).
+    All faces from all photos go through ArcFace and FAISS together, and each
+    student appears once in the result with their best-confidence match.
+    write_attendance works as in /api/face/recognize.
+    """
+    if not 1 <= len(images) <= settings.MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {settings.MAX_BATCH_IMAGES} images")
+
+    try:
+        scope = await _resolve_section(routine_id, section_id)
+        payloads = await asyncio.gather(*(image.read() for image in images))
+
+        per_image, timings = await inference.run("analyze_many", list(payloads))
+        metrics.record_pipeline(timings, images=len(payloads))
+        faces_per_image = [len(embeddings) for embeddings in per_image]
+        detected_count = sum(faces_per_image)
+
+        if detected_count == 0:
+            return {
+                "success": False,
+                "images": len(images),
+                "detected_faces": 0,
+                "faces_per_image": faces_per_image,
+                "matches": [],
+                "message": "No faces detected",
+                "timings": timings
+            }
+
+        image_index = np.repeat(np.arange(len(per_image)), faces_per_image)
+        student_ids, distances, confidences, hit = await asyncio.to_thread(
+            _match, np.vstack([e for embeddings in per_image for e in embeddings]), scope, timings
+        )
+
+        # Best (smallest distance) face per student across all photos
+        order = np.flatnonzero(hit)[np.argsort(distances[hit], kind="stable")]
+        _, first = np.unique(student_ids[order].astype(str), return_index=True)
+        best = order[np.sort(first)]
+
+        matches = [
+            {
+                "student_id": student_ids[i],
+                "distance": float(distances[i]),
+                "confidence": float(confidences[i]),
+                "image_index": int(image_index[i])
+            }
+            for i in best
+        ]
+
+        return {
+            "success": len(matches) > 0,
+            "images": len(images),
+            "detected_faces": detected_count,
+            "faces_per_image": faces_per_image,
+            "matches": matches,
+            "message": f"Found {len(matches)} students from {detected_count} faces in {len(images)} images" if matches else "No matches found",
+            "timings": timings,
+            "attendance_queued": _queue_attendance(background_tasks, write_attendance, routine_id, matches)
+        }
+
+    except InferenceQueueFull as e:
+        raise _busy(e)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Batch Recognition Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _stream_action(text):
+    try:
+        return json.loads(text).get("action")
+    except (ValueError, AttributeError):
+        return None
+
+async def _stream_frame(websocket, session, frame_bytes, scope):
+    """
+    Detect + track one frame, recognize only the faces that need it, and
+    send the frame report.
+    """
+    skip = session.plan()
+    try:
+        boxes, embeddings, timings = await inference.run("analyze_frame", frame_bytes, skip)
+    except InferenceQueueFull:
+        session.drop()
+        return
+    metrics.record_pipeline(timings)
+
+    matches = {}
+    if embeddings:
+        detections = list(embeddings)
+        student_ids, _, confidences, hit = await asyncio.to_thread(
+            _match, np.vstack([embeddings[d] for d in detections]), scope, timings
+        )
+        for d, student_id, confidence, ok in zip(detections, student_ids, confidences, hit):
+            matches[d] = (student_id, float(confidence)) if ok else (None, 0.0)
+
+    report = session.update(boxes[:, :4], matches)
+    await websocket.send_json({"type": "frame", **report, "recognized": len(matches), "skipped": session.frames_skipped})
+
+@app.websocket("/ws/face/stream")
+async def stream_recognition(
+    websocket: WebSocket,
+    routine_id: Optional[str] = None,
+    section_id: Optional[str] = None,
+    write_attendance: bool = False
+):
+    """
+    Live recognition from a camera. Send JPEG frames as binary messages and
+    {"action": "end"} when done. Every processed frame is answered with the
+    tracked faces and the students newly marked present; the final message
+    is a summary. Detection runs on every processed frame, ArcFace only for
+    new or still-uncertain tracks. When frames arrive faster than they can
+    be processed, the oldest waiting ones are dropped.
+    With routine_id and write_attendance=true, the present students are
+    written to attendance_logs at the end.
+    """
+    await websocket.accept()
+    try:
+        scope = await _resolve_section(routine_id, section_id)
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "detail": e.detail})
+        await websocket.close(code=1008)
+        return
+
+    session = StreamSession(
+        min_votes=settings.STREAM_MIN_VOTES,
+        min_share=settings.STREAM_MIN_SHARE,
+        max_recognitions=settings.STREAM_MAX_RECOGNITIONS,
+        recheck_frames=settings.STREAM_RECHECK_FRAMES,
+    )
+    pending = deque()
+    arrived = asyncio.Event()
+    state = {"ended": False}
+
+    async def receive_frames():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return False
+                if message.get("bytes"):
+                    session.frames_received += 1
+                    if (session.frames_received - 1) % max(1, settings.STREAM_FRAME_STRIDE):
+                        session.frames_skipped += 1
+                        continue
+                    if len(pending) >= max(1, settings.STREAM_MAX_QUEUED_FRAMES):
+                        pending.popleft()
+                        session.frames_skipped += 1
+                    pending.append(message["bytes"])
+                    arrived.set()
+                elif message.get("text") and _stream_action(message["text"]) == "end":
+                    return True
+        finally:
+            state["ended"] = True
+            arrived.set()
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while True:
+            await arrived.wait()
+            arrived.clear()
+            while pending:
+                await _stream_frame(websocket, session, pending.popleft(), scope)
+            if state["ended"] and not pending:
+                break
+
+        if not await receiver:
+            return
+        summary = session.summary()
+        if write_attendance and routine_id and summary["present"]:
+            pairs = [(p["student_id"], p["confidence"]) for p in summary["present"]]
+            summary["attendance_written"] = await asyncio.to_thread(attendance_writer.write, routine_id, pairs)
+        await websocket.send_json({"type": "summary", **summary})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+
 @app.post("/api/face/sync")
-async def sync_index(background_tasks: BackgroundTasks):
+async def sync_index(background_tasks: BackgroundTasks, mode: str = "delta"):
+    """
+    Re-sync the FAISS index from Supabase.
+    mode=delta (default) applies only students changed since the last sync;
+    mode=full re-pulls the whole table, e.g. after bulk importing students.
+    """
+    if mode not in ("delta", "full"):
+        raise HTTPException(status_code=400, detail="mode must be 'delta' or 'full'")
+
+    if index_share.role == "follower":
+        # Only the owner worker syncs; it publishes the result to everyone
+        index_share.request_sync(mode)
+    else:
+        background_tasks.add_task(full_sync if mode == "full" else delta_sync)
+    return {"status": f"{mode.capitalize()} sync started in background", "last_sync": index_sync.last_stats}
+
+# --- Attendance summaries ---
+
+async def _summary_response(kind, scope, limit, offset, format):
+    """
+    One cached JSON page of a summary, or the whole of it as streamed CSV.
+    """
+    if format not in ("json", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'csv'")
+    if scope["date_from"] and scope["date_to"] and scope["date_from"] > scope["date_to"]:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    scope = {k: (v.isoformat() if isinstance(v, date) else v) for k, v in scope.items() if v}
+    try:
+        if format == "csv":
+            chunks = await attendance_summary.csv_export(kind, scope)
+            filename = "_".join(["attendance", kind] + [str(v) for v in scope.values()])
+            return StreamingResponse(chunks, media_type="text/csv",
+                                     headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'})
+        return await attendance_summary.page(kind, scope, limit, offset)
+    except DatabaseError as e:
+        print(f"❌ Attendance summary failed: {e}")
+        if e.status == 404:
+            raise HTTPException(status_code=503, detail="Attendance summaries are not installed (apply attendance_summary.sql)")
+        raise HTTPException(status_code=503, detail="Database unavailable, try again shortly")
+
+@app.get("/api/attendance/summary/students")
+async def attendance_student_summary(
+    section_id: str,
+    course_catalog_id: Optional[str] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    format: str = "json",
+):
     """
-    Force re-sync of FAISS index from Supabase.
-    Call this after bulk importing students.
+    Per student and subject of a section: sessions held, attended, absent
+    and percentage. from/to (inclusive) bound the dates, e.g. to a semester.
     """
-    background_tasks.add_task(startup_event)
-    return {"status": "Sync started in background"}
+    scope = {"section_id": section_id, "course_catalog_id": course_catalog_id, "date_from": date_from, "date_to": date_to}
+    return await _summary_response("students", scope, limit, offset, format)
 
+@app.get("/api/attendance/summary/subjects")
+async def attendance_subject_summary(
+    section_id: str,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    format: str = "json",
+):
+    """
+    Per subject of a section: sessions held, roster size, attendances and the average percentage.
+    """
+    scope = {"section_id": section_id, "date_from": date_from, "date_to": date_to}
+    return await _summary_response("subjects", scope, limit, offset, format)
+
+@app.get("/api/attendance/summary/sections")
+async def attendance_section_summary(
+    faculty_id: Optional[str] = None,
+    batch_id: Optional[str] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    format: str = "json",
+):
+    """
+    Per section of a faculty and/or batch (every section if neither is
+    given): students, subjects, sessions and the average percentage.
+    """
+    scope = {"faculty_id": faculty_id, "batch_id": batch_id, "date_from": date_from, "date_to": date_to}
+    return await _summary_response("sections", scope, limit, offset, format)
@@ -0,0 +1,274 @@
+import csv
+import io
+import threading
+import time
+from collections import OrderedDict
+
+from core.async_database import DatabaseError, db as default_db
+from core.config import settings
+from .metrics import metrics
+
+# Summary kind -> SQL function (attendance_summary.sql), stable order for paging, CSV columns
+KINDS = {
+    "students": {
+        "function": "attendance_student_summary",
+        "order": "roll_no,student_id,subject_code,course_catalog_id",
+        "columns": ["student_id", "roll_no", "student_name", "course_catalog_id", "subject_code", "subject_name",
+                    "sessions", "attended", "absent", "percentage", "last_present"],
+    },
+    "subjects": {
+        "function": "attendance_subject_summary",
+        "order": "subject_code,course_catalog_id",
+        "columns": ["course_catalog_id", "subject_code", "subject_name", "sessions", "students", "attended",
+                    "percentage", "first_date", "last_date"],
+    },
+    "sections": {
+        "function": "attendance_section_summary",
+        "order": "batch_name,section_name,section_id",
+        "columns": ["section_id", "section_name", "batch_id", "batch_name", "students", "subjects", "sessions",
+                    "attended", "percentage"],
+    },
+}
+
+# Request scope -> SQL function argument
+PARAMS = {
+    "section_id": "p_section_id",
+    "course_catalog_id": "p_course_catalog_id",
+    "faculty_id": "p_faculty_id",
+    "batch_id": "p_batch_id",
+    "date_from": "p_from",
+    "date_to": "p_to",
+}
+
+
+def _percentage(attended, possible):
+    return round(100.0 * attended / possible, 1) if possible else None
+
+
+def finish_row(kind, row):
+    """
+    Add the derived columns (absent, percentage) to a row from SQL.
+    """
+    if kind == "students":
+        row["absent"] = row["sessions"] - row["attended"]
+        row["percentage"] = _percentage(row["attended"], row["sessions"])
+    else:
+        # Every student of the section could have attended every session
+        row["percentage"] = _percentage(row["attended"], row["sessions"] * row["students"])
+    return row
+
+
+class SummaryCache:
+    def __init__(self, max_entries=512, ttl_seconds=300, clock=time.monotonic):
+        """
+        LRU of summary pages. Every entry is tagged with the section it
+        covers, or None for multi-section summaries; invalidate(section_id)
+        drops that section's entries and all multi-section ones. The TTL
+        bounds staleness if a change is ever missed.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        # key -> (expires, section_id, value)
+        self._entries = OrderedDict()
+        # Invalidation counters, so a page computed across an invalidation is not stored
+        self._generation = 0
+        self._section_generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def token(self, section_id):
+        """
+        Taken before querying; put() ignores the result if the section was invalidated meanwhile.
+        """
+        with self._lock:
+            return self._generation, self._section_generations.get(section_id, 0)
+
+    def put(self, key, section_id, value, token=None):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if token is not None and token != (self._generation, self._section_generations.get(section_id, 0)):
+                return
+            self._entries[key] = (self.clock() + self.ttl_seconds, section_id, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, section_id=None):
+        """
+        Drop the entries of `section_id` (and multi-section ones); None drops everything.
+        """
+        with self._lock:
+            self.invalidations += 1
+            if section_id is None:
+                self._generation += 1
+                self._entries.clear()
+                return
+            section_id = str(section_id)
+            self._section_generations[section_id] = self._section_generations.get(section_id, 0) + 1
+            # Multi-section summaries include this section too
+            self._section_generations[None] = self._section_generations.get(None, 0) + 1
+            for key in [k for k, (_, s, _) in self._entries.items() if s is None or s == section_id]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+class AttendanceSummary:
+    def __init__(self, db=None, cache=None, version_check_seconds=5.0, page_size=500, max_limit=1000,
+                 clock=time.monotonic):
+        """
+        Attendance aggregates computed by grouped SQL (attendance_summary.sql)
+        and served through a SummaryCache.
+
+        Writes made by this process invalidate the cache directly. Writes
+        made elsewhere (the frontend, other workers, SQL) bump
+        attendance_versions through a trigger. That table is polled at most
+        every `version_check_seconds`, so those changes show up that fast.
+        """
+        self.db = db or default_db
+        self.cache = cache or SummaryCache()
+        self.version_check_seconds = version_check_seconds
+        self.page_size = page_size
+        self.max_limit = max_limit
+        self.clock = clock
+        self._checked_at = None
+        # Latest attendance_versions.changed_at seen
+        self._seen = None
+        self._versions_available = True
+
+    async def check_versions(self):
+        """
+        Invalidate sections whose attendance changed in the DB since the last check.
+        """
+        now = self.clock()
+        if not self._versions_available:
+            return
+        if self._checked_at is not None and now - self._checked_at < self.version_check_seconds:
+            return
+        self._checked_at = now
+        try:
+            if self._seen is None:
+                # First check: nothing cached yet, just remember where we are
+                rows = await self.db.select("attendance_versions", "section_id,changed_at", order="changed_at.desc", limit=1)
+                self._seen = rows[0]["changed_at"] if rows else ""
+                return
+            filters = {"changed_at": f"gte.{self._seen}"} if self._seen else None
+            rows = await self.db.select("attendance_versions", "section_id,changed_at", filters, order="changed_at", limit=1000)
+        except DatabaseError as e:
+            if e.status == 404:
+                print("ℹ️ attendance_versions missing (apply attendance_summary.sql); summaries only expire by TTL.")
+                self._versions_available = False
+            else:
+                print(f"⚠️ Attendance version check failed: {e}")
+            return
+        if len(rows) >= 1000:
+            self.cache.invalidate()
+        else:
+            for row in rows:
+                self.cache.invalidate(row["section_id"])
+        if rows:
+            self._seen = rows[-1]["changed_at"]
+
+    def _params(self, scope):
+        return {PARAMS[k]: v for k, v in scope.items() if v is not None}
+
+    async def _fetch(self, kind, scope, limit, offset, count):
+        spec = KINDS[kind]
+        with metrics.timer("db_summary"):
+            rows, total = await self.db.rpc(spec["function"], self._params(scope), order=spec["order"],
+                                            limit=limit, offset=offset, count=count)
+        return [finish_row(kind, row) for row in rows], total
+
+    async def page(self, kind, scope, limit=100, offset=0):
+        """
+        One page of a summary: {"rows", "total", "limit", "offset", "cached"}.
+        `scope` maps section_id/course_catalog_id/faculty_id/batch_id and
+        date_from/date_to (ISO dates) to values; None means unfiltered.
+        """
+        limit = max(1, min(limit, self.max_limit))
+        offset = max(0, offset)
+        await self.check_versions()
+
+        section_id = scope.get("section_id")
+        key = (kind, tuple(sorted(scope.items())), limit, offset)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return {**cached, "cached": True}
+        token = self.cache.token(section_id)
+        rows, total = await self._fetch(kind, scope, limit, offset, count=True)
+        value = {"rows": rows, "total": total, "limit": limit, "offset": offset}
+        self.cache.put(key, section_id, value, token)
+        return {**value, "cached": False}
+
+    async def csv_export(self, kind, scope):
+        """
+        The whole summary as CSV, fetched `page_size` rows at a time and
+        bypassing the cache, so a faculty-wide export streams in bounded
+        memory. The first page is fetched before returning, so a DB error
+        surfaces before the response starts. Returns an async iterator of
+        text chunks.
+        """
+        columns = KINDS[kind]["columns"]
+        first, _ = await self._fetch(kind, scope, self.page_size, 0, count=False)
+
+        async def chunks():
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, columns, extrasaction="ignore")
+            writer.writeheader()
+            rows, offset = first, 0
+            while True:
+                writer.writerows(rows)
+                if buffer.tell():
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                # Stop on an empty page rather than a short one: PostgREST caps
+                # every response at its max-rows setting
+                if not rows:
+                    return
+                offset += len(rows)
+                rows, _ = await self._fetch(kind, scope, self.page_size, offset, count=False)
+
+        return chunks()
+
+    def invalidate(self, section_id):
+        self.cache.invalidate(section_id)
+
+    def stats(self):
+        return {**self.cache.stats(), "version_tracking": self._versions_available}
+
+
+# Global instances
+summary_cache = SummaryCache(
+    max_entries=settings.ATTENDANCE_SUMMARY_CACHE_SIZE,
+    ttl_seconds=settings.ATTENDANCE_SUMMARY_TTL_SECONDS,
+)
+attendance_summary = AttendanceSummary(
+    cache=summary_cache,
+    version_check_seconds=settings.ATTENDANCE_SUMMARY_VERSION_CHECK_SECONDS,
+    page_size=settings.ATTENDANCE_SUMMARY_PAGE_SIZE,
+)
@@ -0,0 +1,127 @@
+import time
+from datetime import date
+
+from core.config import settings
+from core.database import supabase
+from .attendance_summary import summary_cache
+from .metrics import metrics
+
+# Matches the unique constraint added in attendance_writeback.sql
+CONFLICT_COLUMNS = "student_id,routine_id,date"
+# SQL function from attendance_writeback.sql, PostgREST's code when it is missing
+WRITE_FUNCTION = "record_attendance"
+MISSING_FUNCTION = "PGRST202"
+
+
+class AttendanceWriter:
+    def __init__(self, client_factory=supabase, retries=3, backoff_seconds=0.5, sleep=time.sleep):
+        """
+        Writes recognized students straight into attendance_logs.
+
+        All rows of a class go out in one call keyed on
+        (student_id, routine_id, date), so a retried request or a second
+        photo of the same class never adds duplicates. An existing row keeps
+        its status (a teacher may have corrected it) and only takes a higher
+        confidence. Failed writes are retried with exponential backoff.
+        """
+        self.client_factory = client_factory
+        self.retries = max(1, retries)
+        self.backoff_seconds = backoff_seconds
+        self.sleep = sleep
+        self._routines = {}
+        self._function_available = True
+        self.last_stats = None
+
+    def _routine(self, client, routine_id):
+        """
+        Section, teacher and course of a routine, cached per process.
+        """
+        routine = self._routines.get(routine_id)
+        if routine is None:
+            rows = client.table("routines").select("section_id, teacher_id, course_catalog_id").eq("id", routine_id).limit(1).execute().data
+            if not rows:
+                raise ValueError(f"Routine {routine_id} not found")
+            routine = self._routines[routine_id] = rows[0]
+        return routine
+
+    def build_rows(self, routine_id, routine, matches, day):
+        """
+        One 'present' row per student, keeping the best confidence if a
+        student was matched more than once.
+        """
+        best = {}
+        for student_id, confidence in matches:
+            best[student_id] = max(confidence, best.get(student_id, 0.0))
+        return [
+            {
+                "student_id": student_id,
+                "routine_id": routine_id,
+                "section_id": routine.get("section_id"),
+                "teacher_id": routine.get("teacher_id"),
+                "course_catalog_id": routine.get("course_catalog_id"),
+                "date": day.isoformat(),
+                "status": "present",
+                "confidence": round(float(confidence), 4),
+            }
+            for student_id, confidence in best.items()
+        ]
+
+    def _upsert(self, client, rows):
+        if self._function_available:
+            try:
+                client.rpc(WRITE_FUNCTION, {"p_rows": rows}).execute()
+                return
+            except Exception as e:
+                if getattr(e, "code", None) != MISSING_FUNCTION:
+                    raise
+                print(f"ℹ️ {WRITE_FUNCTION} missing (apply attendance_writeback.sql); existing rows keep their confidence.")
+                self._function_available = False
+        # Insert new rows only, never touch existing ones
+        client.table("attendance_logs").upsert(rows, on_conflict=CONFLICT_COLUMNS, ignore_duplicates=True).execute()
+
+    def write(self, routine_id, matches, day=None):
+        """
+        Record `matches` ((student_id, confidence) pairs) as present for the
+        routine on `day` (today by default). Meant to run after the response
+        has been sent; failures are logged, not raised.
+        Returns the number of rows written.
+        """
+        if not matches:
+            return 0
+        day = day or date.today()
+        start = time.perf_counter()
+
+        for attempt in range(1, self.retries + 1):
+            try:
+                client = self.client_factory()
+                if not client:
+                    print("⚠️ Supabase not configured, attendance not written.")
+                    return 0
+                with metrics.timer("db_attendance"):
+                    rows = self.build_rows(routine_id, self._routine(client, routine_id), matches, day)
+                    self._upsert(client, rows)
+                summary_cache.invalidate(rows[0]["section_id"])
+
+                self.last_stats = {
+                    "routine_id": routine_id,
+                    "rows": len(rows),
+                    "attempts": attempt,
+                    "seconds": round(time.perf_counter() - start, 3),
+                }
+                print(f"📝 Wrote {len(rows)} attendance rows for routine {routine_id} (attempt {attempt}).")
+                return len(rows)
+            except ValueError as e:
+                print(f"❌ Attendance write skipped: {e}")
+                return 0
+            except Exception as e:
+                if attempt == self.retries:
+                    print(f"❌ Attendance write for routine {routine_id} failed after {attempt} attempts: {e}")
+                    self.last_stats = {"routine_id": routine_id, "rows": 0, "attempts": attempt, "error": str(e)}
+                    return 0
+                delay = self.backoff_seconds * 2 ** (attempt - 1)
+                print(f"⚠️ Attendance write failed ({e}), retrying in {delay:.1f}s...")
+                self.sleep(delay)
+
+
+# Global instance
+attendance_writer = AttendanceWriter(retries=settings.ATTENDANCE_WRITE_RETRIES)
@@ -0,0 +1,436 @@
+"""
+Offline bulk enrollment: a directory or zip of photos named by student ID
+(students.student_id, e.g. 2101001.jpg) is embedded in a process pool and
+written to students.face_embedding in batches, then the FAISS snapshot is
+rebuilt once.
+
+    python -m services.bulk_enrollment photos/ --section-id 3f1c9a52-8d4e-4b7a-9c1e-2a6b5d0e7f43
+    python -m services.bulk_enrollment batch_2026.zip --workers 4 --progress batch_2026.progress.jsonl
+    python -m services.bulk_enrollment photos/ --dry-run          # check the photos, write nothing
+
+Every processed photo is appended to the progress file (JSON lines), so an
+interrupted run picks up where it stopped; embeddings not yet written to the
+DB are written on the next run. Rejected photos (no face, several faces, low
+light, ...) are listed at the end to be retaken.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+# Column holding the roll/registration number the photos are named by (shown as "Student ID" in the app)
+ROLL_COLUMN = "student_id"
+# Mean brightness under which the pipeline enhances a photo (see ImageEnhancer.enhance_with_info)
+LOW_LIGHT_BRIGHTNESS = 50.0
+
+
+# --- Worker-side helpers (module level so they can be pickled) ---
+
+_worker_service = None
+_worker_archives = {}
+
+def _init_worker(intra_op_threads, service=None):
+    """
+    Runs once in every worker process (or in-process with workers=0).
+    """
+    global _worker_service
+    if service is None:
+        from services.face_logic import FaceLogic
+        service = FaceLogic()
+        service.set_intra_op_threads(intra_op_threads)
+        service.load()
+    _worker_service = service
+
+def _read_photo(source, name):
+    if os.path.isdir(source):
+        with open(os.path.join(source, name), "rb") as f:
+            return f.read()
+    archive = _worker_archives.get(source)
+    if archive is None:
+        archive = _worker_archives[source] = zipfile.ZipFile(source)
+    return archive.read(name)
+
+def enroll_photo(source, name, roll_no):
+    """
+    Read and embed one photo. Returns its progress record.
+    """
+    t = time.perf_counter()
+    record = {"file": name, "roll_no": roll_no}
+    try:
+        data = _read_photo(source, name)
+    except Exception as e:
+        return {**record, "status": "unreadable", "detail": str(e)}
+
+    embedding, verdict, timings = _worker_service.analyze_enrollment(data)
+    brightness = timings.get("brightness")
+    dark = brightness is not None and brightness < LOW_LIGHT_BRIGHTNESS
+    if verdict in ("no_face", "small_face") and dark:
+        verdict = "low_light"
+    record.update(status=verdict, faces=int(timings.get("faces_detected", 0)),
+                  ms=round((time.perf_counter() - t) * 1000, 1))
+    if brightness is not None:
+        record["brightness"] = round(float(brightness), 1)
+    if embedding is not None:
+        record["embedding"] = [round(float(v), 7) for v in embedding]
+        if dark:
+            # Enrolled from an enhanced photo; worth retaking in better light
+            record["warning"] = "low_light"
+    return record
+
+
+# --- Inputs ---
+
+def list_photos(source):
+    """
+    (file name, roll_no) of every photo in a directory (recursively) or zip,
+    sorted by name. The roll number is the file name without extension.
+    """
+    if os.path.isdir(source):
+        names = [
+            os.path.relpath(os.path.join(root, f), source)
+            for root, _, files in os.walk(source) for f in files
+        ]
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            names = [info.filename for info in archive.infolist() if not info.is_dir()]
+    else:
+        raise ValueError(f"{source} is neither a directory nor a zip file")
+    photos = [
+        name for name in names
+        if name.lower().endswith(PHOTO_EXTENSIONS) and not os.path.basename(name).startswith(".")
+    ]
+    return sorted((name, os.path.splitext(os.path.basename(name))[0].strip()) for name in photos)
+
+
+class ProgressFile:
+    def __init__(self, path):
+        """
+        Append-only JSON lines: one record per processed photo, plus
+        {"written": [files]} after each DB batch. Reloaded on restart.
+        """
+        self.path = path
+        self.records = {}
+        self.written = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Half-written last line of an interrupted run
+                        continue
+                    if "written" in entry:
+                        self.written.update(entry["written"])
+                    else:
+                        self.records[entry["file"]] = entry
+        # Enrolled photos not written to the DB yet
+        self.pending = {f: r for f, r in self.records.items() if r["status"] == "ok" and f not in self.written}
+        self._file = open(path, "a+") if path else None
+        if self._file and self._file.tell():
+            self._file.seek(self._file.tell() - 1)
+            if self._file.read(1) != "\n":
+                # Start after the truncated line instead of extending it
+                self._file.write("\n")
+
+    def _append(self, entry):
+        if self._file:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def add(self, record):
+        self.records[record["file"]] = record
+        if record["status"] == "ok" and record["file"] not in self.written:
+            self.pending[record["file"]] = record
+        self._append(record)
+
+    def mark_written(self, files):
+        self.written.update(files)
+        for f in files:
+            self.pending.pop(f, None)
+        self._append({"written": sorted(files)})
+
+    def unwritten(self):
+        return list(self.pending.values())
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class BulkEnrollment:
+    def __init__(self, source, progress_path=None, client_factory=None, section_id=None, workers=2,
+                 intra_op_threads=0, batch_size=200, log_every=100, service=None):
+        """
+        source: directory or zip of <student_id>.<ext> photos.
+        section_id: section UUID; only match student IDs within this section
+              (they need not be unique across sections).
+        client_factory: returns a Supabase client, or None for a dry run.
+        workers: embedding processes, 0 = in this process (with `service`).
+        """
+        if client_factory is None:
+            from core.database import supabase
+            client_factory = supabase
+        self.source = source
+        self.progress = ProgressFile(progress_path)
+        self.client_factory = client_factory
+        self.section_id = section_id
+        self.workers = max(0, workers)
+        self.intra_op_threads = intra_op_threads or max(1, (os.cpu_count() or 1) // max(1, self.workers))
+        self.batch_size = max(1, batch_size)
+        self.log_every = log_every
+        self.service = service
+        self.skipped = {}
+        self.stats = {}
+
+    # --- Students ---
+
+    def lookup_students(self, client, roll_nos, chunk=500):
+        """
+        roll_no -> student row (id, student_id, profile_id, section_id). Roll
+        numbers with no student, or several (without section_id), go to self.skipped.
+        """
+        found = {}
+        roll_nos = sorted(set(roll_nos))
+        for i in range(0, len(roll_nos), chunk):
+            query = client.table("students").select(f"id, {ROLL_COLUMN}, profile_id, section_id").in_(ROLL_COLUMN, roll_nos[i:i + chunk])
+            if self.section_id is not None:
+                query = query.eq("section_id", self.section_id)
+            for row in query.execute().data or []:
+                found.setdefault(row[ROLL_COLUMN], []).append(row)
+        students = {}
+        for roll_no in roll_nos:
+            rows = found.get(roll_no, [])
+            if len(rows) == 1:
+                students[roll_no] = rows[0]
+            else:
+                self.skipped[roll_no] = "unknown_roll_no" if not rows else "ambiguous_roll_no"
+        return students
+
+    def write_batch(self, client, records, students, retries=3):
+        """
+        One upsert of face_embedding for a batch of enrolled photos. The
+        full student row goes along so the upsert never inserts a partial
+        row. Earlier face templates of these students are dropped: they
+        belong to the old enrollment.
+        """
+        rows = [
+            {**students[r["roll_no"]], "face_embedding": r["embedding"], "face_registered": True}
+            for r in records
+        ]
+        for attempt in range(1, retries + 1):
+            try:
+                client.table("students").upsert(rows, on_conflict="id").execute()
+                break
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                print(f"⚠️ Batch write failed ({e}), retrying...")
+                time.sleep(0.5 * 2 ** (attempt - 1))
+        try:
+            client.table("student_face_templates").delete().in_("student_id", [row["id"] for row in rows]).execute()
+        except Exception as e:
+            print(f"ℹ️ Face templates not cleared: {e}")
+        self.progress.mark_written([r["file"] for r in records])
+
+    def _flush(self, client, students, force=False):
+        if not force and len(self.progress.pending) < self.batch_size:
+            return
+        pending = [r for r in self.progress.unwritten() if r["roll_no"] in students]
+        while pending and (force or len(pending) >= self.batch_size):
+            batch, pending = pending[:self.batch_size], pending[self.batch_size:]
+            self.write_batch(client, batch, students)
+            self.stats["written"] = self.stats.get("written", 0) + len(batch)
+
+    # --- Run ---
+
+    def _results(self, todo):
+        """
+        Yield progress records of `todo` photos as they finish, keeping at
+        most a few photos per worker in flight.
+        """
+        if self.workers == 0:
+            _init_worker(self.intra_op_threads, self.service)
+            for name, roll_no in todo:
+                yield enroll_photo(self.source, name, roll_no)
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.intra_op_threads,),
+        ) as pool:
+            queue = iter(todo)
+            running = set()
+            while True:
+                for name, roll_no in queue:
+                    running.add(pool.submit(enroll_photo, self.source, name, roll_no))
+                    if len(running) >= self.workers * 4:
+                        break
+                if not running:
+                    return
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    def run(self):
+        photos = list_photos(self.source)
+        by_roll = Counter(roll_no for _, roll_no in photos)
+        for roll_no, count in by_roll.items():
+            if count > 1:
+                self.skipped[roll_no] = "duplicate_photos"
+
+        client = self.client_factory()
+        if client:
+            students = self.lookup_students(client, [r for r in by_roll if r not in self.skipped])
+        else:
+            print("ℹ️ Supabase not configured: dry run, nothing is written.")
+            students = {r: None for r in by_roll if r not in self.skipped}
+
+        todo = [(name, roll_no) for name, roll_no in photos
+                if roll_no in students and name not in self.progress.records]
+        resumed = sum(1 for name, roll_no in photos if roll_no in students and name in self.progress.records)
+        print(f"📷 {len(photos)} photos, {len(todo)} to process"
+              f"{f', {resumed} done in an earlier run' if resumed else ''}, {len(self.skipped)} student IDs skipped.")
+
+        # Embedded in an earlier run but never written
+        if client:
+            self._flush(client, students, force=True)
+
+        start = time.perf_counter()
+        processed = 0
+        for record in self._results(todo):
+            self.progress.add(record)
+            processed += 1
+            if client:
+                self._flush(client, students)
+            if self.log_every and processed % self.log_every == 0:
+                elapsed = time.perf_counter() - start
+                print(f"⏳ {processed}/{len(todo)} photos, {processed / elapsed:.1f} images/s")
+        elapsed = time.perf_counter() - start
+        if client:
+            self._flush(client, students, force=True)
+
+        statuses = Counter(r["status"] for f, r in self.progress.records.items())
+        self.stats.update({
+            "photos": len(photos),
+            "processed": processed,
+            "resumed": resumed,
+            "seconds": round(elapsed, 2),
+            "images_per_s": round(processed / elapsed, 2) if elapsed > 0 and processed else 0.0,
+            "statuses": dict(statuses),
+            "low_light_warnings": sum(1 for r in self.progress.records.values() if r.get("warning") == "low_light"),
+            "skipped": dict(Counter(self.skipped.values())),
+        })
+        self.stats.setdefault("written", 0)
+        return self.stats
+
+    def failures(self):
+        """
+        (file or roll_no, reason) of every photo that was not enrolled.
+        """
+        rejected = [(r["file"], r["status"]) for r in self.progress.records.values() if r["status"] != "ok"]
+        return sorted(rejected) + sorted(self.skipped.items())
+
+    def embeddings(self):
+        """
+        (roll numbers, (N, 512) matrix) of the enrolled photos.
+        """
+        ok = [r for r in self.progress.records.values() if r["status"] == "ok"]
+        matrix = np.array([r["embedding"] for r in ok], dtype=np.float32).reshape(len(ok), -1)
+        return [r["roll_no"] for r in ok], matrix
+
+    def build_snapshot(self, index):
+        """
+        Rebuild `index` (a VectorSearch) in one bulk load and save it as a
+        new snapshot generation: from the DB after a real run, so it holds
+        every enrolled student; from this run's photos (keyed by roll_no)
+        on a dry run.
+        """
+        from services.index_sync import IndexSync
+        client = self.client_factory()
+        if client:
+            return IndexSync(client_factory=lambda: client, index=index).full_sync()
+        roll_nos, matrix = self.embeddings()
+        if roll_nos:
+            index.bulk_load(roll_nos, matrix)
+        return {"rows": len(roll_nos)}
+
+    def close(self):
+        self.progress.close()
+
+
+def print_report(stats, failures, limit=50):
+    print(f"\n✅ {stats['statuses'].get('ok', 0)} enrolled, {stats['written']} written to the DB, "
+          f"{stats['processed']} photos in {stats['seconds']}s ({stats['images_per_s']} images/s)")
+    if stats["low_light_warnings"]:
+        print(f"🔦 {stats['low_light_warnings']} enrolled from dark photos (see \"warning\" in the progress file)")
+    by_reason = {}
+    for item, reason in failures:
+        by_reason.setdefault(reason, []).append(item)
+    for reason, items in sorted(by_reason.items()):
+        print(f"❌ {reason}: {len(items)}")
+        for item in items[:limit]:
+            print(f"     {item}")
+        if len(items) > limit:
+            print(f"     ... {len(items) - limit} more")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="directory or .zip of <student_id>.jpg photos")
+    parser.add_argument("--section-id", help="section UUID; match student IDs within this section only")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="embedding processes (default: half the cores)")
+    parser.add_argument("--threads", type=int, default=0, help="ONNX intra-op threads per worker (default: cores / workers)")
+    parser.add_argument("--batch-size", type=int, default=200, help="students per DB upsert")
+    parser.add_argument("--progress", help="progress file (default: <source>.progress.jsonl)")
+    parser.add_argument("--dry-run", action="store_true", help="only check and embed the photos")
+    parser.add_argument("--no-snapshot", action="store_true", help="skip rebuilding the FAISS snapshot")
+    parser.add_argument("--snapshot-dir", help="where to write the snapshot (default: INDEX_SNAPSHOT_DIR, none on a dry run)")
+    args = parser.parse_args(argv)
+
+    from core.config import settings
+    from services.vector_search import VectorSearch
+
+    client_factory = (lambda: None) if args.dry_run else None
+    enrollment = BulkEnrollment(
+        args.source,
+        progress_path=args.progress or f"{args.source.rstrip(os.sep)}.progress.jsonl",
+        client_factory=client_factory,
+        section_id=args.section_id,
+        workers=args.workers,
+        intra_op_threads=args.threads,
+        batch_size=args.batch_size,
+    )
+    try:
+        stats = enrollment.run()
+        print_report(stats, enrollment.failures())
+        # A dry run's snapshot is keyed by roll_no, so it never replaces the live one by default
+        if not args.no_snapshot and (not args.dry_run or args.snapshot_dir):
+            index = VectorSearch(
+                index_type=settings.INDEX_TYPE,
+                nlist=settings.INDEX_NLIST,
+                max_templates=settings.MAX_FACE_TEMPLATES,
+                aggregation=settings.TEMPLATE_AGGREGATION,
+                load_on_init=False,
+                snapshot_dir=args.snapshot_dir or settings.INDEX_SNAPSHOT_DIR,
+            )
+            enrollment.build_snapshot(index)
+    finally:
+        enrollment.close()
+
+
+if __name__ == "__main__":
+    main()
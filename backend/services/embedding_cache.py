@@ -0,0 +1,102 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from core.config import settings
+
+
+class CachedFaces:
+    def __init__(self, bboxes, keep, embeddings, lighting, complete):
+        """
+        What the pipeline found in one upload.
+        bboxes: detector output (N, 5); keep: indices of recognizable faces;
+        embeddings: {face index: normalized embedding} (read-only arrays);
+        complete: True when every face in `keep` has its embedding.
+        """
+        self.bboxes = bboxes
+        self.keep = keep
+        self.embeddings = embeddings
+        self.lighting = lighting
+        self.complete = complete
+        for embedding in embeddings.values():
+            embedding.setflags(write=False)
+
+    @property
+    def largest(self):
+        if len(self.bboxes) == 0:
+            return None
+        areas = (self.bboxes[:, 2] - self.bboxes[:, 0]) * (self.bboxes[:, 3] - self.bboxes[:, 1])
+        return int(np.argmax(areas))
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries=256, ttl_seconds=600, clock=time.monotonic):
+        """
+        LRU of pipeline results keyed by a hash of the uploaded bytes, so a
+        retried upload or a second /api/face/register of the same photo
+        skips decode, enhancement, detection and ArcFace.
+        Entries expire after ttl_seconds; max_entries=0 disables the cache.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(data):
+        # blake2b runs at ~1 GB/s, well under a millisecond for a phone photo
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and self.ttl_seconds and self.clock() - item[0] > self.ttl_seconds:
+                del self._entries[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, entry):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (self.clock(), entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+# Global instance
+embedding_cache = EmbeddingCache(max_entries=settings.EMBEDDING_CACHE_SIZE, ttl_seconds=settings.EMBEDDING_CACHE_TTL_SECONDS)
@@ -1,67 +1,358 @@
 import numpy as np
 import cv2
-import insightface
-from insightface.app import FaceAnalysis
-from PIL import Image
-import io
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from core.config import settings
 from .image_enhancement import enhancer
+from .image_io import decode_image
+from .embedding_cache import CachedFaces, embedding_cache
+from .face_tracker import box_iou
+from .model_runtime import model_runtime
 from .vector_search import vector_search
 
+# Only the buffalo_l models the pipeline uses: SCRFD detection (with 5-point
+# landmarks for alignment) and ArcFace recognition. landmark_2d_106,
+# landmark_3d_68 and genderage are never loaded.
+MODEL_MODULES = ['detection', 'recognition']
+
 class FaceLogic:
-    def __init__(self, tolerance=0.5):
+    def __init__(self, tolerance=0.5, cache=None, runtime=None):
         """
-        Initialize InsightFace pipeline.
-        Model Pack: buffalo_l (ResNet-50/100 ArcFace + SCRFD)
+        InsightFace pipeline. Model Pack: buffalo_l (ResNet-50/100 ArcFace + SCRFD)
+        Construction is cheap: models load on load() (called by the startup
+        warmup) or on first use.
+        cache: optional EmbeddingCache consulted by analyze_largest/analyze_all.
+        runtime: ModelRuntime deciding pack, session options and quantization.
         """
         self.tolerance = tolerance # Not used for ArcFace directly usually, but 1.22 is roughly 0.5 cos
         # ArcFace thresholds: 
         # L2 Distance: 1.24 (approx 99% accuracy suitable) / Cosine: 0.3-0.4
         
-        print("⏳ Initializing InsightFace (buffalo_l)... This may take a moment to download models.")
-        try:
-            # providers=['CUDAExecutionProvider', 'CPUExecutionProvider'] if GPU available
-            self.app = FaceAnalysis(name='buffalo_l', providers=['CPUExecutionProvider'])
-            self.app.prepare(ctx_id=0, det_size=(640, 640))
-            print("✅ InsightFace model loaded successfully.")
-        except Exception as e:
-            print(f"❌ Failed to initialize InsightFace: {e}")
-            self.app = None
+        self.app = None
+        self.load_error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.intra_op_threads = 0
+        self._load_lock = threading.Lock()
+        self.cache = cache
+        self.runtime = runtime or model_runtime
 
-    def get_embedding(self, image_bytes):
+    @property
+    def ready(self):
+        return self.app is not None
+
+    def load(self):
+        """
+        Load detection + recognition (see ModelRuntime) and run one dummy inference
+        so ONNX Runtime has allocated and tuned its kernels before the first
+        real request. Thread-safe and idempotent. Returns True when ready.
+        """
+        with self._load_lock:
+            if self.app is not None:
+                return True
+
+            print(f"⏳ Initializing InsightFace ({self.runtime.pack})... This may take a moment to download models.")
+            t = time.perf_counter()
+            try:
+                app = self.runtime.load(MODEL_MODULES, threads=self.intra_op_threads or None)
+                self.load_seconds = time.perf_counter() - t
+
+                t = time.perf_counter()
+                self._warmup(app)
+                self.warmup_seconds = time.perf_counter() - t
+            except Exception as e:
+                print(f"❌ Failed to initialize InsightFace: {e}")
+                self.load_error = str(e)
+                return False
+
+            self.app = app
+            self.load_error = None
+            print(f"✅ InsightFace model loaded in {self.load_seconds:.2f}s, warmed up in {self.warmup_seconds:.2f}s.")
+            return True
+
+    @staticmethod
+    def _warmup(app):
+        app.det_model.detect(np.zeros((640, 640, 3), dtype=np.uint8), max_num=0, metric='default')
+        app.models['recognition'].get_feat([np.zeros((112, 112, 3), dtype=np.uint8)])
+
+    def _ensure_app(self):
         """
-        Extract high-accuracy face embedding (512-d).
+        Lazily load on first use if the startup warmup hasn't finished (or wasn't run).
         """
-        if self.app is None:
+        if self.app is None and not self.load():
             print("❌ InsightFace not initialized.")
-            return None
+        return self.app is not None
 
-        try:
-            # Decode and Enhance
-            img_np = self._decode_image(image_bytes)
-            if img_np is None: return None
-            
-            # Low-light enhancement
-            img_enhanced = enhancer.enhance_if_needed(img_np)
-            
-            # Detect and align
-            faces = self.app.get(img_enhanced)
-            
-            if len(faces) == 0:
-                print("⚠️ No faces detected by InsightFace.")
-                return None
-            
-            # Get largest face
-            largest_face = max(faces, key=lambda f: (f.bbox[2] - f.bbox[0]) * (f.bbox[3] - f.bbox[1]))
-            
-            # InsightFace automatically computes embedding in .embedding or .normed_embedding
-            # valid range for ArcFace is usually checking normed_embedding
-            embedding = largest_face.normed_embedding # 512-D
-            
-            # Ensure it is float32 for FAISS
-            return np.array(embedding, dtype=np.float32)
+    def set_intra_op_threads(self, threads):
+        """
+        Fix the ONNX intra-op thread count, now or when the models load.
+        Used by the inference executor so N workers don't each spin up
+        one thread per core and oversubscribe the CPU.
+        """
+        if not threads:
+            return
+        self.intra_op_threads = threads
+        if self.app is not None:
+            self._pin_threads(self.app, threads)
+
+    def _pin_threads(self, app, threads):
+        self.runtime.apply(app, threads)
+        print(f"⚙️ ONNX sessions pinned to {threads} intra-op thread(s).")
 
+    def _prepare(self, image_bytes, timings):
+        """
+        Decode (at reduced resolution for large JPEGs) and enhance.
+        Returns (image, factor) or None.
+        """
+        t = time.perf_counter()
+        img_np, factor = self._decode_image(image_bytes)
+        timings["decode_ms"] = (time.perf_counter() - t) * 1000
+        timings["decode_factor"] = factor
+        if img_np is None: return None
+
+        t = time.perf_counter()
+        img_enhanced, lighting = enhancer.enhance_with_info(img_np)
+        # enhance_ms is the enhancement alone, the brightness probe is reported separately
+        timings["brightness_ms"] = lighting["brightness_ms"]
+        timings["enhance_ms"] = (time.perf_counter() - t) * 1000 - lighting["brightness_ms"]
+        timings["brightness"] = lighting["brightness"]
+        timings["enhanced"] = float(lighting["enhanced"])
+        return img_enhanced, factor
+
+    def _detect(self, image_bytes, timings, prepared=None):
+        """
+        Decode, enhance and run the detector only.
+        Returns (image, bboxes, kpss, factor) or None.
+        """
+        prepared = prepared or self._prepare(image_bytes, timings)
+        if prepared is None: return None
+        img_enhanced, factor = prepared
+
+        t = time.perf_counter()
+        bboxes, kpss = self.app.det_model.detect(img_enhanced, max_num=0, metric='default')
+        timings["detect_ms"] = timings.get("detect_ms", 0.0) + (time.perf_counter() - t) * 1000
+        timings["faces_detected"] = timings.get("faces_detected", 0) + len(bboxes)
+        return img_enhanced, bboxes, kpss, factor
+
+    def _embed(self, crops, timings):
+        """
+        Run ArcFace once over a list of aligned 112x112 crops.
+        Returns an (n, 512) float32 array of normalized embeddings.
+        """
+        t = time.perf_counter()
+        feats = self.app.models['recognition'].get_feat(crops).astype(np.float32)
+        feats /= np.linalg.norm(feats, axis=1, keepdims=True)
+        timings["embed_ms"] = timings.get("embed_ms", 0.0) + (time.perf_counter() - t) * 1000
+        return feats
+
+    @staticmethod
+    def _align(img, kpss, indices):
+        from insightface.utils import face_align
+        return [face_align.norm_crop(img, landmark=kpss[i], image_size=112) for i in indices]
+
+    @staticmethod
+    def _areas(bboxes):
+        return (bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])
+
+    @staticmethod
+    def _recognizable(bboxes, factor):
+        """
+        Indices of faces at least MIN_FACE_SIZE px (original-photo scale) on their shorter side.
+        """
+        if len(bboxes) == 0:
+            return np.empty(0, dtype=np.int64)
+        sides = np.minimum(bboxes[:, 2] - bboxes[:, 0], bboxes[:, 3] - bboxes[:, 1])
+        return np.flatnonzero(sides * factor >= settings.MIN_FACE_SIZE)
+
+    def _cached(self, image_bytes, timings):
+        """
+        Look an upload up in the embedding cache. Returns (key, entry or None).
+        """
+        if self.cache is None or not self.cache.enabled:
+            return None, None
+        t = time.perf_counter()
+        key = self.cache.key(image_bytes)
+        entry = self.cache.get(key)
+        timings["cache_ms"] = (time.perf_counter() - t) * 1000
+        timings["cache_hit"] = float(entry is not None)
+        return key, entry
+
+    def _hit(self, entry, timings):
+        timings["cache_hit"] = 1.0
+        timings["brightness"] = entry.lighting["brightness"]
+        timings["enhanced"] = entry.lighting["enhanced"]
+        return timings
+
+    def _store(self, key, timings, bboxes, keep, embeddings, complete):
+        if key is None:
+            return
+        lighting = {"brightness": timings.get("brightness", 0.0), "enhanced": timings.get("enhanced", 0.0)}
+        self.cache.put(key, CachedFaces(bboxes, keep, embeddings, lighting, complete))
+
+    def analyze_largest(self, image_bytes):
+        """
+        Embedding of the largest face only, plus per-stage timings.
+        The recognition model runs on that one face, not on every detection.
+        Returns (embedding or None, timings).
+        """
+        timings = {}
+        if not self._ensure_app():
+            return None, timings
+
+        key, entry = self._cached(image_bytes, timings)
+        if entry is not None:
+            largest = entry.largest
+            if largest is None:
+                return None, self._hit(entry, timings)
+            if largest in entry.embeddings:
+                return entry.embeddings[largest], self._hit(entry, timings)
+            timings["cache_hit"] = 0.0
+
+        detected = self._detect(image_bytes, timings)
+        if detected is None: return None, timings
+        img, bboxes, kpss, factor = detected
+        keep = self._recognizable(bboxes, factor)
+
+        if len(bboxes) == 0:
+            print("⚠️ No faces detected by InsightFace.")
+            self._store(key, timings, bboxes, keep, {}, True)
+            return None, timings
+
+        largest = int(np.argmax(self._areas(bboxes)))
+        embedding = self._embed(self._align(img, kpss, [largest]), timings)[0]
+        self._store(key, timings, bboxes, keep, {largest: embedding}, set(keep.tolist()) <= {largest})
+        return embedding, timings
+
+    def analyze_enrollment(self, image_bytes, dominance=0.25):
+        """
+        Embedding for enrolling a student from a single-person photo, with a
+        verdict: "ok", "unreadable", "no_face", "small_face" (only faces
+        under MIN_FACE_SIZE) or "multiple_faces" (another recognizable face
+        at least `dominance` of the largest one's area). Bypasses the cache.
+        Returns (embedding or None, verdict, timings).
+        """
+        timings = {}
+        if not self._ensure_app():
+            return None, "model_unavailable", timings
+        detected = self._detect(image_bytes, timings)
+        if detected is None:
+            return None, "unreadable", timings
+        img, bboxes, kpss, factor = detected
+        if len(bboxes) == 0:
+            return None, "no_face", timings
+        keep = self._recognizable(bboxes, factor)
+        if len(keep) == 0:
+            return None, "small_face", timings
+
+        areas = self._areas(bboxes[keep])
+        order = np.argsort(-areas)
+        if len(keep) > 1 and areas[order[1]] >= dominance * areas[order[0]]:
+            return None, "multiple_faces", timings
+        largest = int(keep[order[0]])
+        return self._embed(self._align(img, kpss, [largest]), timings)[0], "ok", timings
+
+    def analyze_all(self, image_bytes):
+        """
+        Embeddings of every face at least MIN_FACE_SIZE px (in the original
+        photo) on its shorter side, plus per-stage timings. Faces too small to
+        recognize reliably are skipped before the recognition model runs.
+        Returns (list of embeddings, timings).
+        """
+        timings = {}
+        if not self._ensure_app(): return [], timings
+
+        key, entry = self._cached(image_bytes, timings)
+        if entry is not None:
+            if entry.complete:
+                return [entry.embeddings[i] for i in entry.keep.tolist()], self._hit(entry, timings)
+            # Only the largest face was embedded (by analyze_largest); run the full pipeline
+            timings["cache_hit"] = 0.0
+
+        detected = self._detect(image_bytes, timings)
+        if detected is None: return [], timings
+        img, bboxes, kpss, factor = detected
+
+        keep = self._recognizable(bboxes, factor)
+        timings["faces_embedded"] = len(keep)
+        if len(keep) == 0:
+            self._store(key, timings, bboxes, keep, {}, True)
+            return [], timings
+        embeddings = list(self._embed(self._align(img, kpss, keep), timings))
+        self._store(key, timings, bboxes, keep, dict(zip(keep.tolist(), embeddings)), True)
+        return embeddings, timings
+
+    def analyze_frame(self, image_bytes, skip_boxes=(), skip_iou=0.5):
+        """
+        One frame of a live stream: detect every face, but embed only the
+        recognizable ones that don't overlap `skip_boxes` (predicted boxes of
+        tracks that need no recognition this frame).
+        Returns (boxes (N, 5) in original-frame pixels, {detection index: embedding}, timings).
+        """
+        timings = {}
+        empty = np.zeros((0, 5), dtype=np.float32)
+        if not self._ensure_app(): return empty, {}, timings
+
+        detected = self._detect(image_bytes, timings)
+        if detected is None: return empty, {}, timings
+        img, bboxes, kpss, factor = detected
+
+        boxes = np.asarray(bboxes, dtype=np.float32).reshape(-1, 5).copy()
+        boxes[:, :4] *= factor
+        keep = self._recognizable(bboxes, factor)
+        if len(keep) and len(skip_boxes):
+            keep = keep[box_iou(boxes[keep, :4], skip_boxes).max(axis=1) < skip_iou]
+        timings["faces_embedded"] = len(keep)
+        if len(keep) == 0:
+            return boxes, {}, timings
+        return boxes, dict(zip(keep.tolist(), self._embed(self._align(img, kpss, keep), timings))), timings
+
+    def analyze_many(self, images):
+        """
+        Recognition embeddings for several photos of the same session.
+        Photos are decoded and enhanced concurrently, detected one by one, and
+        every recognizable face of every photo goes through ArcFace in one
+        batched call. Returns (list of per-photo embedding lists, timings);
+        timings sum the stages over all photos.
+        """
+        timings = {}
+        if not self._ensure_app(): return [[] for _ in images], timings
+
+        per_image = [{} for _ in images]
+        t = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(len(images), os.cpu_count() or 1) or 1) as pool:
+            prepared = list(pool.map(self._prepare, images, per_image))
+        timings["prepare_wall_ms"] = (time.perf_counter() - t) * 1000
+
+        crops, owners = [], []
+        for i, (image_bytes, ready) in enumerate(zip(images, prepared)):
+            if ready is None:
+                continue
+            img, bboxes, kpss, factor = self._detect(image_bytes, timings, ready)
+            keep = self._recognizable(bboxes, factor)
+            crops += self._align(img, kpss, keep)
+            owners += [i] * len(keep)
+
+        for stats in per_image:
+            for key in ("decode_ms", "brightness_ms", "enhance_ms"):
+                timings[key] = timings.get(key, 0.0) + stats.get(key, 0.0)
+        timings["images_enhanced"] = float(sum(stats.get("enhanced", 0.0) for stats in per_image))
+        timings["faces_embedded"] = len(crops)
+
+        results = [[] for _ in images]
+        if crops:
+            for i, feat in zip(owners, self._embed(crops, timings)):
+                results[i].append(feat)
+        return results, timings
+
+    def get_embedding(self, image_bytes):
+        """
+        Extract high-accuracy face embedding (512-D) of the largest face.
+        """
+        try:
+            embedding, _ = self.analyze_largest(image_bytes)
+            return embedding
         except Exception as e:
             print(f"❌ Error in get_embedding: {e}")
             return None
@@ -70,22 +361,41 @@ class FaceLogic:
         """
         Extract multiple normalized embeddings.
         """
-        if self.app is None: return []
-
         try:
-            img_np = self._decode_image(image_bytes)
-            if img_np is None: return []
-
-            img_enhanced = enhancer.enhance_if_needed(img_np)
-            faces = self.app.get(img_enhanced)
-            
-            embeddings = [np.array(face.normed_embedding, dtype=np.float32) for face in faces]
+            embeddings, _ = self.analyze_all(image_bytes)
             return embeddings
-
         except Exception as e:
             print(f"❌ Error in batch extraction: {e}")
             return []
 
+    def get_template_embeddings(self, images):
+        """
+        Enrollment templates from several photos of one student.
+        Each photo is detected separately, but the largest face of every photo
+        goes through the recognition model in a single batched call.
+        Returns a list aligned with `images` (None where no face was found).
+        """
+        if not self._ensure_app(): return [None] * len(images)
+
+        crops, owners, timings = [], [], {}
+        for i, image_bytes in enumerate(images):
+            try:
+                detected = self._detect(image_bytes, timings)
+                if detected is None or len(detected[1]) == 0:
+                    continue
+                img, bboxes, kpss, _ = detected
+                crops += self._align(img, kpss, [int(np.argmax(self._areas(bboxes)))])
+                owners.append(i)
+            except Exception as e:
+                print(f"❌ Error preparing template {i}: {e}")
+
+        results = [None] * len(images)
+        if not crops:
+            return results
+        for i, feat in zip(owners, self._embed(crops, timings)):
+            results[i] = feat
+        return results
+
     def recognize_face(self, detected_embedding):
         """
         Search for the face in the vector database.
@@ -104,17 +414,19 @@ class FaceLogic:
         return student_id, distance
 
     def _decode_image(self, image_bytes):
+        """
+        Returns (BGR image or None, downscale factor).
+        """
         try:
             if isinstance(image_bytes, bytes):
-                img_np = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
-            else:
-                # If it's already a PIL image or other
-                image = Image.open(image_bytes).convert("RGB")
-                img_np = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-            return img_np
+                return decode_image(image_bytes, settings.DECODE_TARGET_SIDE)
+            # If it's already a PIL image or other
+            from PIL import Image
+            image = Image.open(image_bytes).convert("RGB")
+            return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR), 1
         except Exception as e:
             print(f"❌ Failed to decode image: {e}")
-            return None
+            return None, 1
 
 # Global instance
-face_service = FaceLogic()
+face_service = FaceLogic(cache=embedding_cache)
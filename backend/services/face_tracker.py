@@ -0,0 +1,162 @@
+import numpy as np
+
+
+def box_iou(a, b):
+    """
+    Pairwise IoU of (N, 4) and (M, 4) x1,y1,x2,y2 boxes -> (N, M).
+    """
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+class KalmanBox:
+    # State: center x/y, width, height and their velocities (constant-velocity model)
+    F = np.eye(8, dtype=np.float64) + np.eye(8, k=4, dtype=np.float64)
+    H = np.eye(4, 8, dtype=np.float64)
+
+    def __init__(self, box):
+        self.x = np.zeros(8)
+        self.x[:4] = self._measure(box)
+        # Unknown velocity at first
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 1e3, 1e3, 1e3, 1e3])
+        self.Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.1, 0.1, 0.05, 0.05])
+        self.R = np.diag([4.0, 4.0, 9.0, 9.0])
+        # State before the last predict(), so a dropped frame can be undone
+        self._prior = None
+
+    @staticmethod
+    def _measure(box):
+        x1, y1, x2, y2 = box[:4]
+        return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1])
+
+    def predict(self):
+        self._prior = (self.x, self.P)
+        self.x = self.F @ self.x
+        self.P = self.F @ self.P @ self.F.T + self.Q
+        return self.box
+
+    def undo_predict(self):
+        if self._prior is not None:
+            self.x, self.P = self._prior
+            self._prior = None
+
+    def update(self, box):
+        y = self._measure(box) - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(8) - K @ self.H) @ self.P
+
+    @property
+    def box(self):
+        cx, cy, w, h = self.x[:4]
+        w, h = max(w, 1.0), max(h, 1.0)
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], dtype=np.float32)
+
+
+class Track:
+    def __init__(self, track_id, box, frame):
+        self.id = track_id
+        self.kalman = KalmanBox(box)
+        self.first_frame = frame
+        self.last_frame = frame
+        self.hits = 1
+        self.misses = 0
+        # student_id -> [votes, summed confidence]; None collects "no match" results
+        self.votes = {}
+        self.recognitions = 0
+        self.last_recognized = None
+
+    @property
+    def box(self):
+        return self.kalman.box
+
+    def vote(self, student_id, confidence, frame):
+        tally = self.votes.setdefault(student_id, [0, 0.0])
+        tally[0] += 1
+        tally[1] += confidence
+        self.recognitions += 1
+        self.last_recognized = frame
+
+    def identity(self, min_votes=2, min_share=0.6):
+        """
+        (student_id, mean confidence) once one student has at least
+        `min_votes` votes and `min_share` of all recognitions, else (None, 0).
+        """
+        if not self.votes:
+            return None, 0.0
+        student_id, (count, total) = max(self.votes.items(), key=lambda item: (item[1][0], item[1][1]))
+        if student_id is None or count < min_votes or count < min_share * self.recognitions:
+            return None, 0.0
+        return student_id, total / count
+
+
+class FaceTracker:
+    def __init__(self, iou_threshold=0.3, max_misses=5):
+        """
+        SORT-style tracker for detector boxes across video frames: every
+        track predicts its box with a Kalman filter, and detections are
+        assigned to predictions greedily by IoU. Tracks unseen for more than
+        `max_misses` processed frames are dropped.
+        """
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.tracks = []
+        self._next_id = 1
+
+    def predict(self):
+        """
+        Advance every track one frame. Returns their predicted boxes (T, 4).
+        """
+        return np.array([track.kalman.predict() for track in self.tracks], dtype=np.float32).reshape(-1, 4)
+
+    def undo_predict(self):
+        """
+        Take back the last predict(), for a frame that was never processed.
+        """
+        for track in self.tracks:
+            track.kalman.undo_predict()
+
+    def update(self, boxes, frame):
+        """
+        Match this frame's detections (N, 4+) to the predicted tracks; call
+        predict() first. Returns a track per detection (new tracks included).
+        """
+        boxes = np.asarray(boxes, dtype=np.float32)
+        boxes = boxes.reshape(len(boxes), -1) if len(boxes) else np.zeros((0, 4), dtype=np.float32)
+        assigned = [None] * len(boxes)
+        if len(boxes) and self.tracks:
+            iou = box_iou(boxes[:, :4], np.array([t.box for t in self.tracks]))
+            # Greedy assignment, best overlaps first
+            used = set()
+            candidates = np.argwhere(iou >= self.iou_threshold)
+            for d, t in candidates[np.argsort(-iou[candidates[:, 0], candidates[:, 1]], kind="stable")]:
+                if assigned[d] is None and t not in used:
+                    assigned[d] = self.tracks[t]
+                    used.add(t)
+
+        for d, track in enumerate(assigned):
+            if track is None:
+                track = assigned[d] = Track(self._next_id, boxes[d], frame)
+                self._next_id += 1
+                self.tracks.append(track)
+            else:
+                track.kalman.update(boxes[d])
+                track.hits += 1
+                track.misses = 0
+                track.last_frame = frame
+
+        matched = {id(track) for track in assigned}
+        for track in self.tracks:
+            if id(track) not in matched:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        return assigned
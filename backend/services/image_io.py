@@ -0,0 +1,70 @@
+import struct
+
+import cv2
+import numpy as np
+
+# Start-of-frame markers that carry the image size (baseline, progressive, ...)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+_REDUCED_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def jpeg_size(data):
+    """
+    (width, height) from a JPEG header without decoding it, or None if
+    `data` isn't a JPEG we can read the size of.
+    """
+    if len(data) < 4 or data[:2] != b"\xff\xd8":
+        return None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Fill byte
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        (length,) = struct.unpack(">H", data[pos + 2:pos + 4])
+        if marker in _SOF_MARKERS:
+            if pos + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def reduction_for(width, height, target_side):
+    """
+    Largest JPEG DCT scale (1, 2, 4 or 8) that keeps the longer side at or
+    above `target_side`.
+    """
+    longest = max(width, height)
+    for factor in (8, 4, 2):
+        if longest // factor >= target_side:
+            return factor
+    return 1
+
+
+def decode_image(data, target_side=0):
+    """
+    Decode image bytes to BGR. Large JPEGs are decoded straight to 1/2, 1/4 or
+    1/8 size (libjpeg skips the discarded DCT coefficients, so this is much
+    cheaper than a full decode + resize). `target_side` = 0 disables that.
+    Returns (image, factor), where factor is the downscale applied.
+    """
+    buffer = np.frombuffer(data, np.uint8)
+    factor = 1
+    if target_side:
+        size = jpeg_size(data)
+        if size is not None:
+            factor = reduction_for(*size, target_side)
+    return cv2.imdecode(buffer, _REDUCED_FLAGS.get(factor, cv2.IMREAD_COLOR)), factor
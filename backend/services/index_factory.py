@@ -0,0 +1,95 @@
+import math
+
+import faiss
+import numpy as np
+
+# All index types use inner product on L2-normalized ArcFace embeddings (= cosine).
+#   flat  - exact brute force, the default; fine up to a few hundred thousand faces
+#   ivf   - inverted lists, searches `nprobe` of `nlist` clusters
+#   ivfpq - ivf with product-quantized vectors (~16x smaller, lossy)
+#   hnsw  - graph index, fastest queries but no in-place removal
+INDEX_TYPES = ("flat", "ivf", "ivfpq", "hnsw")
+
+# Sub-quantizers for ivfpq: 64 x 8 bits = 64 bytes per 512-d vector
+PQ_M = 64
+PQ_BITS = 8
+# k-means gains little past this many points per cluster, but training time keeps growing
+TRAIN_POINTS_PER_LIST = 64
+
+
+def auto_nlist(n):
+    """
+    Rule-of-thumb cluster count for IVF: ~4 * sqrt(N).
+    """
+    return max(1, min(65536, int(4 * math.sqrt(max(n, 1)))))
+
+
+def create_index(kind, dimension, training=None, nlist=0, hnsw_m=32, ef_construction=200):
+    """
+    Build an empty index of the requested kind, trained on `training` if the
+    kind needs it. Returns (index, effective_kind): IVF kinds fall back to
+    flat when there are too few vectors to train on (e.g. an empty index
+    before the first sync).
+    """
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{kind}', expected one of {INDEX_TYPES}")
+
+    n = 0 if training is None else len(training)
+    if kind in ("ivf", "ivfpq"):
+        nlist = min(nlist or auto_nlist(n), max(n, 1))
+        min_points = max(nlist, 2 ** PQ_BITS if kind == "ivfpq" else 1)
+        if n < min_points or (kind == "ivfpq" and dimension % PQ_M):
+            print(f"ℹ️ Not enough vectors to train '{kind}' ({n}), using a flat index for now.")
+            kind = "flat"
+
+    if kind == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dimension)), kind
+
+    if kind == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(dimension, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = ef_construction
+        return faiss.IndexIDMap2(hnsw), kind
+
+    quantizer = faiss.IndexFlatIP(dimension)
+    if kind == "ivf":
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+    else:
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, PQ_M, PQ_BITS, faiss.METRIC_INNER_PRODUCT)
+    sample_size = max(nlist * TRAIN_POINTS_PER_LIST, 2 ** PQ_BITS * 39 if kind == "ivfpq" else 0)
+    if n > sample_size:
+        training = training[np.random.default_rng(0).choice(n, size=sample_size, replace=False)]
+    index.train(training)
+    # IVF stores our int64 keys natively; the hashtable lets us reconstruct/remove by key
+    index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return index, kind
+
+
+def index_kind(index):
+    """
+    Inverse of create_index, for indexes read back from disk.
+    """
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def tune_index(index, nprobe=None, ef_search=None):
+    """
+    Apply query-time knobs: nprobe for IVF kinds, efSearch for HNSW.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    if isinstance(index, faiss.IndexIDMap2):
+        base = faiss.downcast_index(index.index)
+        if isinstance(base, faiss.IndexHNSW) and ef_search:
+            base.hnsw.efSearch = ef_search
+
+
+def supports_remove(index):
+    return index_kind(index) != "hnsw"
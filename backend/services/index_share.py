@@ -0,0 +1,230 @@
+import asyncio
+import glob
+import os
+import time
+import uuid
+
+import numpy as np
+
+from core.config import settings
+from .index_snapshot import current_generation
+from .vector_search import VectorSearch, student_key, vector_search
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, every process runs standalone
+    fcntl = None
+
+OWNER_LOCK = "owner.lock"
+INBOX = "inbox"
+
+
+class IndexShare:
+    def __init__(self, index=None, factory=None, enabled=False, poll_seconds=1.0):
+        """
+        Keeps several uvicorn workers on one FAISS index.
+
+        With sharing enabled, the first worker to take an flock on the
+        snapshot directory becomes the owner. The owner syncs from Supabase,
+        applies all writes, and publishes each change as a new snapshot
+        generation. The other workers are followers. They never talk to
+        Supabase for embeddings; they watch the CURRENT generation, load
+        each new one (memory-mapped, so the vectors are shared) into a fresh
+        VectorSearch off the request path, and swap it in by reference.
+        In-flight searches finish on the old instance. Writes on a follower
+        are spooled to the owner through an inbox directory.
+
+        Disabled, this is a thin pass-through to the process's own index.
+        """
+        self.owned = index or vector_search
+        self.factory = factory or (lambda: VectorSearch(
+            index_path=self.owned.index_path,
+            mapping_path=self.owned.mapping_path,
+            section_cache_size=self.owned.section_cache_size,
+            index_type=self.owned.index_type,
+            nlist=self.owned.nlist,
+            nprobe=self.owned.nprobe,
+            ef_search=self.owned.ef_search,
+            max_templates=self.owned.max_templates,
+            aggregation=self.owned.aggregation,
+            load_on_init=False,
+            snapshot_dir=self.owned.snapshot_dir,
+            mmap=self.owned.mmap,
+            verify_snapshot=self.owned.verify_snapshot,
+            save_delay_seconds=self.owned.save_delay_seconds,
+        ))
+        self.enabled = enabled
+        self.poll_seconds = poll_seconds
+        self.role = "single"
+        self.swaps = 0
+        self._current = self.owned
+        self._lock_file = None
+
+    @property
+    def index(self):
+        """
+        The VectorSearch to query. Read it once per request.
+        """
+        return self._current
+
+    @property
+    def root(self):
+        return self.owned.snapshot_dir
+
+    @property
+    def inbox(self):
+        return os.path.join(self.root, INBOX)
+
+    def claim(self):
+        """
+        Decide this process's role: "single", "owner" or "follower".
+        """
+        if not self.enabled or fcntl is None:
+            self.role = "single"
+            return self.role
+
+        os.makedirs(self.inbox, exist_ok=True)
+        handle = open(os.path.join(self.root, OWNER_LOCK), "a+")
+        try:
+            # Held until the process exits; the kernel releases it if we crash
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self._lock_file = handle
+            self.role = "owner"
+        except BlockingIOError:
+            handle.close()
+            self.role = "follower"
+        print(f"👥 Index sharing: this worker (pid {os.getpid()}) is the {self.role}.")
+        return self.role
+
+    # --- Follower side ---
+
+    def refresh(self, verify=False):
+        """
+        Load a newer published generation, if any, and swap it in.
+        The owner checksummed it while writing, so by default only file
+        sizes are checked; hashing every file again in every follower would
+        turn each mmap load into a full read.
+        Returns True when a swap happened.
+        """
+        generation = current_generation(self.root)
+        if generation == 0 or generation == self._current.generation:
+            return False
+        fresh = self.factory()
+        fresh.load_index(verify=verify)
+        if fresh.generation == 0:
+            # Generation was pruned while we were loading it; try again next poll
+            return False
+        fresh.prepare()
+        self._current = fresh
+        self.swaps += 1
+        print(f"🔁 Swapped to index generation {fresh.generation} ({fresh.index.ntotal} vectors).")
+        return True
+
+    async def follow(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                print(f"⚠️ Index refresh failed: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+    async def wait_for_snapshot(self):
+        while self._current.generation == 0:
+            # First load at startup: full verification (INDEX_SNAPSHOT_VERIFY)
+            await asyncio.to_thread(self.refresh, self.owned.verify_snapshot)
+            if self._current.generation == 0:
+                await asyncio.sleep(self.poll_seconds)
+
+    def _spool(self, payload):
+        name = f"{time.time():.6f}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        tmp = os.path.join(self.inbox, f".{name}.tmp.npz")
+        np.savez(tmp, **payload)
+        os.replace(tmp, os.path.join(self.inbox, f"{name}.npz"))
+
+    # --- Writes (any role) ---
+
+    def upsert(self, student_ids, matrix, section_ids=None):
+        """
+        Insert or replace templates. Applied directly by the owner (or a
+        standalone process); followers hand them to the owner, and they show
+        up in the next generation.
+        """
+        if self.role != "follower":
+            return self.owned.upsert_vectors(student_ids, matrix, section_ids)
+        self._spool({
+            "kind": np.array("upsert"),
+            "student_ids": np.array([str(s) for s in student_ids]),
+            "matrix": np.asarray(matrix, dtype=np.float32).reshape(len(student_ids), -1),
+            "section_ids": np.array(["" if s is None else str(s) for s in (section_ids or [None] * len(student_ids))]),
+        })
+
+    def request_sync(self, mode):
+        """
+        Ask the owner to run a Supabase sync (followers never sync themselves).
+        """
+        self._spool({"kind": np.array(f"sync-{mode}")})
+
+    # --- Owner side ---
+
+    def drain_inbox(self, sync):
+        """
+        Apply spooled follower writes with a single save, and run requested
+        syncs. `sync(mode)` performs a Supabase sync. A student spooled more
+        than once keeps the templates of the newest write.
+        Returns the number of files processed.
+        """
+        files = sorted(glob.glob(os.path.join(self.inbox, "*.npz")))
+        batches, syncs = [], set()
+        for path in files:
+            try:
+                with np.load(path) as payload:
+                    kind = str(payload["kind"])
+                    if kind == "upsert":
+                        batches.append((payload["student_ids"].tolist(), payload["matrix"], payload["section_ids"].tolist()))
+                    elif kind.startswith("sync-"):
+                        syncs.add(kind[len("sync-"):])
+            except Exception as e:
+                print(f"⚠️ Dropping unreadable inbox file {path}: {e}")
+            os.remove(path)
+
+        if batches:
+            newest = {sid: n for n, (student_ids, _, _) in enumerate(batches) for sid in student_ids}
+            # No section given: keep the last one spooled, else the one the student already has
+            known = {sid: self.owned.sections.get(student_key(sid)) for sid in newest}
+            for ids, _, sections in batches:
+                known.update((sid, section_id) for sid, section_id in zip(ids, sections) if section_id)
+            student_ids, rows, section_ids = [], [], []
+            for n, (ids, matrix, sections) in enumerate(batches):
+                for row, (sid, section_id) in enumerate(zip(ids, sections)):
+                    if newest[sid] == n:
+                        student_ids.append(sid)
+                        rows.append(matrix[row])
+                        section_ids.append(section_id or known[sid])
+            self.owned.upsert_vectors(student_ids, np.vstack(rows), section_ids)
+            # Publish right away, followers are waiting for these writes
+            self.owned.flush()
+        for mode in ("full", "delta"):
+            if mode in syncs:
+                sync(mode)
+                break
+        return len(files)
+
+    async def own(self, sync):
+        while True:
+            try:
+                await asyncio.to_thread(self.drain_inbox, sync)
+            except Exception as e:
+                print(f"⚠️ Applying follower writes failed: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+    def stats(self):
+        return {
+            "role": self.role,
+            "generation": self._current.generation,
+            "swaps": self.swaps,
+            "pending_writes": len(glob.glob(os.path.join(self.inbox, "*.npz"))) if self.enabled else 0,
+        }
+
+
+# Global instance
+index_share = IndexShare(enabled=settings.INDEX_SHARED, poll_seconds=settings.INDEX_FOLLOW_SECONDS)
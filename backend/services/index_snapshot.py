@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import faiss
+
+# On-disk layout of a snapshot root:
+#   CURRENT              name of the live generation, swapped atomically
+#   gen-00000042/
+#     index.faiss        the FAISS index itself, memory-mapped on load
+#     manifest.json      format version, counts, per-file size + blake2b, labels, sections
+FORMAT_VERSION = 2
+# Version 1 also wrote keys.npy/vectors.npy, which nothing read; its index.faiss loads the same
+READABLE_VERSIONS = (1, 2)
+CURRENT = "CURRENT"
+INDEX = "index.faiss"
+MANIFEST = "manifest.json"
+# Generations kept on disk; older ones are deleted (processes that still map them keep their pages)
+KEEP_GENERATIONS = 2
+
+
+class SnapshotError(Exception):
+    """
+    Raised when a snapshot is missing, from an unknown format version, or fails its checksum.
+    """
+
+
+class Snapshot:
+    def __init__(self, generation, path, manifest, index, mapped):
+        self.generation = generation
+        self.path = path
+        self.manifest = manifest
+        self.index = index
+        # True when the index is a read-only view of the file
+        self.mapped = mapped
+
+    @property
+    def index_file(self):
+        return os.path.join(self.path, INDEX)
+
+
+def _generation_name(generation):
+    return f"gen-{generation:08d}"
+
+
+def _checksum(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fsync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def current_generation(root):
+    """
+    Generation number CURRENT points at, or 0 if there is no snapshot yet.
+    """
+    try:
+        with open(os.path.join(root, CURRENT)) as f:
+            return int(f.read().strip().rsplit("-", 1)[1])
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def write_snapshot(root, index, labels, sections, index_type):
+    """
+    Write a new generation next to the live one and switch CURRENT to it.
+    A crash at any point leaves CURRENT on a complete generation.
+    Returns the new generation number.
+    """
+    os.makedirs(root, exist_ok=True)
+    generation = current_generation(root) + 1
+    tmp = os.path.join(root, f".{_generation_name(generation)}.tmp{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    faiss.write_index(index, os.path.join(tmp, INDEX))
+
+    files = {}
+    for name in (INDEX,):
+        path = os.path.join(tmp, name)
+        _fsync(path)
+        files[name] = {"bytes": os.path.getsize(path), "blake2b": _checksum(path)}
+
+    manifest = {
+        "version": FORMAT_VERSION,
+        "generation": generation,
+        "created_at": time.time(),
+        "dimension": int(index.d),
+        "count": int(index.ntotal),
+        "index_type": index_type,
+        "files": files,
+        "labels": {str(k): v for k, v in labels.items()},
+        "sections": {str(k): v for k, v in sections.items()},
+    }
+    with open(os.path.join(tmp, MANIFEST), "w") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    final = os.path.join(root, _generation_name(generation))
+    shutil.rmtree(final, ignore_errors=True)
+    os.rename(tmp, final)
+
+    pointer = os.path.join(root, f"{CURRENT}.tmp{os.getpid()}")
+    with open(pointer, "w") as f:
+        f.write(_generation_name(generation))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer, os.path.join(root, CURRENT))
+    _fsync(root)
+
+    _prune(root, generation)
+    return generation
+
+
+def _prune(root, generation):
+    for name in os.listdir(root):
+        if name.startswith("gen-"):
+            try:
+                number = int(name.split("-", 1)[1])
+            except ValueError:
+                continue
+            if number <= generation - KEEP_GENERATIONS:
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def _mmap_flags(index_type):
+    # Flat/HNSW storage is IndexFlatCodes; IVF kinds map their inverted lists instead
+    if index_type in ("ivf", "ivfpq"):
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    return faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+
+def read_snapshot(root, mmap=True, verify=True):
+    """
+    Open the CURRENT generation. With mmap, the index is a read-only view
+    of its file, so every process serving the same snapshot shares one copy
+    in the page cache. File sizes are always checked; verify=True also
+    hashes every file, an O(N) read meant for startup rather than for
+    followers picking up each new generation.
+    """
+    generation = current_generation(root)
+    if generation == 0:
+        raise SnapshotError(f"No snapshot in {root}")
+    path = os.path.join(root, _generation_name(generation))
+
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get("version") not in READABLE_VERSIONS:
+        raise SnapshotError(f"Unsupported snapshot version {manifest.get('version')}")
+
+    for name, expected in manifest["files"].items():
+        file_path = os.path.join(path, name)
+        if os.path.getsize(file_path) != expected["bytes"]:
+            raise SnapshotError(f"Size mismatch in {file_path}")
+        if verify and _checksum(file_path) != expected["blake2b"]:
+            raise SnapshotError(f"Checksum mismatch in {file_path}")
+
+    flags = _mmap_flags(manifest["index_type"]) if mmap else 0
+    index = faiss.read_index(os.path.join(path, INDEX), flags)
+
+    if index.ntotal != manifest["count"]:
+        raise SnapshotError(f"Snapshot {path} is inconsistent")
+    return Snapshot(generation, path, manifest, index, mmap)
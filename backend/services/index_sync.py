@@ -0,0 +1,322 @@
+import resource
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from core.config import settings
+from core.database import supabase
+from .vector_search import vector_search
+
+
+def parse_pgvector_page(values, dimension):
+    """
+    Parse a page of pgvector values ("[0.1,0.2,...]" strings or lists) into an
+    (n, dimension) float32 array without creating a Python float per element.
+    Returns (matrix, ok_mask) where ok_mask flags rows that parsed cleanly.
+    """
+    n = len(values)
+    ok = np.ones(n, dtype=bool)
+
+    if all(isinstance(v, str) for v in values):
+        # One C-level parse for the whole page
+        flat = np.fromstring(",".join(v.strip()[1:-1] for v in values), dtype=np.float32, sep=",")
+        if flat.size == n * dimension:
+            return flat.reshape(n, dimension), ok
+
+    # Mixed types or a malformed row somewhere: fall back to per-row parsing
+    matrix = np.zeros((n, dimension), dtype=np.float32)
+    for row, value in enumerate(values):
+        try:
+            if isinstance(value, str):
+                vec = np.fromstring(value.strip()[1:-1], dtype=np.float32, sep=",")
+            else:
+                vec = np.asarray(value, dtype=np.float32)
+            matrix[row] = vec
+        except (ValueError, TypeError):
+            ok[row] = False
+    return matrix, ok
+
+
+def _parse_timestamp(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00")) if value else None
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class IndexSync:
+    def __init__(self, client_factory=supabase, index=None, page_size=1000, overlap_seconds=5):
+        """
+        Streams student embeddings from Supabase into the FAISS index.
+
+        Pages are fetched with keyset pagination (ORDER BY id, WHERE id > last)
+        so we never rely on a single unbounded select, which PostgREST silently
+        truncates at its max-rows limit.
+
+        Extra enrollment photos live in student_face_templates (see
+        student_face_templates.sql) and are loaded as additional templates
+        after each student's primary face_embedding.
+
+        Incremental syncs use students.updated_at and the student_face_tombstones
+        table (see student_embedding_sync.sql). Template writes touch the parent
+        student's updated_at, so a changed student is reloaded with all of its
+        templates. `watermark` is the newest change
+        already applied; each delta re-reads `overlap_seconds` before it to catch
+        transactions that committed late with an older now().
+        """
+        self.client_factory = client_factory
+        self.index = index or vector_search
+        self.page_size = page_size
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.watermark = None
+        self.last_stats = None
+
+    def _page_query(self, client, last_id, with_count):
+        query = client.table("students").select(
+            "id, face_embedding, section_id", count="exact" if with_count else None
+        ).not_.is_("face_embedding", "null").order("id").limit(self.page_size)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        return query
+
+    def iter_pages(self, client=None):
+        """
+        Yield (student_ids, matrix, section_ids, total) per page, where matrix
+        is an (n, dimension) float32 array and total is the server-side row
+        count reported with the first page (None afterwards).
+        """
+        client = client or self.client_factory()
+        dimension = self.index.dimension
+        last_id = None
+        first = True
+
+        while True:
+            response = self._page_query(client, last_id, with_count=first).execute()
+            rows = response.data or []
+            total = getattr(response, "count", None) if first else None
+            first = False
+
+            # Stop on an empty page rather than a short one: the server may cap
+            # page size below what we asked for.
+            if not rows:
+                return
+
+            last_id = rows[-1]["id"]
+            matrix, ok = parse_pgvector_page([r["face_embedding"] for r in rows], dimension)
+            rows = [r for r, good in zip(rows, ok) if good]
+            if not ok.all():
+                print(f"⚠️ Skipped {int((~ok).sum())} malformed embeddings.")
+                matrix = matrix[ok]
+
+            yield [str(r["id"]) for r in rows], matrix, [r.get("section_id") for r in rows], total
+
+    def iter_templates(self, client, student_ids=None):
+        """
+        Yield (student_ids, matrix) pages from student_face_templates, ordered by
+        student and template_no. Restricted to `student_ids` when given.
+        Yields nothing if the table doesn't exist yet.
+        """
+        dimension = self.index.dimension
+        chunks = [None] if student_ids is None else [
+            student_ids[i:i + self.page_size] for i in range(0, len(student_ids), self.page_size)
+        ]
+        try:
+            for chunk in chunks:
+                last_id = None
+                while True:
+                    query = client.table("student_face_templates").select("id, student_id, embedding")
+                    if chunk is not None:
+                        query = query.in_("student_id", chunk)
+                    if last_id is not None:
+                        query = query.gt("id", last_id)
+                    rows = query.order("id").limit(self.page_size).execute().data or []
+                    if not rows:
+                        break
+                    last_id = rows[-1]["id"]
+                    matrix, ok = parse_pgvector_page([r["embedding"] for r in rows], dimension)
+                    yield [str(r["student_id"]) for r, good in zip(rows, ok) if good], matrix[ok]
+        except Exception as e:
+            print(f"ℹ️ Face templates unavailable, using primary embeddings only: {e}")
+
+    def full_sync(self):
+        """
+        Pull every registered student and bulk-load the index.
+        Embeddings are copied page by page into one preallocated float32 matrix.
+        Returns a stats dict (rows, rows_per_s, peak_rss_mb, ...).
+        """
+        client = self.client_factory()
+        if not client:
+            print("⚠️ Supabase not configured, skipping sync.")
+            return None
+
+        start = time.perf_counter()
+        # Taken before paging: anything that changes mid-sync is re-read by the next delta
+        watermark = self._latest_change(client)
+
+        dimension = self.index.dimension
+        matrix = np.empty((0, dimension), dtype=np.float32)
+        student_ids = []
+        section_ids = []
+        pages = 0
+
+        for page_ids, page_matrix, page_sections, total in self.iter_pages(client):
+            pages += 1
+            needed = len(student_ids) + len(page_ids)
+            if total is not None and total > matrix.shape[0]:
+                matrix = np.empty((total, dimension), dtype=np.float32)
+            if needed > matrix.shape[0]:
+                # Table grew while we were paging
+                grown = np.empty((max(needed, matrix.shape[0] * 2), dimension), dtype=np.float32)
+                grown[:len(student_ids)] = matrix[:len(student_ids)]
+                matrix = grown
+            matrix[len(student_ids):needed] = page_matrix
+            student_ids.extend(page_ids)
+            section_ids.extend(page_sections)
+
+        students = len(student_ids)
+        matrix = matrix[:students]
+        if self.index.max_templates > 1 and students:
+            section_of = dict(zip(student_ids, section_ids))
+            extra_ids, extra = [], []
+            for page_ids, page_matrix in self.iter_templates(client):
+                # Templates only count for students with a primary embedding
+                keep = np.fromiter((s in section_of for s in page_ids), dtype=bool, count=len(page_ids))
+                extra_ids.extend(s for s, k in zip(page_ids, keep) if k)
+                extra.append(page_matrix[keep])
+            if extra_ids:
+                matrix = np.vstack([matrix] + extra)
+                student_ids.extend(extra_ids)
+                section_ids.extend(section_of[s] for s in extra_ids)
+
+        if student_ids:
+            self.index.bulk_load(student_ids, matrix, section_ids)
+        else:
+            print("⚠️ No students found in DB to sync.")
+
+        self.watermark = watermark
+
+        elapsed = time.perf_counter() - start
+        self.last_stats = {
+            "mode": "full",
+            "rows": students,
+            "templates": len(student_ids),
+            "pages": pages,
+            "seconds": round(elapsed, 3),
+            "rows_per_s": round(students / elapsed, 1) if elapsed > 0 else 0.0,
+            "matrix_mb": round(len(student_ids) * dimension * 4 / (1024 * 1024), 2),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+        }
+        print(f"✅ Synced {students} students from DB to FAISS "
+              f"({self.last_stats['rows_per_s']} rows/s, peak RSS {self.last_stats['peak_rss_mb']} MB).")
+        return self.last_stats
+
+    # --- Incremental sync ---
+
+    def _latest_change(self, client):
+        """
+        Newest students.updated_at / tombstone deleted_at, or None when the
+        change-tracking migration hasn't been applied.
+        """
+        latest = None
+        try:
+            for table, column in (("students", "updated_at"), ("student_face_tombstones", "deleted_at")):
+                rows = client.table(table).select(column).order(column, desc=True).limit(1).execute().data
+                if rows:
+                    ts = _parse_timestamp(rows[0][column])
+                    latest = ts if latest is None else max(latest, ts)
+            return latest or datetime(1970, 1, 1, tzinfo=timezone.utc)
+        except Exception as e:
+            print(f"ℹ️ Change tracking unavailable, delta sync disabled: {e}")
+            return None
+
+    def _iter_changes(self, client, table, columns, ts_column, id_column, since):
+        """
+        Keyset-paginate rows with (ts_column, id_column) > cursor, starting after `since`.
+        """
+        cursor = None
+        while True:
+            query = client.table(table).select(columns)
+            if cursor is None:
+                query = query.gt(ts_column, since.isoformat())
+            else:
+                ts, last_id = cursor
+                query = query.or_(f'{ts_column}.gt."{ts}",and({ts_column}.eq."{ts}",{id_column}.gt.{last_id})')
+            rows = query.order(ts_column).order(id_column).limit(self.page_size).execute().data or []
+            if not rows:
+                return
+            yield rows
+            cursor = (rows[-1][ts_column], rows[-1][id_column])
+
+    def delta_sync(self):
+        """
+        Apply only what changed since the last sync: re-registered or newly
+        registered students are upserted, deleted students and cleared
+        embeddings are removed. Falls back to full_sync when there is no
+        watermark yet.
+        """
+        if self.watermark is None:
+            return self.full_sync()
+
+        client = self.client_factory()
+        if not client:
+            print("⚠️ Supabase not configured, skipping sync.")
+            return None
+
+        start = time.perf_counter()
+        watermark = self._latest_change(client)
+        if watermark is None:
+            return self.full_sync()
+        since = self.watermark - self.overlap
+
+        upserts = {}
+        removed = set()
+        for rows in self._iter_changes(client, "students", "id, face_embedding, section_id, updated_at", "updated_at", "id", since):
+            cleared = [r for r in rows if r["face_embedding"] is None]
+            present = [r for r in rows if r["face_embedding"] is not None]
+            for r in cleared:
+                removed.add(str(r["id"]))
+                upserts.pop(str(r["id"]), None)
+            if present:
+                matrix, ok = parse_pgvector_page([r["face_embedding"] for r in present], self.index.dimension)
+                for r, vec, good in zip(present, matrix, ok):
+                    if good:
+                        upserts[str(r["id"])] = (vec, r.get("section_id"))
+                        removed.discard(str(r["id"]))
+
+        for rows in self._iter_changes(client, "student_face_tombstones", "student_id, deleted_at", "deleted_at", "student_id", since):
+            for r in rows:
+                removed.add(str(r["student_id"]))
+                upserts.pop(str(r["student_id"]), None)
+
+        upserted = removed_count = 0
+        if upserts or removed:
+            ids = list(upserts.keys())
+            matrix = np.array([vec for vec, _ in upserts.values()], dtype=np.float32).reshape(-1, self.index.dimension)
+            sections = [section for _, section in upserts.values()]
+            if self.index.max_templates > 1 and ids:
+                # Reload the full template set of every changed student
+                for page_ids, page_matrix in self.iter_templates(client, ids):
+                    matrix = np.vstack([matrix, page_matrix])
+                    sections.extend(upserts[s][1] for s in page_ids)
+                    ids.extend(page_ids)
+            upserted, removed_count = self.index.apply_delta(ids, matrix, removed, sections)
+
+        self.watermark = watermark
+        elapsed = time.perf_counter() - start
+        self.last_stats = {
+            "mode": "delta",
+            "upserted": upserted,
+            "removed": removed_count,
+            "seconds": round(elapsed, 3),
+        }
+        print(f"✅ Delta sync: {upserted} upserted, {removed_count} removed in {elapsed * 1000:.0f} ms.")
+        return self.last_stats
+
+
+# Global instance
+index_sync = IndexSync(page_size=settings.INDEX_SYNC_PAGE_SIZE, overlap_seconds=settings.INDEX_SYNC_OVERLAP_SECONDS)
@@ -0,0 +1,182 @@
+import asyncio
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from core.config import settings
+from .metrics import metrics as default_metrics
+
+
+class InferenceQueueFull(Exception):
+    """
+    Raised when every worker is busy and the admission queue is full.
+    The API layer turns this into a 503 with a Retry-After header.
+    """
+    def __init__(self, retry_after):
+        super().__init__("Inference queue is full, try again shortly.")
+        self.retry_after = retry_after
+
+
+# --- Worker-side helpers (must be module level so they can be pickled) ---
+
+_process_service = None
+
+def _init_process_worker(intra_op_threads):
+    """
+    Runs once in every worker process: each process owns its own FaceAnalysis.
+    """
+    global _process_service
+    from services.face_logic import face_service
+    face_service.set_intra_op_threads(intra_op_threads)
+    face_service.load()
+    _process_service = face_service
+
+def _call_in_process(method, args):
+    started = time.monotonic()
+    return started, getattr(_process_service, method)(*args)
+
+def _call_in_thread(service, method, args):
+    started = time.monotonic()
+    return started, getattr(service, method)(*args)
+
+
+class InferenceExecutor:
+    def __init__(self, mode="thread", workers=1, queue_size=16, intra_op_threads=0, retry_after=2, service=None,
+                 metrics=None):
+        """
+        Runs FaceLogic calls off the event loop on a bounded worker pool.
+
+        mode: "thread" (ONNX sessions are shared, they release the GIL while running)
+              or "process" (one FaceAnalysis per worker process).
+        queue_size: how many requests may wait for a free worker before we reject.
+        service: object exposing the FaceLogic methods (thread mode only, mainly for tests).
+        metrics: where queue depth, rejections and wait times are exported (/metrics).
+        """
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown inference mode: {mode}")
+
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.retry_after = retry_after
+        self.intra_op_threads = intra_op_threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self._service = service
+        self._pool = None
+        self.metrics = metrics or default_metrics
+
+        # Admitted requests = running + waiting. Only touched from the event loop
+        # (workers hand their release back to it).
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @property
+    def capacity(self):
+        return self.workers + self.queue_size
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.mode == "process":
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=mp.get_context("spawn"),
+                    initializer=_init_process_worker,
+                    initargs=(self.intra_op_threads,),
+                )
+            else:
+                if self._service is None:
+                    from services.face_logic import face_service
+                    if self.workers > 1:
+                        face_service.set_intra_op_threads(self.intra_op_threads)
+                    self._service = face_service
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        return self._pool
+
+    async def run(self, method, *args):
+        """
+        Call `method` on the face service in a worker and await the result.
+        Raises InferenceQueueFull instead of queueing unboundedly.
+        """
+        if self._pending >= self.capacity:
+            self._rejected += 1
+            self.metrics.record_inference_rejected()
+            raise InferenceQueueFull(self.retry_after)
+
+        self._pending += 1
+        self.metrics.record_inference_queue(self._pending, self.workers)
+        submitted = time.monotonic()
+        loop = asyncio.get_running_loop()
+        try:
+            pool = self._get_pool()
+            if self.mode == "process":
+                job = pool.submit(_call_in_process, method, args)
+            else:
+                job = pool.submit(_call_in_thread, self._service, method, args)
+        except BaseException:
+            self._release()
+            raise
+        # Free the slot when the worker is done, not when the caller gives up:
+        # a cancelled request keeps its worker busy until the call returns.
+        job.add_done_callback(lambda _: self._release_from_worker(loop))
+
+        started, result = await asyncio.wrap_future(job)
+        wait = max(0.0, started - submitted)
+        self._wait_total += wait
+        self._wait_max = max(self._wait_max, wait)
+        self.metrics.record_inference_wait(wait)
+        self._completed += 1
+        return result
+
+    def _release(self):
+        self._pending -= 1
+        self.metrics.record_inference_queue(self._pending, self.workers)
+
+    def _release_from_worker(self, loop):
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # The loop is closed, nothing is admitted anymore
+            pass
+
+    async def warmup(self):
+        """
+        Load and warm the models in every worker before real traffic arrives.
+        Returns True when all workers report ready.
+        """
+        calls = self.workers if self.mode == "process" else 1
+        results = await asyncio.gather(*(self.run("load") for _ in range(calls)), return_exceptions=True)
+        return all(r is True for r in results)
+
+    def stats(self):
+        """
+        Snapshot of queue depth and wait times for /health and metrics.
+        """
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "in_flight": self._pending,
+            "queue_depth": max(0, self._pending - self.workers),
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "avg_wait_ms": round(self._wait_total / self._completed * 1000, 2) if self._completed else 0.0,
+            "max_wait_ms": round(self._wait_max * 1000, 2),
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Global instance
+inference = InferenceExecutor(
+    mode=settings.INFERENCE_MODE,
+    workers=settings.INFERENCE_WORKERS,
+    queue_size=settings.INFERENCE_QUEUE_SIZE,
+    intra_op_threads=settings.ONNX_INTRA_OP_THREADS,
+    retry_after=settings.INFERENCE_RETRY_AFTER,
+)
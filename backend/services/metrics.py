@@ -0,0 +1,240 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from core.config import settings
+
+# Upper bounds in seconds, from a fast brightness probe to a slow CPU detection pass
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Pipeline timings (face_logic / main) -> stage label
+STAGES = {
+    "decode_ms": "decode",
+    "brightness_ms": "brightness",
+    "enhance_ms": "enhance",
+    "detect_ms": "detect",
+    "embed_ms": "recognize",
+    "search_ms": "search",
+    "cache_ms": "cache",
+}
+
+# Stage times of the request being handled, for the Server-Timing header
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_labels(key, le=le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_labels(key)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._series.get(tuple(sorted(labels.items())), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._series.items()):
+                lines.append(f"{self.name}{_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._series[tuple(sorted(labels.items()))] = value
+
+    def value(self, **labels):
+        return self._series.get(tuple(sorted(labels.items())), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._series.items()):
+                lines.append(f"{self.name}{_labels(key)} {value}")
+        return lines
+
+
+def _escape(value):
+    # Label values may not contain raw backslashes, quotes or newlines
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(key, **extra):
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Metrics:
+    def __init__(self, enabled=True, server_timing=False):
+        """
+        Stage latency histograms and face counters, exported in the
+        Prometheus text format by /metrics.
+
+        Pipeline stages are recorded from the `timings` dict every
+        inference call already returns, in the web process, so this works
+        the same with thread and process inference pools. Each uvicorn
+        worker keeps its own counts; scrape them per worker.
+        Disabled, every call returns immediately.
+        """
+        self.enabled = enabled
+        self.server_timing = server_timing
+        self.stage_seconds = Histogram("attendu_stage_seconds", "Time spent per pipeline stage.")
+        self.request_seconds = Histogram("attendu_request_seconds", "HTTP request latency.")
+        self.faces_detected = Counter("attendu_faces_detected_total", "Faces found by the detector.")
+        self.faces_matched = Counter("attendu_faces_matched_total", "Faces matched to a student under the threshold.")
+        self.images_enhanced = Counter("attendu_images_enhanced_total", "Images that got low-light enhancement.")
+        self.images = Counter("attendu_images_total", "Images run through the face pipeline.")
+        self.embedding_cache = Counter("attendu_embedding_cache_total", "Embedding cache lookups by result.")
+        # Inference admission (services/inference.py): backpressure behind the 503s
+        self.inference_in_flight = Gauge("attendu_inference_in_flight", "Inference calls admitted, running or waiting.")
+        self.inference_queue_depth = Gauge("attendu_inference_queue_depth", "Inference calls waiting for a free worker.")
+        self.inference_rejected = Counter("attendu_inference_rejected_total", "Inference calls rejected with 503, queue full.")
+        self.inference_wait_seconds = Histogram("attendu_inference_wait_seconds", "Time an inference call waited for a worker.")
+
+    @property
+    def active(self):
+        return self.enabled or self.server_timing
+
+    def _note(self, stage, seconds):
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds * 1000
+
+    def observe(self, stage, seconds):
+        """
+        Record one stage duration.
+        """
+        if not self.active:
+            return
+        if self.enabled:
+            self.stage_seconds.observe(seconds, stage=stage)
+        self._note(stage, seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Time a block, e.g. `with metrics.timer("db"):`.
+        """
+        if not self.active:
+            yield
+            return
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t)
+
+    def record_pipeline(self, timings, images=1):
+        """
+        Record the stage times and counts of one inference call.
+        `search_ms` is left to record_match.
+        """
+        if not self.active:
+            return
+        for key, stage in STAGES.items():
+            if key in timings and key != "search_ms":
+                self.observe(stage, timings[key] / 1000)
+        if self.enabled:
+            self.images.inc(images)
+            if "cache_hit" in timings:
+                self.embedding_cache.inc(result="hit" if timings["cache_hit"] else "miss")
+                if timings["cache_hit"]:
+                    return
+            self.faces_detected.inc(int(timings.get("faces_detected", 0)))
+            self.images_enhanced.inc(int(timings.get("images_enhanced", timings.get("enhanced", 0))))
+
+    def record_match(self, search_ms, matched):
+        if not self.active:
+            return
+        self.observe("search", search_ms / 1000)
+        if self.enabled:
+            self.faces_matched.inc(int(matched))
+
+    def record_inference_queue(self, in_flight, workers):
+        if self.enabled:
+            self.inference_in_flight.set(in_flight)
+            self.inference_queue_depth.set(max(0, in_flight - workers))
+
+    def record_inference_rejected(self):
+        if self.enabled:
+            self.inference_rejected.inc()
+
+    def record_inference_wait(self, seconds):
+        if self.enabled:
+            self.inference_wait_seconds.observe(seconds)
+
+    def begin_request(self):
+        """
+        Start collecting stage times for the current request; returns the dict.
+        """
+        timings = {}
+        _request_timings.set(timings)
+        return timings
+
+    def server_timing_header(self, timings, total_seconds):
+        parts = [f"{stage};dur={ms:.1f}" for stage, ms in timings.items()]
+        parts.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(parts)
+
+    def render(self):
+        lines = []
+        for metric in (self.stage_seconds, self.request_seconds, self.faces_detected,
+                       self.faces_matched, self.images_enhanced, self.images, self.embedding_cache,
+                       self.inference_in_flight, self.inference_queue_depth, self.inference_rejected,
+                       self.inference_wait_seconds):
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+# Global instance
+metrics = Metrics(enabled=settings.METRICS_ENABLED, server_timing=settings.SERVER_TIMING)
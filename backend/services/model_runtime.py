@@ -0,0 +1,204 @@
+import glob
+import os
+
+from core.config import settings
+
+QUANTIZE_CHOICES = ("", "recognition", "detection", "all")
+OPTIMIZATION_LEVELS = ("disable", "basic", "extended", "all")
+
+
+class ModelRuntime:
+    def __init__(self, pack="buffalo_l", detector_pack="", intra_op_threads=0, inter_op_threads=1,
+                 optimization="all", cache_dir="onnx_cache", cache_optimized=True, quantize=""):
+        """
+        How the InsightFace ONNX models are loaded and run.
+
+        pack: model pack for recognition (and detection unless detector_pack
+              is set). Changing the recognition model invalidates every
+              enrolled embedding, so switch packs only together with a full
+              re-enrollment.
+        detector_pack: pack to take SCRFD from, e.g. "buffalo_s" (det_500m)
+              for a much cheaper detector in front of buffalo_l's ArcFace.
+        optimization: ONNX Runtime graph optimization level.
+        cache_optimized: save each optimized graph to cache_dir and load it
+              on the next start, skipping graph optimization.
+        quantize: "recognition", "detection" or "all" runs a dynamically
+              quantized INT8 copy of those models (built once into cache_dir).
+              Check the drift first with benchmarks/compare_model_runtime.py.
+        """
+        if optimization not in OPTIMIZATION_LEVELS:
+            raise ValueError(f"Unknown ONNX optimization level: {optimization}")
+        if quantize not in QUANTIZE_CHOICES:
+            raise ValueError(f"Unknown quantize option: {quantize}")
+        self.pack = pack
+        self.detector_pack = detector_pack or pack
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.optimization = optimization
+        self.cache_dir = cache_dir
+        self.cache_optimized = cache_optimized
+        self.quantize = quantize
+
+    def quantized(self, module):
+        return self.quantize == "all" or self.quantize == module
+
+    def describe(self):
+        return {
+            "pack": self.pack,
+            "detector_pack": self.detector_pack,
+            "intra_op_threads": self.intra_op_threads,
+            "inter_op_threads": self.inter_op_threads,
+            "optimization": self.optimization,
+            "quantize": self.quantize or None,
+        }
+
+    # --- Files ---
+
+    def _cache_path(self, model_file, suffix):
+        import onnxruntime as ort
+        pack = os.path.basename(os.path.dirname(model_file))
+        name = os.path.splitext(os.path.basename(model_file))[0]
+        # Optimized graphs are tied to the ORT version (and the CPU features it saw)
+        return os.path.join(self.cache_dir, f"{pack}-{name}{suffix}-ort{ort.__version__}.onnx")
+
+    def quantized_file(self, model_file):
+        """
+        Path of the INT8 copy of `model_file`, building it on first use.
+        """
+        path = self._cache_path(model_file, "-int8")
+        if not os.path.exists(path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            os.makedirs(self.cache_dir, exist_ok=True)
+            print(f"⚙️ Quantizing {os.path.basename(model_file)} to INT8 (one-off)...")
+            tmp = f"{path}.tmp{os.getpid()}"
+            quantize_dynamic(model_file, tmp, weight_type=QuantType.QInt8)
+            os.replace(tmp, path)
+        return path
+
+    # --- Sessions ---
+
+    def session_options(self, threads=None):
+        import onnxruntime as ort
+        opts = ort.SessionOptions()
+        threads = threads or self.intra_op_threads
+        if threads:
+            opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = self.inter_op_threads
+        opts.graph_optimization_level = {
+            "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }[self.optimization]
+        return opts
+
+    def create_session(self, model_file, quantize=False, threads=None):
+        """
+        An InferenceSession for `model_file` with these options. With
+        cache_optimized, the first start saves the optimized graph and later
+        starts load it with optimization switched off.
+        """
+        import onnxruntime as ort
+        source = self.quantized_file(model_file) if quantize else model_file
+        opts = self.session_options(threads)
+        providers = ['CPUExecutionProvider']
+        if not (self.cache_optimized and self.optimization != "disable"):
+            return ort.InferenceSession(source, sess_options=opts, providers=providers)
+
+        cached = self._cache_path(model_file, f"{'-int8' if quantize else ''}-opt{self.optimization}")
+        if os.path.exists(cached):
+            opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            return ort.InferenceSession(cached, sess_options=opts, providers=providers)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Worker processes may race here; each writes its own file and the last rename wins
+        tmp = f"{cached}.tmp{os.getpid()}"
+        opts.optimized_model_filepath = tmp
+        session = ort.InferenceSession(source, sess_options=opts, providers=providers)
+        if os.path.exists(tmp):
+            os.replace(tmp, cached)
+        return session
+
+    def apply(self, app, threads=None):
+        """
+        Rebuild the sessions of loaded models with these options (e.g. a new thread count).
+        """
+        for module, model in app.models.items():
+            model.session = self.create_session(model.model_file, self.quantized(module), threads)
+
+    def build_model(self, module, model_file, threads=None):
+        from insightface.model_zoo.arcface_onnx import ArcFaceONNX
+        from insightface.model_zoo.scrfd import SCRFD
+
+        session = self.create_session(model_file, self.quantized(module), threads)
+        cls = SCRFD if module == 'detection' else ArcFaceONNX
+        # model_file stays the FP32 original: ArcFaceONNX reads its input normalization from it
+        return cls(model_file=model_file, session=session)
+
+    def load(self, modules, det_size=(640, 640), threads=None):
+        """
+        The models in `modules`, recognition from `pack` and SCRFD from
+        `detector_pack`, prepared. Sessions are created once, directly with
+        our options, instead of letting FaceAnalysis build default ones first.
+        """
+        models = {}
+        for module in modules:
+            pack = self.detector_pack if module == 'detection' else self.pack
+            files = [f for f in pack_files(pack) if module_of(f) == module]
+            if not files:
+                raise RuntimeError(f"No {module} model in pack {pack}")
+            models[module] = self.build_model(module, files[0], threads)
+        app = RuntimeApp(models)
+        app.prepare(ctx_id=0, det_size=det_size)
+        return app
+
+
+class RuntimeApp:
+    def __init__(self, models):
+        """
+        The parts of insightface's FaceAnalysis that FaceLogic uses.
+        """
+        self.models = models
+        self.det_model = models.get('detection')
+
+    def prepare(self, ctx_id=0, det_size=(640, 640), det_thresh=0.5):
+        for module, model in self.models.items():
+            if module == 'detection':
+                model.prepare(ctx_id, input_size=det_size, det_thresh=det_thresh)
+            else:
+                model.prepare(ctx_id)
+
+
+def pack_files(pack):
+    """
+    ONNX files of an InsightFace pack, downloaded on first use.
+    """
+    from insightface.utils.storage import ensure_available
+    root = ensure_available('models', pack, root='~/.insightface')
+    return sorted(glob.glob(os.path.join(root, '*.onnx')))
+
+
+def module_of(model_file):
+    """
+    Which pipeline module a pack file is: det_10g/det_500m -> detection,
+    w600k_r50/w600k_mbf/glintr100 -> recognition, else None (landmarks, genderage).
+    """
+    name = os.path.basename(model_file)
+    if name.startswith('det_'):
+        return 'detection'
+    if name.startswith(('w600k', 'glint')):
+        return 'recognition'
+    return None
+
+
+# Global instance
+model_runtime = ModelRuntime(
+    pack=settings.MODEL_PACK,
+    detector_pack=settings.DETECTOR_PACK,
+    intra_op_threads=settings.ONNX_INTRA_OP_THREADS,
+    inter_op_threads=settings.ONNX_INTER_OP_THREADS,
+    optimization=settings.ONNX_GRAPH_OPTIMIZATION,
+    cache_dir=settings.ONNX_CACHE_DIR,
+    cache_optimized=settings.ONNX_CACHE_OPTIMIZED,
+    quantize=settings.MODEL_QUANTIZE,
+)
@@ -0,0 +1,107 @@
+import numpy as np
+
+from .face_tracker import FaceTracker
+
+
+class StreamSession:
+    def __init__(self, min_votes=2, min_share=0.6, max_recognitions=5, recheck_frames=30, iou_threshold=0.3, max_misses=5):
+        """
+        Recognition state of one live camera stream.
+
+        Every processed frame is detected, and its boxes are tracked across
+        frames. ArcFace only runs on faces whose track still needs it: new
+        tracks, and tracks without a clear identity (up to
+        `max_recognitions` tries). Identified tracks are re-checked every
+        `recheck_frames`. A track's identity is the majority vote of its
+        recognitions. Students count as present from the first frame one of
+        their tracks is identified.
+        """
+        self.tracker = FaceTracker(iou_threshold=iou_threshold, max_misses=max_misses)
+        self.min_votes = min_votes
+        self.min_share = min_share
+        self.max_recognitions = max_recognitions
+        self.recheck_frames = recheck_frames
+        self.frame = 0
+        # student_id -> {"confidence", "first_frame", "last_frame", "tracks"}
+        self.presence = {}
+        self.frames_received = 0
+        self.frames_skipped = 0
+        self.faces_recognized = 0
+
+    def _needs_recognition(self, track):
+        if track.last_recognized is None:
+            return True
+        settled = track.identity(self.min_votes, self.min_share)[0] is not None or track.recognitions >= self.max_recognitions
+        return not settled or self.frame - track.last_recognized >= self.recheck_frames
+
+    def plan(self):
+        """
+        Start the next frame: advance the tracks and return the predicted
+        boxes (K, 4) of tracks that need no recognition this frame.
+        """
+        self.frame += 1
+        predicted = self.tracker.predict()
+        skip = [box for track, box in zip(self.tracker.tracks, predicted) if not self._needs_recognition(track)]
+        return np.array(skip, dtype=np.float32).reshape(-1, 4)
+
+    def drop(self):
+        """
+        The frame started by plan() could not be processed (inference busy):
+        undo its predict so the tracks don't coast without a measurement,
+        and don't count it as a frame.
+        """
+        self.tracker.undo_predict()
+        self.frame -= 1
+        self.frames_skipped += 1
+
+    def update(self, boxes, matches):
+        """
+        Feed this frame's detections (N, 4+) and recognition results
+        {detection index: (student_id or None, confidence)}.
+        Returns the frame report: tracks with their current identity and
+        the students who became present on this frame.
+        """
+        tracks = self.tracker.update(boxes, self.frame)
+        for d, (student_id, confidence) in matches.items():
+            tracks[d].vote(student_id, float(confidence), self.frame)
+        self.faces_recognized += len(matches)
+
+        new_present, report = [], []
+        for track in tracks:
+            student_id, confidence = track.identity(self.min_votes, self.min_share)
+            report.append({
+                "track_id": track.id,
+                "box": [round(float(v), 1) for v in track.box],
+                "student_id": student_id,
+                "confidence": round(confidence, 4),
+            })
+            if student_id is None:
+                continue
+            seen = self.presence.get(student_id)
+            if seen is None:
+                seen = self.presence[student_id] = {"confidence": confidence, "first_frame": self.frame, "tracks": set()}
+                new_present.append({"student_id": student_id, "confidence": round(confidence, 4)})
+            seen["confidence"] = max(seen["confidence"], confidence)
+            seen["last_frame"] = self.frame
+            seen["tracks"].add(track.id)
+        return {"frame": self.frame, "tracks": report, "new_present": new_present, "present_count": len(self.presence)}
+
+    def present(self):
+        return [
+            {
+                "student_id": student_id,
+                "confidence": round(seen["confidence"], 4),
+                "first_frame": seen["first_frame"],
+                "last_frame": seen.get("last_frame", seen["first_frame"]),
+            }
+            for student_id, seen in sorted(self.presence.items(), key=lambda item: item[1]["first_frame"])
+        ]
+
+    def summary(self):
+        return {
+            "frames_received": self.frames_received,
+            "frames_processed": self.frame,
+            "frames_skipped": self.frames_skipped,
+            "faces_recognized": self.faces_recognized,
+            "present": self.present(),
+        }
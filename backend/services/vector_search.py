@@ -1,111 +1,643 @@
 import faiss
 import numpy as np
-import pickle
+import hashlib
+import json
 import os
+import threading
+from collections import OrderedDict
+
+from core.config import settings
+from .index_factory import create_index, index_kind, tune_index, supports_remove
+from .index_snapshot import SnapshotError, current_generation, read_snapshot, write_snapshot
+
+# FAISS ids are signed int64; keep derived keys non-negative (-1 means "no result")
+_KEY_MASK = (1 << 63) - 1
+
+
+def student_key(student_id) -> int:
+    """
+    Stable int64 FAISS id for a student.
+    Numeric ids (bigint primary keys) are used as-is; anything else (UUIDs)
+    is hashed, so the same student always lands on the same id in every
+    process and across restarts.
+    """
+    text = str(student_id)
+    if text.isdigit():
+        return int(text) & _KEY_MASK
+    digest = hashlib.blake2b(text.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") & _KEY_MASK
+
+
+def template_key(student_id, slot) -> int:
+    """
+    FAISS id of a student's `slot`-th face template. Slot 0 is the student's
+    own key, so single-template indexes keep the same ids.
+    """
+    return student_key(student_id) if slot == 0 else student_key(f"{student_id}#{slot}")
+
+
+def _normalized(matrix, dimension):
+    matrix = np.array(matrix, dtype=np.float32, order="C").reshape(-1, dimension)
+    faiss.normalize_L2(matrix)
+    return matrix
+
+
+def _top_unique(codes, scores, k):
+    """
+    Per row, the k best-scoring distinct students among candidate columns.
+    codes: (N, K) student codes (-1 = empty slot), scores: (N, K).
+    Returns column positions (N, k) and a validity mask.
+    """
+    K = codes.shape[1]
+    earlier = np.tril(np.ones((K, K), dtype=bool), -1)
+    seen_before = ((codes[:, :, None] == codes[:, None, :]) & earlier[None]).any(axis=2)
+    first = ~seen_before & (codes >= 0)
+    ranked = np.where(first, scores, -np.inf)
+    order = np.argsort(-ranked, axis=1, kind="stable")[:, :k]
+    return order, np.take_along_axis(first, order, axis=1)
+
 
 class VectorSearch:
-    def __init__(self, dimension=512, index_path="faiss_index.bin", mapping_path="id_mapping.pkl"):
+    def __init__(self, dimension=512, index_path="faiss_index.bin", mapping_path="id_labels.json", section_cache_size=64,
+                 index_type="flat", nlist=0, nprobe=16, ef_search=64, max_templates=1, aggregation="max", load_on_init=True,
+                 snapshot_dir=None, mmap=True, verify_snapshot=True, save_delay_seconds=0):
+        """
+        The index is persisted as a versioned snapshot directory (see
+        services/index_snapshot.py), by default next to `index_path`.
+        index_path/mapping_path are only read to migrate an older save.
+        With mmap, a loaded snapshot is searched straight from the page cache
+        and copied into memory only when it is first modified.
+        load_on_init=False leaves reading the on-disk copy to the caller
+        (the app does it in its startup task, so importing stays cheap).
+        save_delay_seconds > 0 coalesces the snapshots of incremental writes
+        made within that window into one (see flush()).
+        """
         self.dimension = dimension
         self.index_path = index_path
         self.mapping_path = mapping_path
-        
-        # Initialize FAISS index (L2 Distance)
-        self.index = faiss.IndexFlatL2(dimension)
-        
-        # Mapping from FAISS integer ID to Student string ID
-        # FAISS uses incremental integers 0, 1, 2...
-        self.id_mapping = {} 
-        
-        self.load_index()
+        self.snapshot_dir = snapshot_dir or f"{os.path.splitext(index_path)[0]}.snapshot"
+        self.mmap = mmap
+        self.verify_snapshot = verify_snapshot
+        # Snapshot the index was loaded from (or last saved as), and whether self.index is a read-only view of it
+        self.generation = 0
+        self._snapshot_index_file = None
+        self._read_only = False
+        # Incremental writes not saved yet, and the timer that will save them
+        self.save_delay_seconds = save_delay_seconds
+        self._dirty = False
+        self._save_timer = None
+
+        # Face templates per student and how their scores combine at query time:
+        # "max" = best-matching template, "centroid" = similarity to the mean template
+        if aggregation not in ("max", "centroid"):
+            raise ValueError(f"Unknown template aggregation: {aggregation}")
+        self.max_templates = max(1, max_templates)
+        self.aggregation = aggregation
+
+        # Index type and query-time knobs, see services/index_factory.py
+        self.index_type = index_type
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+
+        # Initialize FAISS index (cosine similarity), addressed by stable student keys
+        self.index = self._new_index()
+
+        # Mapping from FAISS int64 key (one per template) to Student string ID
+        self.id_mapping = {}
+        # Sorted key/label/student-code arrays, rebuilt lazily for vectorized lookups
+        self._labels = None
+        # (n_students, d) mean template per student code, only for "centroid"
+        self._centroids = None
+
+        # Section of every key, so a class can be searched against its own roster only
+        self.sections = {}
+        self._section_members = {}
+        # LRU of per-section sub-indexes, dropped whenever that section changes
+        self.section_cache_size = section_cache_size
+        self._section_cache = OrderedDict()
+        # Background syncs run in worker threads while requests search on the loop.
+        # Searches take _lock only and it is held for in-memory changes alone;
+        # writers also hold _write_lock, which serializes changes and snapshot
+        # writes without blocking searches during the disk write.
+        self._lock = threading.RLock()
+        self._write_lock = threading.RLock()
+
+        if load_on_init:
+            self.load_index()
+
+    def _new_index(self, training=None):
+        index, _ = create_index(self.index_type, self.dimension, training, self.nlist)
+        tune_index(index, self.nprobe, self.ef_search)
+        return index
+
+    @property
+    def index_kind(self):
+        """
+        Type actually in use; IVF kinds start out flat until there is data to train on.
+        """
+        return index_kind(self.index)
+
+    def set_search_params(self, nprobe=None, ef_search=None):
+        """
+        Trade recall for latency at runtime (IVF nprobe / HNSW efSearch).
+        """
+        with self._lock:
+            self.nprobe = nprobe or self.nprobe
+            self.ef_search = ef_search or self.ef_search
+            tune_index(self.index, self.nprobe, self.ef_search)
+
+    def _group_templates(self, student_ids):
+        """
+        Group row numbers by student, keeping each student's first
+        `max_templates` rows. Returns {student_id: [row, ...]}.
+        """
+        groups = {}
+        for row, student_id in enumerate(student_ids):
+            rows = groups.setdefault(str(student_id), [])
+            if len(rows) < self.max_templates:
+                rows.append(row)
+        return groups
+
+    def _keys_for(self, groups):
+        owners = [student_id for student_id, rows in groups.items() for _ in rows]
+        keys = np.fromiter(
+            (template_key(student_id, slot) for student_id, rows in groups.items() for slot in range(len(rows))),
+            dtype=np.int64, count=len(owners),
+        )
+        for key, student_id in zip(keys.tolist(), owners):
+            owner = self.id_mapping.get(key)
+            if owner is not None and owner != student_id:
+                raise ValueError(f"FAISS key collision between students {owner} and {student_id}")
+        return keys, owners
+
+    def _existing_keys(self, student_id):
+        keys = (template_key(student_id, slot) for slot in range(self.max_templates))
+        return [key for key in keys if self.id_mapping.get(key) == student_id]
+
+    def _ensure_writable(self):
+        """
+        Memory-mapped indexes can't be modified: load a private copy first.
+        """
+        if self._read_only:
+            index = faiss.read_index(self._snapshot_index_file)
+            tune_index(index, self.nprobe, self.ef_search)
+            self.index = index
+            self._read_only = False
 
-    def add_vector(self, student_id: str, embedding: np.array):
+    def _invalidate(self):
+        self._labels = None
+        self._centroids = None
+
+    def add_vector(self, student_id: str, embedding: np.array, section_id=None):
         """
-        Add a new vector to the index.
+        Insert or replace the vector for one student.
+        Re-registering a student overwrites their previous face instead of
+        leaving a stale duplicate in the index.
         """
         if embedding.shape[0] != self.dimension:
             raise ValueError(f"Embedding dimension mismatch. Expected {self.dimension}, got {embedding.shape[0]}")
-        
-        # Reshape for FAISS (1, d)
-        vector = embedding.reshape(1, -1).astype('float32')
-        
-        # FAISS ID is the current number of vectors
-        faiss_id = self.index.ntotal
-        
-        # Add to index
-        self.index.add(vector)
-        
-        # Update mapping
-        self.id_mapping[faiss_id] = student_id
-        
-        # Auto-save
-        self.save_index()
-        
-        return faiss_id
+
+        self.upsert_vectors([student_id], embedding.reshape(1, -1), None if section_id is None else [section_id])
+        return student_key(student_id)
+
+    def add_templates(self, student_id: str, matrix: np.array, section_id=None):
+        """
+        Replace a student's face templates with the rows of `matrix`
+        (e.g. one per enrollment photo).
+        """
+        matrix = np.asarray(matrix, dtype=np.float32).reshape(-1, self.dimension)
+        self.upsert_vectors([student_id] * len(matrix), matrix, None if section_id is None else [section_id] * len(matrix))
+
+    def upsert_vectors(self, student_ids, matrix: np.array, section_ids=None):
+        """
+        Insert or replace vectors for several students, then save once.
+        A student listed on several rows gets one template per row.
+        """
+        self.apply_delta(student_ids, matrix, section_ids=section_ids)
+
+    def remove_vectors(self, student_ids):
+        """
+        Remove students from the index. Returns how many were present.
+        """
+        _, removed = self.apply_delta([], None, student_ids)
+        return removed
+
+    def apply_delta(self, student_ids, matrix: np.array, removed_ids=(), section_ids=None):
+        """
+        Upsert `student_ids` (rows of `matrix`) and drop `removed_ids` in place,
+        with a single save at the end. A student's rows replace all of their
+        existing templates. `section_ids` is row-aligned with `student_ids`;
+        when omitted, existing students keep their section.
+        Returns (students upserted, students removed).
+        """
+        groups = self._group_templates(student_ids)
+        removed_ids = [str(s) for s in removed_ids if str(s) not in groups]
+
+        rows = [row for group in groups.values() for row in group]
+        if rows:
+            matrix = _normalized(matrix, self.dimension)
+            if matrix.shape[0] != len(student_ids):
+                raise ValueError(f"Got {len(student_ids)} ids for {matrix.shape[0]} vectors")
+            matrix = matrix[rows]
+
+        with self._write_lock:
+            with self._lock:
+                self._ensure_writable()
+                keys, owners = self._keys_for(groups)
+                if section_ids is not None:
+                    owner_sections = [section_ids[row] for row in rows]
+                else:
+                    owner_sections = [self.sections.get(student_key(owner)) for owner in owners]
+
+                removed = sum(1 for s in removed_ids if self._existing_keys(s))
+                stale = np.array([k for s in list(groups) + removed_ids for k in self._existing_keys(s)], dtype=np.int64)
+                rebuild = len(stale) and not supports_remove(self.index)
+                if not rebuild:
+                    if len(stale):
+                        self.index.remove_ids(stale)
+                        for key in stale.tolist():
+                            del self.id_mapping[key]
+                            self._set_section(key, None)
+                    if len(keys):
+                        self.index.add_with_ids(matrix, keys)
+                        self.id_mapping.update(zip(keys.tolist(), owners))
+                        for key, section_id in zip(keys.tolist(), owner_sections):
+                            self._set_section(key, section_id)
+                    self._invalidate()
+
+            if rebuild:
+                # HNSW can't delete in place: rebuild from the surviving vectors
+                self._rebuild_without(stale, owners, matrix, owner_sections)
+            elif len(stale) or len(keys):
+                self._schedule_save()
+
+        return len(groups), removed
 
     def search(self, embedding: np.array, k=1):
         """
         Search for the k nearest neighbors.
         Returns list of (student_id, distance).
         """
-        if self.index.ntotal == 0:
-            return []
-            
-        vector = embedding.reshape(1, -1).astype('float32')
-        distances, indices = self.index.search(vector, k)
-        
-        results = []
-        for i in range(k):
-            idx = indices[0][i]
-            dist = distances[0][i]
-            
-            if idx != -1 and idx in self.id_mapping:
-                results.append((self.id_mapping[idx], float(dist)))
-                
-        return results
+        student_ids, distances = self.search_batch(embedding.reshape(1, -1), k)
+        return [
+            (student_id, float(dist))
+            for student_id, dist in zip(student_ids[0], distances[0])
+            if student_id is not None
+        ]
+
+    def search_batch(self, matrix: np.array, k=1, section_id=None):
+        """
+        Search all query vectors in a single FAISS call.
+        matrix: (N, d) array, one row per detected face.
+        section_id: restrict the search to students of one section.
+        Returns (student_ids, distances), both shaped (N, k). Slots without a
+        match hold None / inf.
+        """
+        queries = _normalized(matrix, self.dimension)
+        n = queries.shape[0]
+
+        with self._lock:
+            index = self.index if section_id is None else self._section_index(str(section_id))
+            if index is None or index.ntotal == 0 or n == 0:
+                return np.full((n, k), None, dtype=object), np.full((n, k), np.inf, dtype=np.float32)
+
+            # Over-fetch so k distinct students survive when several templates of one student rank high
+            candidates = min(index.ntotal, k * self.max_templates)
+            similarities, keys = index.search(queries, candidates)
+            codes = self._lookup(keys)
+            if self.aggregation == "centroid":
+                similarities = self._centroid_scores(queries, codes)
+            students = self._labels[2]
+
+        order, valid = _top_unique(codes, similarities, k)
+        if order.shape[1] < k:
+            pad = k - order.shape[1]
+            order = np.pad(order, ((0, 0), (0, pad)))
+            valid = np.pad(valid, ((0, 0), (0, pad)))
+        top_codes = np.take_along_axis(codes, order, axis=1)
+        top_sims = np.take_along_axis(similarities, order, axis=1)
+
+        student_ids = np.full((n, k), None, dtype=object)
+        student_ids[valid] = students[top_codes[valid]]
+        # Report squared L2 between unit vectors (2 - 2cos) so thresholds keep their meaning
+        distances = np.where(valid, np.maximum(0.0, 2.0 - 2.0 * top_sims), np.inf).astype(np.float32)
+        return student_ids, distances
+
+    def _lookup(self, keys):
+        """
+        Map an array of FAISS keys to student codes (-1 where unknown).
+        Codes index into self._labels[2], the array of distinct student ids.
+        """
+        if self._labels is None:
+            sorted_keys = np.array(sorted(self.id_mapping), dtype=np.int64)
+            students, codes = np.unique(
+                np.array([self.id_mapping[k] for k in sorted_keys.tolist()], dtype=object).astype(str),
+                return_inverse=True,
+            )
+            self._labels = (sorted_keys, codes.astype(np.int64), students.astype(object))
+        sorted_keys, key_codes, _ = self._labels
+
+        codes = np.full(keys.shape, -1, dtype=np.int64)
+        if len(sorted_keys) == 0:
+            return codes
+        pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+        found = sorted_keys[pos] == keys
+        codes[found] = key_codes[pos[found]]
+        return codes
+
+    def prepare(self):
+        """
+        Build the lazy lookup tables now, e.g. before swapping this index in,
+        so the first query doesn't pay for them.
+        """
+        with self._lock:
+            self._lookup(np.empty(0, dtype=np.int64))
+            if self.aggregation == "centroid" and self.index.ntotal:
+                self._centroid_scores(np.empty((0, self.dimension), dtype=np.float32), np.empty((0, 0), dtype=np.int64))
+
+    def _centroid_scores(self, queries, codes):
+        """
+        Similarity of each query to the mean template of each candidate student.
+        """
+        if self._centroids is None:
+            sorted_keys, key_codes, students = self._labels
+            vectors = self.index.reconstruct_batch(sorted_keys)
+            centroids = np.zeros((len(students), self.dimension), dtype=np.float32)
+            np.add.at(centroids, key_codes, vectors)
+            faiss.normalize_L2(centroids)
+            self._centroids = centroids
+        candidates = self._centroids[np.maximum(codes, 0)]
+        return np.einsum("nd,nkd->nk", queries, candidates)
+
+    def _set_section(self, key, section_id):
+        """
+        Record (or clear, with None) the section of a key and invalidate the
+        cached sub-indexes of both the old and the new section.
+        """
+        section_id = None if section_id is None else str(section_id)
+        old = self.sections.pop(key, None)
+        if old is not None:
+            self._section_members.get(old, set()).discard(key)
+            self._section_cache.pop(old, None)
+        if section_id is not None:
+            self.sections[key] = section_id
+            self._section_members.setdefault(section_id, set()).add(key)
+            self._section_cache.pop(section_id, None)
+
+    def _section_index(self, section_id):
+        """
+        Small flat index holding only one section's students, built from the
+        main index on first use and kept in an LRU cache.
+        """
+        cached = self._section_cache.get(section_id)
+        if cached is not None:
+            self._section_cache.move_to_end(section_id)
+            return cached
+
+        members = self._section_members.get(section_id)
+        if not members:
+            return None
+        keys = np.fromiter(members, dtype=np.int64, count=len(members))
+        vectors = np.vstack([self.index.reconstruct(int(key)) for key in keys])
+        sub_index = faiss.IndexIDMap(faiss.IndexFlatIP(self.dimension))
+        sub_index.add_with_ids(vectors, keys)
+
+        self._section_cache[section_id] = sub_index
+        while len(self._section_cache) > self.section_cache_size:
+            self._section_cache.popitem(last=False)
+        return sub_index
+
+    def compact(self):
+        """
+        Rebuild the index from its live vectors, dropping any storage left
+        behind by removals and re-checking that keys and labels agree.
+        """
+        with self._write_lock:
+            self._rebuild_without(np.empty(0, dtype=np.int64))
+
+    def template_counts(self):
+        """
+        {student_id: number of templates in the index}.
+        """
+        counts = {}
+        for student_id in self.id_mapping.values():
+            counts[student_id] = counts.get(student_id, 0) + 1
+        return counts
+
+    def _rebuild_without(self, dropped_keys, student_ids=(), matrix=None, section_ids=None):
+        """
+        Rebuild (and retrain) the index from the live vectors minus `dropped_keys`,
+        plus optional new rows. Used for compaction and by index types that
+        can't remove in place.
+        """
+        dropped = set(np.asarray(dropped_keys).tolist())
+        live_keys = [k for k in self.id_mapping if k not in dropped]
+        live = self.index.reconstruct_batch(np.array(live_keys, dtype=np.int64)) if live_keys else np.empty((0, self.dimension), dtype=np.float32)
+
+        new_sections = section_ids if section_ids is not None else [None] * len(student_ids)
+        self.bulk_load(
+            [self.id_mapping[k] for k in live_keys] + list(student_ids),
+            np.vstack([live, matrix]) if len(student_ids) else live,
+            [self.sections.get(k) for k in live_keys] + list(new_sections),
+        )
+
+    def _schedule_save(self):
+        """
+        Persist an incremental write. The index is rebuilt from Supabase on
+        restart anyway, so with a save delay a burst of registrations shares
+        one snapshot instead of writing a generation each.
+        """
+        if self.save_delay_seconds <= 0:
+            self.save_index()
+            return
+        with self._write_lock:
+            self._dirty = True
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.save_delay_seconds, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def flush(self):
+        """
+        Save now if there are writes not in a snapshot yet.
+        Returns True if a snapshot was written.
+        """
+        with self._write_lock:
+            timer, self._save_timer = self._save_timer, None
+            if timer is not None:
+                timer.cancel()
+            if not self._dirty:
+                return False
+            self.save_index()
+            return True
 
     def save_index(self):
         """
-        Save index and mapping to disk.
+        Write the index and the labels as a new snapshot generation. The
+        live generation is switched atomically, so a crash mid-save never
+        leaves a truncated or mismatched snapshot behind.
+
+        Only the copy of the labels is taken under the search lock; the
+        files are written and checksummed after it is released. Call it from
+        a worker thread, never the event loop.
         """
-        try:
-            faiss.write_index(self.index, self.index_path)
-            with open(self.mapping_path, 'wb') as f:
-                pickle.dump(self.id_mapping, f)
-            print(f"✅ FAISS index saved locally ({self.index.ntotal} vectors).")
-        except Exception as e:
-            # On some cloud platforms (like Hugging Face), the root directory is read-only.
-            # This is OK because we sync from Supabase database on startup anyway.
-            print(f"ℹ️ Local FAISS cache not saved: {e}")
-            print("💡 This is normal on some servers. The system will sync from Supabase on restart.")
+        with self._write_lock:
+            self._dirty = False
+            with self._lock:
+                index = self.index
+                labels = dict(self.id_mapping)
+                sections = dict(self.sections)
+                kind = self.index_kind
+            try:
+                # No writer can change `index` meanwhile: they all wait on _write_lock
+                generation = write_snapshot(self.snapshot_dir, index, labels, sections, kind)
+            except Exception as e:
+                # On some cloud platforms (like Hugging Face), the root directory is read-only.
+                # This is OK because we sync from Supabase database on startup anyway.
+                print(f"ℹ️ Local FAISS cache not saved: {e}")
+                print("💡 This is normal on some servers. The system will sync from Supabase on restart.")
+                return
+            with self._lock:
+                self.generation = generation
+                self._snapshot_index_file = None
+            print(f"✅ FAISS index saved locally ({index.ntotal} vectors, generation {generation}).")
 
-    def load_index(self):
+    def load_index(self, verify=None):
         """
-        Load index and mapping from disk if they exist.
+        Load the current snapshot if there is one, else an older
+        faiss_index.bin + id_labels.json pair. `verify` overrides
+        verify_snapshot (full checksums) for this load.
         """
+        if current_generation(self.snapshot_dir):
+            try:
+                verify = self.verify_snapshot if verify is None else verify
+                snapshot = read_snapshot(self.snapshot_dir, mmap=self.mmap, verify=verify)
+                self._install(snapshot)
+                print(f"✅ FAISS snapshot loaded (generation {snapshot.generation}, "
+                      f"{'memory-mapped' if snapshot.mapped else 'in memory'}). Total vectors: {self.index.ntotal}")
+                return
+            except (SnapshotError, OSError, RuntimeError, ValueError, KeyError) as e:
+                print(f"❌ Failed to load FAISS snapshot: {e}.")
+
         if os.path.exists(self.index_path) and os.path.exists(self.mapping_path):
             try:
-                self.index = faiss.read_index(self.index_path)
-                with open(self.mapping_path, 'rb') as f:
-                    self.id_mapping = pickle.load(f)
-                print(f"✅ FAISS index loaded. Total vectors: {self.index.ntotal}")
+                index = faiss.read_index(self.index_path)
+                if not isinstance(index, (faiss.IndexIDMap2, faiss.IndexIVF)) or index.metric_type != faiss.METRIC_INNER_PRODUCT:
+                    raise ValueError("index was written by an older version (L2 metric or no stable ids)")
+                tune_index(index, self.nprobe, self.ef_search)
+                with open(self.mapping_path, 'r') as f:
+                    saved = json.load(f)
+                with self._write_lock, self._lock:
+                    self.id_mapping = {int(k): v for k, v in saved["labels"].items()}
+                    self._reset_sections({int(k): v for k, v in saved.get("sections", {}).items()})
+                    self.index = index
+                    self._read_only = False
+                    self._invalidate()
+                print(f"✅ FAISS index loaded from legacy files. Total vectors: {self.index.ntotal}")
             except Exception as e:
+                self.id_mapping = {}
                 print(f"❌ Failed to load FAISS index: {e}. Starting fresh.")
         else:
             print("🆕 No existing FAISS index found. Starting fresh.")
 
+    def _install(self, snapshot):
+        """
+        Swap a loaded snapshot in as the live index.
+        """
+        index = snapshot.index
+        if not isinstance(index, (faiss.IndexIDMap2, faiss.IndexIVF)) or index.metric_type != faiss.METRIC_INNER_PRODUCT:
+            raise ValueError("snapshot index has no stable ids or the wrong metric")
+        if snapshot.manifest["dimension"] != self.dimension:
+            raise ValueError(f"snapshot dimension {snapshot.manifest['dimension']} != {self.dimension}")
+        tune_index(index, self.nprobe, self.ef_search)
+        labels = {int(k): v for k, v in snapshot.manifest["labels"].items()}
+        sections = {int(k): v for k, v in snapshot.manifest["sections"].items()}
+        with self._write_lock, self._lock:
+            self.index = index
+            self.id_mapping = labels
+            self._reset_sections(sections)
+            self._invalidate()
+            self.generation = snapshot.generation
+            self._snapshot_index_file = snapshot.index_file
+            self._read_only = snapshot.mapped
+
     def rebuild_index(self, embeddings_dict):
         """
         Rebuild index from a dictionary of {student_id: embedding_list}.
         Useful for migration or restore.
         """
-        self.index.reset()
-        self.id_mapping = {}
-        
-        for student_id, emb_list in embeddings_dict.items():
-            emb_np = np.array(emb_list).astype('float32')
-            self.add_vector(student_id, emb_np)
-            
-        print(f"✅ FAISS index rebuilt with {len(embeddings_dict)} entries.")
+        student_ids = list(embeddings_dict.keys())
+        matrix = np.empty((len(student_ids), self.dimension), dtype=np.float32)
+        for row, emb_list in enumerate(embeddings_dict.values()):
+            matrix[row] = emb_list
+
+        self.bulk_load(student_ids, matrix)
+
+    def _reset_sections(self, sections):
+        self.sections = {}
+        self._section_members = {}
+        self._section_cache.clear()
+        for key, section_id in sections.items():
+            self._set_section(key, section_id)
+
+    def bulk_load(self, student_ids, matrix: np.array, section_ids=None):
+        """
+        Replace the whole index with `matrix` (N, d) in one FAISS add and a
+        single save, instead of one add_vector + save_index per student.
+        `section_ids`, if given, is row-aligned with `student_ids`. Students
+        listed on several rows get one template per row.
+        """
+        if np.ndim(matrix) != 2 or np.shape(matrix)[1] != self.dimension:
+            raise ValueError(f"Expected an (N, {self.dimension}) matrix, got {np.shape(matrix)}")
+        matrix = _normalized(matrix, self.dimension)
+        if matrix.shape[0] != len(student_ids):
+            raise ValueError(f"Got {len(student_ids)} ids for {matrix.shape[0]} vectors")
+
+        groups = self._group_templates(student_ids)
+        rows = [row for group in groups.values() for row in group]
+        if rows != list(range(len(student_ids))):
+            # Group each student's templates together, dropping any beyond max_templates
+            matrix = matrix[rows]
+        owners = [student_id for student_id, group in groups.items() for _ in group]
+        keys = np.fromiter(
+            (template_key(student_id, slot) for student_id, group in groups.items() for slot in range(len(group))),
+            dtype=np.int64, count=len(owners),
+        )
+        id_mapping = dict(zip(keys.tolist(), owners))
+        if len(id_mapping) != len(owners):
+            raise ValueError("FAISS key collision while bulk loading students")
+        sections = {}
+        if section_ids is not None:
+            sections = {key: section_ids[row] for key, row in zip(keys.tolist(), rows) if section_ids[row] is not None}
+
+        # Build the new index aside and swap it in, so searches never see a half-filled index
+        index = self._new_index(training=matrix)
+        if len(keys):
+            index.add_with_ids(matrix, keys)
+
+        with self._write_lock:
+            with self._lock:
+                self.index = index
+                self._read_only = False
+                self.id_mapping = id_mapping
+                self._invalidate()
+                self._reset_sections(sections)
+            self.save_index()
+        print(f"✅ FAISS index rebuilt with {len(id_mapping)} templates for {len(groups)} students ({self.index_kind}).")
 
 # Global instance
-vector_search = VectorSearch()
+vector_search = VectorSearch(
+    section_cache_size=settings.SECTION_CACHE_SIZE,
+    index_type=settings.INDEX_TYPE,
+    nlist=settings.INDEX_NLIST,
+    nprobe=settings.INDEX_NPROBE,
+    ef_search=settings.INDEX_EF_SEARCH,
+    max_templates=settings.MAX_FACE_TEMPLATES,
+    aggregation=settings.TEMPLATE_AGGREGATION,
+    load_on_init=False,
+    snapshot_dir=settings.INDEX_SNAPSHOT_DIR,
+    mmap=settings.INDEX_MMAP,
+    verify_snapshot=settings.INDEX_SNAPSHOT_VERIFY,
+    save_delay_seconds=settings.INDEX_SAVE_DELAY_SECONDS,
+)
@@ -0,0 +1,44 @@
+-- Migration: change tracking for incremental FAISS sync
+-- The backend's delta sync (/api/face/sync?mode=delta) reads students changed since
+-- its last watermark plus tombstones for deleted students, instead of re-pulling
+-- the whole table.
+
+-- 1. updated_at on students, bumped on every update
+ALTER TABLE students ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT now() NOT NULL;
+CREATE INDEX IF NOT EXISTS students_updated_at_id_idx ON students (updated_at, id);
+
+CREATE OR REPLACE FUNCTION touch_students_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS students_touch_updated_at ON students;
+CREATE TRIGGER students_touch_updated_at
+BEFORE UPDATE ON students
+FOR EACH ROW EXECUTE FUNCTION touch_students_updated_at();
+
+-- 2. Tombstones so deletions are visible to the sync
+CREATE TABLE IF NOT EXISTS student_face_tombstones (
+    student_id UUID PRIMARY KEY,
+    deleted_at TIMESTAMPTZ DEFAULT now() NOT NULL
+);
+CREATE INDEX IF NOT EXISTS student_face_tombstones_deleted_at_idx ON student_face_tombstones (deleted_at, student_id);
+
+CREATE OR REPLACE FUNCTION record_student_tombstone() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO student_face_tombstones (student_id, deleted_at)
+    VALUES (OLD.id, now())
+    ON CONFLICT (student_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS students_record_tombstone ON students;
+CREATE TRIGGER students_record_tombstone
+AFTER DELETE ON students
+FOR EACH ROW EXECUTE FUNCTION record_student_tombstone();
+
+-- Optional housekeeping: tombstones older than any sync interval can go
+-- DELETE FROM student_face_tombstones WHERE deleted_at < now() - interval '30 days';
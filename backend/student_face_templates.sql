@@ -0,0 +1,30 @@
+-- Migration: several face templates per student
+-- students.face_embedding stays the primary template (the centroid returned by
+-- /api/face/register/multi); extra enrollment photos are stored here and loaded
+-- into FAISS as additional templates of the same student.
+-- Requires student_embedding_sync.sql (students.updated_at) to be applied first.
+
+CREATE TABLE IF NOT EXISTS student_face_templates (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    student_id UUID NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+    template_no INT NOT NULL,
+    embedding vector(512) NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT now() NOT NULL,
+    UNIQUE (student_id, template_no)
+);
+CREATE INDEX IF NOT EXISTS student_face_templates_student_idx ON student_face_templates (student_id, template_no);
+
+-- Any template change bumps the parent student's updated_at, so the delta
+-- sync reloads that student's whole template set.
+CREATE OR REPLACE FUNCTION touch_student_of_template() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE students SET updated_at = now()
+    WHERE id = COALESCE(NEW.student_id, OLD.student_id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS student_face_templates_touch_student ON student_face_templates;
+CREATE TRIGGER student_face_templates_touch_student
+AFTER INSERT OR UPDATE OR DELETE ON student_face_templates
+FOR EACH ROW EXECUTE FUNCTION touch_student_of_template();
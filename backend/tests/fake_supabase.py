@@ -0,0 +1,234 @@
+"""
+In-memory stand-in for the parts of the supabase-py client the backend uses.
+Supports select/filters/or_/order/limit/range plus insert/upsert/update/delete,
+and caps result pages at `max_rows` like PostgREST does.
+"""
+import re
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _coerce(row_value, value):
+    if isinstance(value, str):
+        value = value.strip('"')
+        if isinstance(row_value, bool):
+            return value == "true"
+        if isinstance(row_value, int):
+            return int(value)
+        if isinstance(row_value, float):
+            return float(value)
+    return value
+
+
+_OPS = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a is not None and a > b,
+    "gte": lambda a, b: a is not None and a >= b,
+    "lt": lambda a, b: a is not None and a < b,
+    "lte": lambda a, b: a is not None and a <= b,
+}
+
+
+def _split_top_level(expr):
+    parts, depth, current = [], 0, ""
+    for ch in expr:
+        if ch == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        depth += ch == "("
+        depth -= ch == ")"
+        current += ch
+    parts.append(current)
+    return parts
+
+
+def _parse_or(expr):
+    """
+    Parse a PostgREST logic expression like 'a.gt.1,and(a.eq.1,b.gt.2)' into a predicate.
+    """
+    clauses = []
+    for part in _split_top_level(expr):
+        if part.startswith("and("):
+            inner = [_parse_or(p) for p in _split_top_level(part[4:-1])]
+            clauses.append(lambda row, inner=inner: all(p(row) for p in inner))
+        else:
+            column, op, value = re.match(r'([^.]+)\.([a-z]+)\.(.*)', part).groups()
+            clauses.append(lambda row, c=column, o=op, v=value: _OPS[o](row.get(c), _coerce(row.get(c), v)))
+    return lambda row: any(c(row) for c in clauses)
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.columns = None
+        self.count = None
+        self.filters = []
+        self.orders = []
+        self.limit_n = None
+        self.offset = 0
+        self.negate = False
+        self.action = "select"
+        self.payload = None
+        self.on_conflict = None
+
+    # --- builders ---
+    def select(self, *columns, count=None, head=None):
+        self.columns = None if columns in ((), ("*",)) else [c.strip() for c in ",".join(columns).split(",")]
+        self.count = count
+        return self
+
+    @property
+    def not_(self):
+        self.negate = True
+        return self
+
+    def _filter(self, predicate):
+        if self.negate:
+            self.filters.append(lambda row: not predicate(row))
+            self.negate = False
+        else:
+            self.filters.append(predicate)
+        return self
+
+    def is_(self, column, value):
+        return self._filter(lambda row: row.get(column) is None if value == "null" else row.get(column) == value)
+
+    def in_(self, column, values):
+        values = list(values)
+        return self._filter(lambda row: row.get(column) in [_coerce(row.get(column), v) for v in values])
+
+    def or_(self, expr):
+        return self._filter(_parse_or(expr))
+
+    def __getattr__(self, name):
+        if name in _OPS:
+            return lambda column, value: self._filter(
+                lambda row: _OPS[name](row.get(column), _coerce(row.get(column), value))
+            )
+        raise AttributeError(name)
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def range(self, start, end):
+        self.offset = start
+        self.limit_n = end - start + 1
+        return self
+
+    def insert(self, rows):
+        self.action, self.payload = "insert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict=None, ignore_duplicates=False, **kwargs):
+        self.action, self.payload = "upsert", rows if isinstance(rows, list) else [rows]
+        self.on_conflict = on_conflict
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, values):
+        self.action, self.payload = "update", values
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    # --- execution ---
+    def _matching(self, rows):
+        return [r for r in rows if all(f(r) for f in self.filters)]
+
+    def execute(self):
+        self.client.calls.append((self.table, self.action))
+        if self.client.fail_tables.get(self.table):
+            raise self.client.fail_tables[self.table]
+        if self.action in ("insert", "upsert") and self.client.fail_writes.get(self.table):
+            raise self.client.fail_writes[self.table]
+        rows = self.client.tables.setdefault(self.table, [])
+
+        if self.action == "select":
+            result = self._matching(rows)
+            for column, desc in reversed(self.orders):
+                result.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+            total = len(result)
+            cap = min(self.limit_n or self.client.max_rows, self.client.max_rows)
+            result = result[self.offset:self.offset + cap]
+            if self.columns:
+                result = [{c: r.get(c) for c in self.columns} for r in result]
+            return FakeResponse([dict(r) for r in result], total if self.count else None)
+
+        if self.action == "insert":
+            rows.extend(dict(r) for r in self.payload)
+            return FakeResponse(self.payload)
+
+        if self.action == "upsert":
+            keys = [k.strip() for k in (self.on_conflict or "id").split(",")]
+            for new in self.payload:
+                existing = next((r for r in rows if all(r.get(k) == new.get(k) for k in keys)), None)
+                if existing is not None:
+                    if not self.ignore_duplicates:
+                        existing.update(new)
+                else:
+                    rows.append(dict(new))
+            return FakeResponse(self.payload)
+
+        if self.action == "update":
+            matched = self._matching(rows)
+            for r in matched:
+                r.update(self.payload)
+            return FakeResponse([dict(r) for r in matched])
+
+        if self.action == "delete":
+            matched = self._matching(rows)
+            self.client.tables[self.table] = [r for r in rows if r not in matched]
+            return FakeResponse(matched)
+
+
+class FakeAPIError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class FakeRpc:
+    def __init__(self, client, name, params):
+        self.client, self.name, self.params = client, name, params
+
+    def execute(self):
+        self.client.calls.append((self.name, "rpc"))
+        function = self.client.functions.get(self.name)
+        if function is None:
+            raise FakeAPIError("PGRST202", f"Could not find the function public.{self.name}")
+        return FakeResponse(function(self.client, **self.params))
+
+
+class FakeSupabase:
+    def __init__(self, tables=None, max_rows=1000):
+        self.tables = {name: [dict(r) for r in rows] for name, rows in (tables or {}).items()}
+        self.max_rows = max_rows
+        self.calls = []
+        # table -> exception raised on execute, to simulate missing tables/outages
+        self.fail_tables = {}
+        # table -> exception raised by inserts/upserts only (reads and deletes still work)
+        self.fail_writes = {}
+        # name -> fn(client, **params) standing in for a SQL function called through rpc()
+        self.functions = {}
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return FakeRpc(self, name, params or {})
+
+    from_ = table
@@ -0,0 +1,168 @@
+"""
+Local stand-in for Supabase's PostgREST endpoint (/rest/v1/<table>), served
+over real HTTP on 127.0.0.1 and backed by a FakeSupabase, so the sync client
+fake and the async client see the same tables. Understands the query syntax
+core/async_database.py sends, and can inject failures (`fail_next`) and slow
+responses (`delay`). `max_rows` mimics PostgREST's db-max-rows setting,
+which silently shortens any response longer than that. SQL functions (/rest/v1/rpc/<name>) are Python callables
+given as `functions`: fn(tables, args) -> rows.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from tests.fake_supabase import FakeSupabase, _split_top_level
+
+_RESERVED = {"select", "order", "limit", "offset", "on_conflict"}
+
+
+def _apply_filter(query, column, expr):
+    if expr.startswith("not."):
+        query.not_
+        expr = expr[4:]
+    op, arg = expr.split(".", 1)
+    if op == "in":
+        return query.in_(column, [v.strip('"') for v in _split_top_level(arg[1:-1])])
+    if op == "is":
+        return query.is_(column, arg)
+    return getattr(query, op)(column, arg)
+
+
+class PostgrestStandIn:
+    def __init__(self, fake=None, key="test-key", functions=None):
+        self.fake = fake or FakeSupabase()
+        self.key = key
+        self.functions = functions or {}
+        # (method, table, params) of every request that reached a table
+        self.requests = []
+        # Client (host, port) pairs seen, i.e. TCP connections opened
+        self.connections = set()
+        self.failures = []
+        self.delay = 0.0
+        self.max_rows = None
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def fail_next(self, count, status=503):
+        self.failures.extend([status] * count)
+
+    def start(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so connection reuse by the client pool is visible
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body=None, headers=None):
+                data = b"" if body is None else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _handle(self, method):
+                stand_in.connections.add(self.client_address)
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length)) if length else None
+                url = urlsplit(self.path)
+                if not url.path.startswith("/rest/v1/"):
+                    return self._reply(404, {"message": "not found"})
+                if self.headers.get("apikey") != stand_in.key:
+                    return self._reply(401, {"message": "Invalid API key"})
+                table = url.path[len("/rest/v1/"):]
+                params = parse_qsl(url.query)
+                stand_in.requests.append((method, table, dict(params)))
+                if stand_in.delay:
+                    time.sleep(stand_in.delay)
+                if stand_in.failures:
+                    return self._reply(stand_in.failures.pop(0), {"message": "injected failure"})
+                try:
+                    return self._reply(*stand_in.execute(method, table, params, payload, self.headers.get("Prefer", "")))
+                except Exception as e:
+                    return self._reply(400, {"message": str(e)})
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _window(self, options):
+        # (offset, row count or None); PostgREST applies max-rows on top of the requested limit
+        start = int(options.get("offset", 0))
+        limits = [int(options["limit"])] if "limit" in options else []
+        if self.max_rows:
+            limits.append(self.max_rows)
+        return start, min(limits) if limits else None
+
+    def call(self, name, params, args, prefer):
+        options = dict(p for p in params if p[0] in _RESERVED)
+        rows = [dict(r) for r in self.functions[name](self.fake.tables, args or {})]
+        for order in reversed(list(filter(None, options.get("order", "").split(",")))):
+            column, _, direction = order.partition(".")
+            rows.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=direction == "desc")
+        total = len(rows)
+        start, count = self._window(options)
+        rows = rows[start:start + count] if count is not None else rows[start:]
+        headers = {}
+        if "count=exact" in prefer:
+            headers["Content-Range"] = f"{start}-{start + len(rows) - 1}/{total}" if rows else f"*/{total}"
+        return 200, rows, headers
+
+    def execute(self, method, table, params, payload, prefer):
+        if table.startswith("rpc/"):
+            name = table[len("rpc/"):]
+            if name not in self.functions:
+                return 404, {"message": f"Could not find the function {name}"}
+            return self.call(name, params, payload, prefer)
+        query = self.fake.table(table)
+        options = dict(p for p in params if p[0] in _RESERVED)
+        if method == "POST":
+            rows = payload if isinstance(payload, list) else [payload]
+            if "merge-duplicates" in prefer:
+                query.upsert(rows, on_conflict=options.get("on_conflict"))
+            else:
+                query.insert(rows)
+            data = query.execute().data
+            return (201, None) if "return=minimal" in prefer else (201, data)
+
+        query.select(options.get("select", "*"))
+        for column, expr in params:
+            if column not in _RESERVED:
+                _apply_filter(query, column, expr)
+        for order in filter(None, options.get("order", "").split(",")):
+            column, _, direction = order.partition(".")
+            query.order(column, desc=direction == "desc")
+        start, count = self._window(options)
+        if count is not None:
+            query.range(start, start + count - 1)
+        return 200, query.execute().data
@@ -0,0 +1,246 @@
+import sys
+import os
+import time
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+# Adjust path to find backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import main
+from services.attendance_writer import AttendanceWriter
+from services.index_sync import IndexSync
+from services.inference import InferenceExecutor
+from services.vector_search import VectorSearch
+from services.index_share import IndexShare
+from services.metrics import Metrics
+from core.async_database import AsyncDB
+from tests.fake_supabase import FakeSupabase
+from tests.postgrest_server import PostgrestStandIn
+from tests.vectors import unit_vectors
+
+
+VECS = unit_vectors(4)
+
+
+class FakeFaceService:
+    """
+    Stands in for FaceLogic: an upload's bytes are the indices of the enrolled
+    vectors visible in it, e.g. b"01" shows students s0 and s1.
+    """
+    ready = True
+
+    def load(self):
+        return True
+
+    def _faces(self, image_bytes):
+        return [VECS[int(c)] for c in image_bytes.decode()]
+
+    def analyze_all(self, image_bytes):
+        faces = self._faces(image_bytes)
+        return faces, {"faces_detected": len(faces), "brightness": 120.0, "enhanced": 0.0}
+
+    def analyze_frame(self, image_bytes, skip_boxes=()):
+        # Face c sits at x = 100*c; faces under a skip box are not embedded
+        faces = [int(c) for c in image_bytes.decode()]
+        boxes = np.array([[100 * c, 0, 100 * c + 80, 80, 0.9] for c in faces], dtype=np.float32).reshape(-1, 5)
+        skip_x = {int(box[0]) for box in np.round(skip_boxes)}
+        embeddings = {d: VECS[c] for d, c in enumerate(faces) if 100 * c not in skip_x}
+        return boxes, embeddings, {"faces_detected": len(faces), "faces_embedded": len(embeddings)}
+
+    def analyze_largest(self, image_bytes):
+        faces = self._faces(image_bytes)
+        return (faces[0] if faces else None), {"faces_detected": len(faces)}
+
+    def get_template_embeddings(self, images):
+        return [faces[0] if faces else None for faces in map(self._faces, images)]
+
+    def analyze_many(self, images):
+        return [self._faces(image) for image in images], {"faces_embedded": sum(len(i) for i in images)}
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    vs = VectorSearch(index_path=str(tmp_path / "idx.bin"), mapping_path=str(tmp_path / "labels.json"), max_templates=6)
+    vs.bulk_load([f"s{i}" for i in range(len(VECS))], VECS, ["A", "B", "A", "A"])
+    db = FakeSupabase({"routines": [{"id": "r1", "section_id": "A", "teacher_id": "t1", "course_catalog_id": "c1"}], "attendance_logs": []})
+
+    monkeypatch.setattr(main, "vector_search", vs)
+    monkeypatch.setattr(main, "index_share", IndexShare(index=vs))
+    monkeypatch.setattr(main, "index_sync", IndexSync(client_factory=lambda: None, index=vs))
+    metrics = Metrics(enabled=True, server_timing=True)
+    monkeypatch.setattr(main, "inference", InferenceExecutor(service=FakeFaceService(), metrics=metrics))
+    monkeypatch.setattr(main, "attendance_writer", AttendanceWriter(client_factory=lambda: db))
+    monkeypatch.setattr(main, "supabase", lambda: db)
+    monkeypatch.setattr(main, "metrics", metrics)
+    monkeypatch.setitem(main._boot, "index", False)
+    monkeypatch.setitem(main._boot, "model", False)
+    main._routine_sections.clear()
+    # Routine lookups go through the async client to a local PostgREST stand-in over the same tables
+    with PostgrestStandIn(db) as server:
+        monkeypatch.setattr(main, "db", AsyncDB(server.url, server.key))
+        yield TestClient(main.app), db
+    main._routine_sections.clear()
+
+
+def _wait_ready(client):
+    for _ in range(100):
+        if client.get("/ready").status_code == 200:
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_ready_is_separate_from_health(api):
+    client, _ = api
+    assert client.get("/health").status_code == 200
+    assert client.get("/ready").status_code == 503
+
+    with client:
+        assert _wait_ready(client)
+        body = client.get("/ready").json()
+        assert body["index"] and body["model"] and body["import_seconds"] > 0
+
+
+def test_recognize_and_write_attendance(api):
+    client, db = api
+    response = client.post(
+        "/api/face/recognize",
+        files={"image": ("a.jpg", b"012")},
+        data={"section_id": "", "routine_id": "r1", "write_attendance": "true"},
+    )
+    body = response.json()
+    assert response.status_code == 200
+    # s1 is in another section than routine r1
+    assert sorted(m["student_id"] for m in body["matches"]) == ["s0", "s2"]
+    assert body["attendance_queued"] and body["brightness"] == 120.0
+    # Background task has run by the time TestClient returns
+    assert sorted(r["student_id"] for r in db.tables["attendance_logs"]) == ["s0", "s2"]
+
+
+def test_search_does_not_block_the_event_loop(api):
+    import threading
+    client, _ = api
+    vs = main.index_share.index
+    with client:
+        # An index writer holds the search lock; recognition waits for it in a worker thread
+        vs._lock.acquire()
+        try:
+            result = {}
+            request = threading.Thread(target=lambda: result.update(r=client.post(
+                "/api/face/recognize", files={"image": ("a.jpg", b"0")}, data={"section_id": "A"})))
+            request.start()
+            time.sleep(0.1)
+            # Other requests are still served meanwhile
+            health = threading.Thread(target=lambda: result.update(health=client.get("/health")))
+            health.start()
+            health.join(2)
+            assert request.is_alive() and "health" in result
+        finally:
+            vs._lock.release()
+        request.join(5)
+        health.join(5)
+    assert result["r"].json()["matches"][0]["student_id"] == "s0"
+
+
+def test_routine_lookup_errors(api, monkeypatch):
+    client, db = api
+    response = client.post("/api/face/recognize", files={"image": ("a.jpg", b"0")}, data={"routine_id": "missing"})
+    assert response.status_code == 404
+
+    monkeypatch.setattr(main, "db", AsyncDB("http://127.0.0.1:9", "key", timeout=0.2, retries=1))
+    response = client.post("/api/face/recognize", files={"image": ("a.jpg", b"0")}, data={"routine_id": "r9"})
+    assert response.status_code == 503
+
+
+def test_register_multi_replaces_templates(api):
+    client, db = api
+    vs = main.index_share.index
+    files = [("images", ("a.jpg", b"1")), ("images", ("b.jpg", b"2"))]
+    assert client.post("/api/face/register/multi", files=files, data={"student_id": "s0"}).status_code == 200
+    assert sorted(r["template_no"] for r in db.tables["student_face_templates"]) == [1, 2]
+    # Centroid + one template per photo
+    assert vs.template_counts()["s0"] == 3
+
+    files = [("images", ("c.jpg", b"3"))]
+    assert client.post("/api/face/register/multi", files=files, data={"student_id": "s0"}).status_code == 200
+    rows = db.tables["student_face_templates"]
+    assert [r["template_no"] for r in rows] == [1] and np.allclose(rows[0]["embedding"], VECS[3])
+    assert vs.template_counts()["s0"] == 2
+
+    # The DB write fails: the index keeps matching what the DB still holds
+    db.fail_writes["student_face_templates"] = RuntimeError("connection reset")
+    files = [("images", ("d.jpg", b"1")), ("images", ("e.jpg", b"2")), ("images", ("f.jpg", b"3"))]
+    assert client.post("/api/face/register/multi", files=files, data={"student_id": "s0"}).status_code == 500
+    assert vs.template_counts()["s0"] == 2
+    assert len(db.tables["student_face_templates"]) == 1
+
+
+def test_single_photo_reregistration_survives_sync(api):
+    client, db = api
+    vs = main.index_share.index
+    db.tables["students"] = [
+        {"id": f"s{i}", "face_embedding": "[" + ",".join(map(str, VECS[i])) + "]", "section_id": "A"} for i in range(4)
+    ]
+    files = [("images", ("a.jpg", b"1")), ("images", ("b.jpg", b"2"))]
+    assert client.post("/api/face/register/multi", files=files, data={"student_id": "s0"}).status_code == 200
+
+    body = client.post("/api/face/register", files={"image": ("c.jpg", b"3")}, data={"student_id": "s0"}).json()
+    # The caller stores the returned embedding as the student's face
+    db.tables["students"][0]["face_embedding"] = "[" + ",".join(map(str, body["embedding"])) + "]"
+    assert db.tables["student_face_templates"] == []
+
+    IndexSync(client_factory=lambda: db, index=vs).full_sync()
+    assert vs.template_counts()["s0"] == 1
+    assert vs.search(VECS[1])[0][0] == "s1"
+
+
+def test_batch_recognize_dedupes_students(api):
+    client, db = api
+    files = [("images", ("a.jpg", b"01")), ("images", ("b.jpg", b"13"))]
+    body = client.post("/api/face/recognize/batch", files=files).json()
+
+    assert body["images"] == 2 and body["detected_faces"] == 4
+    assert body["faces_per_image"] == [2, 2]
+    assert sorted(m["student_id"] for m in body["matches"]) == ["s0", "s1", "s3"]
+    assert not body["attendance_queued"] and db.tables["attendance_logs"] == []
+
+
+def test_metrics_and_server_timing(api):
+    client, _ = api
+    response = client.post("/api/face/recognize", files={"image": ("a.jpg", b"01")}, data={"section_id": "A"})
+    assert "search;dur=" in response.headers["Server-Timing"]
+
+    text = client.get("/metrics").text
+    assert 'attendu_faces_detected_total 2' in text
+    assert 'attendu_stage_seconds_count{stage="search"} 1' in text
+    assert 'attendu_inference_wait_seconds_count 1' in text and 'attendu_inference_rejected_total' in text
+    assert 'attendu_request_seconds_count{path="/api/face/recognize"} 1' in text
+
+    # Unknown URLs share one series instead of adding one per path
+    for path in ("/probe/1", "/probe/2", "/wp-login.php"):
+        assert client.get(path).status_code == 404
+    text = client.get("/metrics").text
+    assert 'attendu_request_seconds_count{path="unmatched"} 3' in text and "probe" not in text
+
+
+def test_stream_recognizes_new_and_uncertain_tracks_only(api):
+    client, db = api
+    with client.websocket_connect("/ws/face/stream?routine_id=r1&write_attendance=true") as ws:
+        reports = []
+        for frame in (b"01", b"01", b"01", b"012", b"012", b"012"):
+            ws.send_bytes(frame)
+            reports.append(ws.receive_json())
+        ws.send_text('{"action": "end"}')
+        summary = ws.receive_json()
+
+    # s0 is identified after two votes and then skipped; s1 (another section) never matches
+    # and is retried until STREAM_MAX_RECOGNITIONS; s2 joins on frame 4
+    assert [r["recognized"] for r in reports] == [2, 2, 1, 2, 2, 0]
+    assert [p["student_id"] for p in reports[1]["new_present"]] == ["s0"]
+    assert [p["student_id"] for p in reports[4]["new_present"]] == ["s2"]
+    assert summary["type"] == "summary" and summary["frames_processed"] == 6
+    assert [p["student_id"] for p in summary["present"]] == ["s0", "s2"]
+    assert summary["attendance_written"] == 2
+    assert sorted(r["student_id"] for r in db.tables["attendance_logs"]) == ["s0", "s2"]
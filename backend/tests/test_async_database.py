@@ -0,0 +1,109 @@
+import sys
+import os
+import asyncio
+import pytest
+
+# Adjust path to find backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.async_database import AsyncDB, DatabaseError
+from tests.fake_supabase import FakeSupabase
+from tests.postgrest_server import PostgrestStandIn
+
+
+@pytest.fixture
+def server():
+    fake = FakeSupabase({
+        "routines": [
+            {"id": "r1", "section_id": "A", "teacher_id": "t1", "course_catalog_id": "c1", "day_of_week": "Sun", "start_time": "10:00"},
+            {"id": "r2", "section_id": "A", "teacher_id": "t2", "course_catalog_id": "c2", "day_of_week": "Sun", "start_time": "08:00"},
+        ],
+    })
+    with PostgrestStandIn(fake) as stand_in:
+        yield stand_in
+
+
+def _db(server, **kwargs):
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    db = AsyncDB(server.url, server.key, sleep=sleep, **kwargs)
+    db.sleeps = sleeps
+    return db
+
+
+def _run(db, coro):
+    async def go():
+        try:
+            return await coro
+        finally:
+            await db.close()
+    return asyncio.run(go())
+
+
+def test_routine_lookup(server):
+    db = _db(server)
+
+    async def go():
+        return await db.routine("r1"), await db.routine("nope")
+
+    routine, missing = _run(db, go())
+    assert routine.section_id == "A" and routine.course_catalog_id == "c1" and routine.start_time == "10:00"
+    assert missing is None
+
+
+def test_retries_with_backoff(server):
+    db = _db(server, retries=3, backoff_seconds=0.1)
+    server.fail_next(2, status=503)
+    assert _run(db, db.routine("r1")).section_id == "A"
+    assert db.sleeps == [0.1, 0.2]
+    assert len(server.requests) == 3
+
+
+def test_gives_up_after_retries(server):
+    db = _db(server, retries=2)
+    server.fail_next(5, status=429)
+    with pytest.raises(DatabaseError) as e:
+        _run(db, db.routine("r1"))
+    assert e.value.status == 429 and len(server.requests) == 2
+
+
+def test_client_errors_are_not_retried(server):
+    db = _db(server)
+    server.fail_next(1, status=400)
+    with pytest.raises(DatabaseError):
+        _run(db, db.routine("r1"))
+    assert len(server.requests) == 1 and db.sleeps == []
+
+    bad_key = AsyncDB(server.url, "wrong", retries=3)
+    with pytest.raises(DatabaseError) as e:
+        _run(bad_key, bad_key.routine("r1"))
+    assert e.value.status == 401
+
+
+def test_timeout_is_retried_then_raised(server):
+    db = _db(server, timeout=0.05, retries=2)
+    server.delay = 0.3
+    with pytest.raises(DatabaseError) as e:
+        _run(db, db.routine("r1"))
+    assert "Timeout" in str(e.value) and len(db.sleeps) == 1
+
+
+def test_pool_reuses_connections(server):
+    db = _db(server, pool_size=3)
+
+    async def go():
+        return await asyncio.gather(*(db.routine("r1") for _ in range(30)))
+
+    assert all(r.section_id == "A" for r in _run(db, go()))
+    assert len(server.requests) == 30
+    assert len(server.connections) <= 3
+
+
+def test_not_configured():
+    db = AsyncDB("", "")
+    assert not db.configured
+    with pytest.raises(DatabaseError):
+        _run(db, db.routine("r1"))
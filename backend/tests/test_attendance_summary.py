@@ -0,0 +1,317 @@
+import sys
+import os
+import asyncio
+import csv
+import io
+import pytest
+from fastapi.testclient import TestClient
+
+# Adjust path to find backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import main
+from core.async_database import AsyncDB
+from services.attendance_summary import AttendanceSummary, SummaryCache, summary_cache
+from services.attendance_writer import AttendanceWriter
+from tests.fake_supabase import FakeSupabase
+from tests.postgrest_server import PostgrestStandIn
+
+ATTENDED = ("present", "late")
+
+
+# --- Python versions of the SQL functions in attendance_summary.sql ---
+
+def _check(args, *names):
+    # PostgREST rejects arguments the SQL function does not declare
+    unknown = set(args) - {"p_from", "p_to", *names}
+    if unknown:
+        raise ValueError(f"Could not find the function with parameters {sorted(unknown)}")
+
+
+def _logs(tables, args, section_ids):
+    return [
+        l for l in tables["attendance_logs"]
+        if l["section_id"] in section_ids and l.get("course_catalog_id")
+        and args.get("p_course_catalog_id") in (None, l["course_catalog_id"])
+        and (args.get("p_from") is None or l["date"] >= args["p_from"])
+        and (args.get("p_to") is None or l["date"] <= args["p_to"])
+    ]
+
+
+def student_summary(tables, args):
+    _check(args, "p_section_id", "p_course_catalog_id")
+    section = args["p_section_id"]
+    logs = _logs(tables, args, {section})
+    subjects = {c["id"]: c for c in tables["course_catalog"]}
+    names = {p["id"]: p["name"] for p in tables["profiles"]}
+    held = {}
+    for l in logs:
+        held.setdefault(l["course_catalog_id"], set()).add((l["routine_id"], l["date"]))
+    rows = []
+    for st in (s for s in tables["students"] if s["section_id"] == section):
+        for cc, sessions in held.items():
+            present = {(l["routine_id"], l["date"]) for l in logs
+                       if l["student_id"] == st["id"] and l["course_catalog_id"] == cc and l["status"] in ATTENDED}
+            rows.append({"student_id": st["id"], "roll_no": st["student_id"], "student_name": names.get(st["profile_id"]),
+                         "course_catalog_id": cc, "subject_code": subjects[cc]["subject_code"],
+                         "subject_name": subjects[cc]["subject_name"], "sessions": len(sessions),
+                         "attended": len(present), "last_present": max(d for _, d in present) if present else None})
+    return rows
+
+
+def subject_summary(tables, args):
+    _check(args, "p_section_id")
+    section = args["p_section_id"]
+    logs = _logs(tables, args, {section})
+    roster = sum(1 for s in tables["students"] if s["section_id"] == section)
+    rows = []
+    for cc in {l["course_catalog_id"] for l in logs}:
+        mine = [l for l in logs if l["course_catalog_id"] == cc]
+        subject = next(c for c in tables["course_catalog"] if c["id"] == cc)
+        rows.append({"course_catalog_id": cc, "subject_code": subject["subject_code"], "subject_name": subject["subject_name"],
+                     "sessions": len({(l["routine_id"], l["date"]) for l in mine}), "students": roster,
+                     "attended": len({(l["student_id"], l["routine_id"], l["date"]) for l in mine if l["status"] in ATTENDED}),
+                     "first_date": min(l["date"] for l in mine), "last_date": max(l["date"] for l in mine)})
+    return rows
+
+
+def section_summary(tables, args):
+    _check(args, "p_faculty_id", "p_batch_id")
+    batches = {b["id"]: b for b in tables["batches"]
+               if args.get("p_faculty_id") in (None, b["faculty_id"]) and args.get("p_batch_id") in (None, b["id"])}
+    rows = []
+    for s in (s for s in tables["sections"] if s["batch_id"] in batches):
+        logs = _logs(tables, args, {s["id"]})
+        rows.append({"section_id": s["id"], "section_name": s["name"], "batch_id": s["batch_id"],
+                     "batch_name": batches[s["batch_id"]]["name"],
+                     "students": sum(1 for st in tables["students"] if st["section_id"] == s["id"]),
+                     "subjects": len({l["course_catalog_id"] for l in logs}),
+                     "sessions": len({(l["routine_id"], l["date"]) for l in logs}),
+                     "attended": len({(l["student_id"], l["routine_id"], l["date"]) for l in logs if l["status"] in ATTENDED})})
+    return rows
+
+
+FUNCTIONS = {
+    "attendance_student_summary": student_summary,
+    "attendance_subject_summary": subject_summary,
+    "attendance_section_summary": section_summary,
+}
+
+
+def _log(student, day, status="present", course="math", section="A", routine=None):
+    return {"student_id": student, "routine_id": routine or f"r-{course}", "section_id": section,
+            "course_catalog_id": course, "date": day, "status": status}
+
+
+def _tables():
+    return {
+        "students": [{"id": f"s{i}", "student_id": f"10{i}", "profile_id": f"p{i}", "section_id": "A"} for i in range(1, 5)]
+                    + [{"id": "s9", "student_id": "901", "profile_id": "p9", "section_id": "B"}],
+        "profiles": [{"id": f"p{i}", "name": f"Student {i}"} for i in (1, 2, 3, 4, 9)],
+        "course_catalog": [{"id": "math", "subject_code": "MAT101", "subject_name": "Math"},
+                           {"id": "phys", "subject_code": "PHY101", "subject_name": "Physics"}],
+        "sections": [{"id": "A", "name": "CSE-A", "batch_id": "b1"}, {"id": "B", "name": "CSE-B", "batch_id": "b1"}],
+        "batches": [{"id": "b1", "name": "2026", "faculty_id": "f1"}],
+        "routines": [{"id": "r-math", "section_id": "A", "teacher_id": "t1", "course_catalog_id": "math"}],
+        "attendance_logs": [
+            _log("s1", "2026-09-01"), _log("s2", "2026-09-01"), _log("s3", "2026-09-01", "absent"),
+            _log("s1", "2026-09-08"), _log("s2", "2026-09-08", "late"),
+            _log("s1", "2026-09-02", course="phys"),
+            _log("s9", "2026-09-01", section="B"),
+            # Last semester
+            _log("s4", "2026-03-01"),
+        ],
+        "attendance_versions": [{"section_id": "A", "version": 1, "changed_at": "2026-09-08T10:00:00+00:00"}],
+    }
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def server():
+    with PostgrestStandIn(FakeSupabase(_tables()), functions=FUNCTIONS) as stand_in:
+        yield stand_in
+
+
+def _summary(server, **kwargs):
+    kwargs.setdefault("cache", SummaryCache())
+    return AttendanceSummary(db=AsyncDB(server.url, server.key), **kwargs)
+
+
+def _rpc_calls(server):
+    return sum(1 for _, path, _ in server.requests if path.startswith("rpc/"))
+
+
+SEMESTER = {"date_from": "2026-08-01", "date_to": "2026-12-31"}
+
+
+def test_student_summary_pages(server):
+    summary = _summary(server)
+    first = asyncio.run(summary.page("students", {"section_id": "A", **SEMESTER}, limit=3))
+    rest = asyncio.run(summary.page("students", {"section_id": "A", **SEMESTER}, limit=3, offset=3))
+
+    # 4 students x 2 subjects held this semester
+    assert first["total"] == 8 and len(first["rows"]) == 3 and len(rest["rows"]) == 3
+    rows = {(r["roll_no"], r["subject_code"]): r for r in first["rows"] + rest["rows"]}
+    assert rows[("101", "MAT101")]["percentage"] == 100.0 and rows[("101", "MAT101")]["last_present"] == "2026-09-08"
+    # Late counts as attended, absent rows do not
+    assert rows[("102", "MAT101")]["attended"] == 2 and rows[("103", "MAT101")]["absent"] == 2
+    assert rows[("102", "MAT101")]["student_name"] == "Student 2"
+    assert [r["roll_no"] for r in first["rows"]] == ["101", "101", "102"]
+
+
+def test_subject_and_section_summaries(server):
+    summary = _summary(server)
+    subjects = asyncio.run(summary.page("subjects", {"section_id": "A", **SEMESTER}))["rows"]
+    math = next(r for r in subjects if r["course_catalog_id"] == "math")
+    assert (math["sessions"], math["students"], math["attended"]) == (2, 4, 4)
+    assert math["percentage"] == 50.0
+
+    sections = asyncio.run(summary.page("sections", {"faculty_id": "f1", **SEMESTER}))["rows"]
+    assert [(r["section_name"], r["sessions"], r["attended"]) for r in sections] == [("CSE-A", 3, 5), ("CSE-B", 1, 1)]
+
+
+def test_double_period_counts_as_two_sessions(server):
+    # Two math slots on 2026-09-15; s2 only attends the first
+    server.fake.tables["attendance_logs"] += [
+        _log("s1", "2026-09-15", routine="r-math"), _log("s1", "2026-09-15", routine="r-math-2"),
+        _log("s2", "2026-09-15", routine="r-math"), _log("s2", "2026-09-15", "absent", routine="r-math-2"),
+    ]
+    summary = _summary(server)
+    scope = {"section_id": "A", "course_catalog_id": "math", **SEMESTER}
+    rows = {r["roll_no"]: r for r in asyncio.run(summary.page("students", scope))["rows"]}
+    assert (rows["101"]["sessions"], rows["101"]["attended"], rows["101"]["percentage"]) == (4, 4, 100.0)
+    assert (rows["102"]["attended"], rows["102"]["absent"], rows["102"]["percentage"]) == (3, 1, 75.0)
+
+    subjects = asyncio.run(summary.page("subjects", {"section_id": "A", **SEMESTER}))["rows"]
+    math = next(r for r in subjects if r["course_catalog_id"] == "math")
+    assert (math["sessions"], math["attended"]) == (4, 7)
+    section = asyncio.run(summary.page("sections", {"batch_id": "b1", **SEMESTER}))["rows"][0]
+    assert (section["sessions"], section["attended"]) == (5, 8)
+
+
+def test_cached_until_invalidated(server):
+    summary_cache.invalidate()
+    summary = _summary(server, cache=summary_cache)
+    scope = {"section_id": "A"}
+    before = asyncio.run(summary.page("subjects", scope))
+    faculty = asyncio.run(summary.page("sections", {"faculty_id": "f1"}))
+    assert not before["cached"] and asyncio.run(summary.page("subjects", scope))["cached"]
+    calls = _rpc_calls(server)
+
+    # A server-side attendance write for section A drops its summaries and the faculty-wide ones
+    writer = AttendanceWriter(client_factory=lambda: server.fake, sleep=lambda s: None)
+    assert writer.write("r-math", [("s3", 0.9)], day=__import__("datetime").date(2026, 9, 15)) == 1
+    after = asyncio.run(summary.page("subjects", scope))
+    assert not after["cached"] and _rpc_calls(server) == calls + 1
+    assert after["rows"][0]["sessions"] == before["rows"][0]["sessions"] + 1
+    assert not asyncio.run(summary.page("sections", {"faculty_id": "f1"}))["cached"]
+    # No date range: last semester's session counts too
+    assert faculty["rows"][0]["sessions"] == 4
+
+
+def test_external_writes_are_picked_up_from_versions(server):
+    clock = Clock()
+    summary = _summary(server, version_check_seconds=5, clock=clock)
+    scope = {"section_id": "A", **SEMESTER}
+    asyncio.run(summary.page("students", scope))
+    other = asyncio.run(summary.page("students", {"section_id": "B"}))
+    assert not other["cached"]
+
+    # The frontend logs attendance directly; the trigger bumps attendance_versions
+    server.fake.tables["attendance_logs"].append(_log("s4", "2026-09-08"))
+    server.fake.tables["attendance_versions"][0]["changed_at"] = "2026-09-08T11:00:00+00:00"
+    assert asyncio.run(summary.page("students", scope))["cached"]
+    clock.now = 6
+    fresh = asyncio.run(summary.page("students", scope))
+    assert not fresh["cached"]
+    assert next(r for r in fresh["rows"] if r["roll_no"] == "104" and r["subject_code"] == "MAT101")["attended"] == 1
+    # Section B did not change
+    assert asyncio.run(summary.page("students", {"section_id": "B"}))["cached"]
+
+
+def test_csv_export_streams_every_page(server):
+    summary = _summary(server, page_size=3)
+
+    async def export():
+        chunks = await summary.csv_export("students", {"section_id": "A", **SEMESTER})
+        return [chunk async for chunk in chunks]
+
+    chunks = asyncio.run(export())
+    rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert len(chunks) == 3 and len(rows) == 8
+    assert rows[0]["roll_no"] == "101" and rows[0]["percentage"] == "100.0"
+
+
+def test_csv_export_survives_server_row_cap(server):
+    # The server returns at most 2 rows however many are asked for
+    server.max_rows = 2
+    summary = _summary(server, page_size=3)
+
+    async def export():
+        chunks = await summary.csv_export("students", {"section_id": "A", **SEMESTER})
+        return "".join([chunk async for chunk in chunks])
+
+    rows = list(csv.DictReader(io.StringIO(asyncio.run(export()))))
+    assert len(rows) == 8
+    assert len({(r["roll_no"], r["subject_code"]) for r in rows}) == 8
+
+
+def test_summary_cache_lru_ttl_and_stale_puts():
+    clock = Clock()
+    cache = SummaryCache(max_entries=2, ttl_seconds=10, clock=clock)
+    cache.put("a", "A", 1)
+    cache.put("b", "B", 2)
+    cache.get("a")
+    cache.put("c", None, 3)
+    assert cache.get("b") is None and cache.get("a") == 1
+
+    token = cache.token("A")
+    cache.invalidate("A")
+    cache.put("a", "A", 4, token)
+    assert cache.get("a") is None and cache.get("c") is None
+
+    cache.put("a", "A", 5, cache.token("A"))
+    clock.now = 11
+    assert cache.get("a") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+@pytest.fixture
+def api(server, monkeypatch):
+    monkeypatch.setattr(main, "attendance_summary", _summary(server))
+    return TestClient(main.app), server
+
+
+def test_summary_endpoints(api):
+    client, server = api
+    body = client.get("/api/attendance/summary/students",
+                      params={"section_id": "A", "from": "2026-08-01", "to": "2026-12-31", "limit": 2, "offset": 2}).json()
+    assert body["total"] == 8 and body["offset"] == 2 and len(body["rows"]) == 2
+    assert client.get("/api/attendance/summary/subjects", params={"section_id": "A"}).json()["total"] == 2
+    assert client.get("/api/attendance/summary/sections", params={"batch_id": "b1"}).json()["rows"][1]["students"] == 1
+
+    response = client.get("/api/attendance/summary/students", params={"section_id": "A", "format": "csv"})
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/csv")
+    assert 'filename="attendance_students_A.csv"' in response.headers["content-disposition"]
+    assert len(response.text.strip().splitlines()) == 1 + 8
+
+    assert client.get("/api/attendance/summary/students").status_code == 422
+    assert client.get("/api/attendance/summary/subjects", params={"section_id": "A", "from": "2026-12-01", "to": "2026-01-01"}).status_code == 400
+    assert client.get("/api/attendance/summary/subjects", params={"section_id": "A", "format": "xml"}).status_code == 400
+
+
+def test_summary_endpoint_errors(api):
+    client, server = api
+    server.functions.pop("attendance_subject_summary")
+    response = client.get("/api/attendance/summary/subjects", params={"section_id": "A"})
+    assert response.status_code == 503 and "attendance_summary.sql" in response.json()["detail"]
+
+    server.fail_next(10)
+    assert client.get("/api/attendance/summary/students", params={"section_id": "A", "format": "csv"}).status_code == 503
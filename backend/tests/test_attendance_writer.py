@@ -0,0 +1,111 @@
+import sys
+import os
+from datetime import date
+
+# Adjust path to find backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.attendance_writer import AttendanceWriter
+from tests.fake_supabase import FakeSupabase
+
+
+DAY = date(2026, 3, 2)
+
+
+def _client():
+    routine = {"id": "r1", "section_id": "s1", "teacher_id": "t1", "course_catalog_id": "c1"}
+    return FakeSupabase({"routines": [routine], "attendance_logs": []})
+
+
+def test_write_upserts_one_row_per_student():
+    client = _client()
+    writer = AttendanceWriter(client_factory=lambda: client)
+
+    assert writer.write("r1", [("a", 0.8), ("b", 0.6), ("a", 0.9)], day=DAY) == 2
+    logs = client.tables["attendance_logs"]
+    assert sorted(r["student_id"] for r in logs) == ["a", "b"]
+    row = next(r for r in logs if r["student_id"] == "a")
+    assert row["confidence"] == 0.9 and row["status"] == "present"
+    assert row["section_id"] == "s1" and row["course_catalog_id"] == "c1" and row["date"] == "2026-03-02"
+    assert client.calls.count(("attendance_logs", "upsert")) == 1
+
+    # A retried request for the same class and day doesn't add rows
+    writer.write("r1", [("a", 0.7), ("c", 0.5)], day=DAY)
+    assert len(client.tables["attendance_logs"]) == 3
+    assert client.calls.count(("routines", "select")) == 1
+
+
+def _record_attendance(client, p_rows):
+    """
+    record_attendance from attendance_writeback.sql: insert, or raise the
+    confidence of a row that is still 'present'.
+    """
+    logs = client.tables["attendance_logs"]
+    written = 0
+    for new in p_rows:
+        existing = next((r for r in logs if all(r[k] == new[k] for k in ("student_id", "routine_id", "date"))), None)
+        if existing is None:
+            logs.append(dict(new))
+        elif existing["status"] == "present" and (existing.get("confidence") or 0) < new["confidence"]:
+            existing["confidence"] = new["confidence"]
+        else:
+            continue
+        written += 1
+    return written
+
+
+def test_rewrite_keeps_manual_status_and_best_confidence():
+    client = _client()
+    client.functions["record_attendance"] = _record_attendance
+    writer = AttendanceWriter(client_factory=lambda: client)
+    writer.write("r1", [("a", 0.6), ("b", 0.9), ("c", 0.7)], day=DAY)
+    # A teacher marks "c" late after the first photo
+    next(r for r in client.tables["attendance_logs"] if r["student_id"] == "c")["status"] = "late"
+
+    writer.write("r1", [("a", 0.8), ("b", 0.5), ("c", 0.95)], day=DAY)
+    logs = {r["student_id"]: r for r in client.tables["attendance_logs"]}
+    assert len(logs) == 3
+    assert logs["a"]["confidence"] == 0.8
+    assert logs["b"]["confidence"] == 0.9
+    assert logs["c"]["status"] == "late" and logs["c"]["confidence"] == 0.7
+    assert client.calls.count(("attendance_logs", "upsert")) == 0
+
+
+def test_rewrite_without_function_never_touches_existing_rows():
+    client = _client()
+    writer = AttendanceWriter(client_factory=lambda: client)
+    writer.write("r1", [("a", 0.6)], day=DAY)
+    client.tables["attendance_logs"][0]["status"] = "absent"
+
+    writer.write("r1", [("a", 0.9), ("b", 0.7)], day=DAY)
+    logs = {r["student_id"]: r for r in client.tables["attendance_logs"]}
+    assert logs["a"]["status"] == "absent" and logs["a"]["confidence"] == 0.6
+    assert logs["b"]["status"] == "present"
+    # The missing function is only probed once
+    assert client.calls.count(("record_attendance", "rpc")) == 1
+
+
+def test_write_retries_transient_failures():
+    client = _client()
+    client.fail_tables["attendance_logs"] = RuntimeError("connection reset")
+    delays = []
+
+    def sleep(seconds):
+        delays.append(seconds)
+        client.fail_tables.clear()
+
+    writer = AttendanceWriter(client_factory=lambda: client, retries=3, backoff_seconds=0.5, sleep=sleep)
+    assert writer.write("r1", [("a", 0.8)], day=DAY) == 1
+    assert delays == [0.5]
+    assert writer.last_stats["attempts"] == 2
+
+
+def test_write_gives_up_after_retries():
+    client = _client()
+    client.fail_tables["attendance_logs"] = RuntimeError("down")
+    delays = []
+    writer = AttendanceWriter(client_factory=lambda: client, retries=3, backoff_seconds=0.5, sleep=delays.append)
+
+    assert writer.write("r1", [("a", 0.8)], day=DAY) == 0
+    assert delays == [0.5, 1.0]
+    assert writer.write("missing", [("a", 0.8)], day=DAY) == 0
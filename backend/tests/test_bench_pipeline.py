@@ -0,0 +1,38 @@
+import sys
+import os
+import argparse
+import json
+
+# Adjust path to find backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks import bench_pipeline
+
+
+def _args(**overrides):
+    args = dict(repeat=1, resolutions=[(320, 240)], faces=[1, 3], vectors=[200], index_type="flat",
+                requests=4, concurrency=2, workers=1, e2e_faces=3, e2e_students=50, real_model=False)
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def test_stub_pipeline_embeds_every_face():
+    service = bench_pipeline.BenchFaceLogic(5)
+    data = bench_pipeline.jpeg(bench_pipeline.synthetic_photo(640, 480))
+    assert len(service.get_embeddings_batch(data)) == 5
+
+
+def test_suites_emit_comparable_json(tmp_path, capsys):
+    args = _args()
+    rows = []
+    for suite in (bench_pipeline.bench_decode, bench_pipeline.bench_embed, bench_pipeline.bench_search, bench_pipeline.bench_e2e):
+        rows += suite(args)
+    names = {row["name"] for row in rows}
+    assert names == {"decode", "get_embeddings_batch", "rebuild_index", "search", "search_batch", "recognize_e2e"}
+    e2e = next(row for row in rows if row["name"] == "recognize_e2e")
+    assert e2e["matched_per_request"] == 3 and e2e["requests_per_s"] > 0
+
+    path = tmp_path / "run.json"
+    path.write_text(json.dumps({"results": rows}))
+    bench_pipeline.compare(rows, str(path))
+    assert "1.00x" in capsys.readouterr().out
@@ -0,0 +1,150 @@
+import sys
+import os
+import json
+import zipfile
+import numpy as np
+import pytest
+
+# Adjust path to find backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.bench_pipeline import BenchFaceLogic, jpeg, synthetic_photo
+from services import bulk_enrollment
+from services.bulk_enrollment import BulkEnrollment, ProgressFile, list_photos
+from services.vector_search import VectorSearch
+from tests.fake_supabase import FakeSupabase
+
+
+def _vec(seed):
+    v = np.random.default_rng(seed).standard_normal(512).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+class FakeEnrollService:
+    """
+    A photo's bytes name the verdict: b"ok:<seed>", b"none", b"multi" or b"dark".
+    """
+    def __init__(self):
+        self.calls = 0
+
+    def analyze_enrollment(self, image_bytes):
+        self.calls += 1
+        text = image_bytes.decode()
+        if text.startswith("ok:"):
+            return _vec(int(text[3:])), "ok", {"faces_detected": 1, "brightness": 120.0}
+        if text == "multi":
+            return None, "multiple_faces", {"faces_detected": 2, "brightness": 120.0}
+        return None, "no_face", {"faces_detected": 0, "brightness": 20.0 if text == "dark" else 120.0}
+
+
+PHOTOS = {"101.jpg": b"ok:1", "102.jpg": b"ok:2", "103.png": b"multi", "104.jpg": b"dark",
+          "105.jpg": b"none", "106.jpg": b"ok:6", "999.jpg": b"ok:9", "notes.txt": b"x"}
+
+
+def _students():
+    rows = [{"id": i, "profile_id": f"p{i}", "student_id": str(100 + i), "section_id": 7, "face_embedding": None,
+             "face_registered": False} for i in range(1, 7)]
+    # Same roll number in another section
+    rows.append({"id": 50, "profile_id": "p50", "student_id": "106", "section_id": 8, "face_embedding": None,
+                 "face_registered": False})
+    return FakeSupabase({"students": rows, "student_face_templates": [{"student_id": 1, "template_no": 1}]})
+
+
+@pytest.fixture
+def photos(tmp_path):
+    root = tmp_path / "photos"
+    (root / "sub").mkdir(parents=True)
+    for name, data in PHOTOS.items():
+        (root / ("sub" if name == "106.jpg" else "") / name).write_bytes(data)
+    return root
+
+
+def _run(source, db, progress, section_id=7, service=None, batch_size=2):
+    enrollment = BulkEnrollment(str(source), progress_path=str(progress), client_factory=lambda: db,
+                                section_id=section_id, workers=0, batch_size=batch_size,
+                                service=service or FakeEnrollService())
+    try:
+        return enrollment, enrollment.run()
+    finally:
+        enrollment.close()
+
+
+def test_list_photos_from_dir_and_zip(photos, tmp_path):
+    listed = list_photos(str(photos))
+    assert [roll for _, roll in listed] == ["101", "102", "103", "104", "105", "999", "106"]
+    archive = tmp_path / "photos.zip"
+    with zipfile.ZipFile(archive, "w") as z:
+        for name, data in PHOTOS.items():
+            z.writestr(f"batch/{name}", data)
+    assert sorted(roll for _, roll in list_photos(str(archive))) == sorted(roll for _, roll in listed)
+
+
+def test_enrolls_and_reports_failures(photos, tmp_path):
+    db = _students()
+    enrollment, stats = _run(photos, db, tmp_path / "progress.jsonl")
+
+    assert stats["processed"] == 6 and stats["written"] == 3
+    assert stats["statuses"] == {"ok": 3, "multiple_faces": 1, "low_light": 1, "no_face": 1}
+    assert dict(enrollment.failures()) == {"103.png": "multiple_faces", "104.jpg": "low_light",
+                                           "105.jpg": "no_face", "999": "unknown_roll_no"}
+    students = {r["id"]: r for r in db.tables["students"]}
+    assert np.allclose(students[1]["face_embedding"], _vec(1), atol=1e-6)
+    assert students[6]["face_embedding"] is not None and students[50]["face_embedding"] is None
+    assert students[1]["profile_id"] == "p1" and students[1]["face_registered"] and len(db.tables["students"]) == 7
+    # Old templates belong to the previous enrollment
+    assert db.tables["student_face_templates"] == []
+
+
+def test_resumes_from_progress_file(photos, tmp_path):
+    db = _students()
+    progress = tmp_path / "progress.jsonl"
+    # An earlier run embedded 101 but died before writing it
+    with open(progress, "w") as f:
+        f.write(json.dumps({"file": "101.jpg", "roll_no": "101", "status": "ok", "embedding": _vec(1).tolist()}) + "\n")
+        f.write('{"file": "102.jpg", "roll')
+
+    service = FakeEnrollService()
+    _, stats = _run(photos, db, progress, service=service)
+    assert service.calls == 5 and stats["resumed"] == 1
+    assert stats["written"] == 3
+
+    service = FakeEnrollService()
+    _, stats = _run(photos, db, progress, service=service)
+    assert service.calls == 0 and stats["written"] == 0
+    assert ProgressFile(str(progress)).unwritten() == []
+
+
+def test_ambiguous_roll_numbers_need_a_section(photos, tmp_path):
+    enrollment, stats = _run(photos, _students(), tmp_path / "progress.jsonl", section_id=None)
+    assert enrollment.skipped["106"] == "ambiguous_roll_no"
+    assert stats["statuses"]["ok"] == 2
+
+
+def test_builds_snapshot_from_db(photos, tmp_path):
+    db = _students()
+    enrollment, _ = _run(photos, db, tmp_path / "progress.jsonl")
+    index = VectorSearch(load_on_init=False, snapshot_dir=str(tmp_path / "snapshot"))
+    enrollment.build_snapshot(index)
+    assert index.index.ntotal == 3 and index.generation == 1
+    assert index.search(_vec(2), k=1)[0][0] == "2"
+
+
+def test_analyze_enrollment_verdicts():
+    data = jpeg(synthetic_photo(640, 480))
+    embedding, verdict, timings = BenchFaceLogic(1).analyze_enrollment(data)
+    assert verdict == "ok" and embedding.shape == (512,) and "brightness" in timings
+    assert BenchFaceLogic(3).analyze_enrollment(data)[1] == "multiple_faces"
+    assert BenchFaceLogic(0).analyze_enrollment(data)[1] == "no_face"
+    assert BenchFaceLogic(1).analyze_enrollment(b"not an image")[1] == "unreadable"
+
+
+def test_dry_run_writes_nothing(photos, tmp_path, capsys):
+    bulk_enrollment._init_worker(0, FakeEnrollService())
+    progress = tmp_path / "dry.jsonl"
+    enrollment = BulkEnrollment(str(photos), progress_path=str(progress), client_factory=lambda: None,
+                                workers=0, service=FakeEnrollService())
+    stats = enrollment.run()
+    enrollment.close()
+    assert stats["statuses"]["ok"] == 4 and stats["written"] == 0
+    bulk_enrollment.print_report(stats, enrollment.failures())
+    assert "multiple_faces: 1" in capsys.readouterr().out
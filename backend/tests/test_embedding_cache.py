@@ -0,0 +1,60 @@
+import sys
+import os
+import numpy as np
+
+# Adjust path to find backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.bench_pipeline import BenchFaceLogic, jpeg, synthetic_photo
+from services.embedding_cache import CachedFaces, EmbeddingCache
+
+
+def _entry():
+    return CachedFaces(np.zeros((0, 5), dtype=np.float32), np.empty(0, dtype=np.int64), {}, {}, True)
+
+
+def test_lru_and_ttl_eviction():
+    now = [0.0]
+    cache = EmbeddingCache(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+    a, b, c = (cache.key(data) for data in (b"a", b"b", b"c"))
+    cache.put(a, _entry())
+    cache.put(b, _entry())
+    assert cache.get(a) is not None
+    cache.put(c, _entry())
+    # b was least recently used
+    assert cache.get(b) is None and cache.get(a) is not None
+
+    now[0] = 11.0
+    assert cache.get(c) is None
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 2, "evictions": 1, "hit_rate": 0.5}
+
+
+def test_repeated_upload_skips_the_pipeline():
+    service = BenchFaceLogic(4)
+    service.cache = EmbeddingCache()
+    detections = []
+    detect = service.app.det_model.detect
+    service.app.det_model.detect = lambda *a, **kw: detections.append(1) or detect(*a, **kw)
+    data = jpeg(synthetic_photo(640, 480))
+
+    first, timings = service.analyze_all(data)
+    again, hit = service.analyze_all(data)
+    assert len(detections) == 1 and timings["cache_hit"] == 0.0 and hit["cache_hit"] == 1.0
+    assert "detect_ms" not in hit and "brightness" in hit
+    assert all(np.array_equal(x, y) for x, y in zip(first, again))
+
+    # The largest face is served from the same entry
+    largest, hit = service.analyze_largest(data)
+    assert hit["cache_hit"] == 1.0 and any(np.array_equal(largest, e) for e in first)
+    assert not largest.flags.writeable
+
+
+def test_largest_only_entry_is_completed_by_analyze_all():
+    service = BenchFaceLogic(3)
+    service.cache = EmbeddingCache()
+    data = jpeg(synthetic_photo(640, 480, seed=1))
+
+    service.analyze_largest(data)
+    embeddings, timings = service.analyze_all(data)
+    assert len(embeddings) == 3 and timings["cache_hit"] == 0.0
+    assert service.analyze_all(data)[1]["cache_hit"] == 1.0
@@ -0,0 +1,94 @@
+import sys
+import os
+import numpy as np
+
+# Adjust path to find backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.face_tracker import FaceTracker, box_iou
+from services.stream_session import StreamSession
+
+
+def test_box_iou():
+    iou = box_iou([[0, 0, 10, 10]], [[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]])
+    assert np.allclose(iou, [[1.0, 1 / 3, 0.0]])
+
+
+def test_moving_face_keeps_its_track():
+    tracker = FaceTracker(max_misses=2)
+    ids = []
+    for frame in range(1, 9):
+        tracker.predict()
+        # Walks right 6 px per frame; a second face appears on frame 5
+        boxes = [[10 + 6 * frame, 50, 70 + 6 * frame, 110]]
+        if frame >= 5:
+            boxes.append([300, 50, 360, 110])
+        ids.append([track.id for track in tracker.update(boxes, frame)])
+    assert ids[:4] == [[1]] * 4 and ids[4:] == [[1, 2]] * 4
+    # The velocity is learned: the prediction leads the last detection
+    assert tracker.predict()[0][0] > 10 + 6 * 8
+
+    for frame in range(9, 12):
+        tracker.update([], frame)
+        tracker.predict()
+    assert tracker.tracks == []
+
+
+def test_votes_settle_identity_and_skip_recognition():
+    session = StreamSession(min_votes=2, max_recognitions=3, recheck_frames=4)
+    box = [[0, 0, 50, 50]]
+    planned = []
+    for frame in range(1, 8):
+        skip = session.plan()
+        planned.append(len(skip))
+        matches = {} if len(skip) else {0: ("s1", 0.8)}
+        report = session.update(box, matches)
+    # Recognized on frames 1-2, skipped until the re-check on frame 6
+    assert planned == [0, 0, 1, 1, 1, 0, 1]
+    assert report["tracks"][0]["student_id"] == "s1"
+    assert session.summary()["present"][0]["first_frame"] == 2
+
+
+def test_dropped_frames_leave_tracks_untouched():
+    def run(drops):
+        session = StreamSession(min_votes=2, max_recognitions=3, recheck_frames=4)
+        skipped = []
+        for frame in range(1, 7):
+            box = [[10 * frame, 0, 10 * frame + 50, 50]]
+            skip = session.plan()
+            skipped.append(len(skip))
+            session.update(box, {} if len(skip) else {0: ("s1", 0.8)})
+            # Frames arriving while inference is busy
+            for _ in range(drops):
+                session.plan()
+                session.drop()
+        return session, skipped
+
+    calm, calm_skipped = run(0)
+    busy, busy_skipped = run(3)
+    track, busy_track = calm.tracker.tracks[0], busy.tracker.tracks[0]
+    assert np.allclose(track.kalman.x, busy_track.kalman.x) and np.allclose(track.kalman.P, busy_track.kalman.P)
+    # Re-checks still happen every 4 processed frames
+    assert busy_skipped == calm_skipped and busy.frame == calm.frame == 6
+    assert busy.summary()["frames_skipped"] == 18
+
+
+def test_disagreeing_votes_stay_uncertain():
+    session = StreamSession(min_votes=2, min_share=0.75, max_recognitions=4)
+    for student_id in ("a", "b", "a", "b"):
+        session.plan()
+        report = session.update([[0, 0, 50, 50]], {0: (student_id, 0.7)})
+    assert report["tracks"][0]["student_id"] is None and session.present() == []
+    # Out of attempts: no more recognition until the re-check
+    assert len(session.plan()) == 1
+
+
+def test_analyze_frame_skips_faces_under_tracked_boxes():
+    from benchmarks.bench_pipeline import BenchFaceLogic, jpeg, synthetic_photo
+    service = BenchFaceLogic(4)
+    data = jpeg(synthetic_photo(640, 480))
+    boxes, embeddings, _ = service.analyze_frame(data)
+    assert boxes.shape == (4, 5) and sorted(embeddings) == [0, 1, 2, 3]
+
+    _, embeddings, timings = service.analyze_frame(data, boxes[:2, :4])
+    assert sorted(embeddings) == [2, 3] and timings["faces_embedded"] == 2
@@ -0,0 +1,63 @@
+import sys
+import os
+import numpy as np
+import pytest
+
+# Adjust path to find backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.image_enhancement import ENHANCEMENT_MODES, ImageEnhancer
+
+
+def _dark_image(h=120, w=160):
+    # Smooth gradient plus texture, scaled down to a dim classroom level
+    rng = np.random.default_rng(0)
+    base = np.linspace(5, 40, w, dtype=np.float32)[None, :, None] + rng.normal(0, 4, (h, w, 3))
+    return np.clip(base, 0, 255).astype(np.uint8)
+
+
+def test_fast_retinex_matches_reference():
+    img = _dark_image()
+    enhancer = ImageEnhancer(mode="fast_retinex")
+    reference = enhancer.apply_retinex(img).astype(np.float32)
+    fast = enhancer.fast_retinex(img)
+
+    assert fast.shape == img.shape and fast.dtype == np.uint8
+    assert np.abs(reference - fast).mean() < 3.0
+
+
+@pytest.mark.parametrize("mode", ENHANCEMENT_MODES)
+def test_modes_brighten_dark_images(mode):
+    img = _dark_image()
+    out = ImageEnhancer(mode=mode).enhance(img, float(img.max(axis=2).mean()))
+    assert out.shape == img.shape and out.dtype == np.uint8
+    assert out.mean() > img.mean()
+
+
+def test_fast_retinex_handles_black_frames():
+    out = ImageEnhancer().fast_retinex(np.zeros((48, 64, 3), np.uint8))
+    assert not out.any()
+
+
+def test_unknown_mode_rejected():
+    with pytest.raises(ValueError):
+        ImageEnhancer(mode="hdr")
+
+
+def test_brightness_probe_matches_hsv_value():
+    import cv2
+
+    img = np.random.default_rng(1).integers(0, 120, (600, 800, 3), dtype=np.uint8)
+    exact = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)[:, :, 2].mean()
+    assert abs(ImageEnhancer.estimate_brightness(img) - exact) < 1.0
+
+
+def test_enhance_with_info_reports_decision():
+    enhancer = ImageEnhancer(mode="gamma")
+    dark = _dark_image()
+    out, info = enhancer.enhance_with_info(dark)
+    assert info["enhanced"] and info["brightness"] < 50 and out is not dark
+
+    bright = np.full((40, 40, 3), 200, np.uint8)
+    out, info = enhancer.enhance_with_info(bright)
+    assert not info["enhanced"] and info["brightness"] == 200.0 and out is bright
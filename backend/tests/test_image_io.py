@@ -0,0 +1,35 @@
+import sys
+import os
+import cv2
+import numpy as np
+
+# Adjust path to find backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.image_io import decode_image, jpeg_size, reduction_for
+
+
+def _jpeg(width, height):
+    img = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    return cv2.imencode(".jpg", img)[1].tobytes()
+
+
+def test_jpeg_size_reads_header():
+    assert jpeg_size(_jpeg(640, 480)) == (640, 480)
+    assert jpeg_size(cv2.imencode(".png", np.zeros((4, 4, 3), np.uint8))[1].tobytes()) is None
+    assert jpeg_size(b"\xff\xd8") is None
+
+
+def test_reduction_keeps_target_side():
+    assert reduction_for(4000, 3000, 1600) == 2
+    assert reduction_for(4000, 3000, 480) == 8
+    assert reduction_for(1280, 720, 1600) == 1
+
+
+def test_decode_image_reduces_large_jpegs():
+    data = _jpeg(3200, 2400)
+    img, factor = decode_image(data, target_side=1600)
+    assert factor == 2 and img.shape == (1200, 1600, 3)
+
+    img, factor = decode_image(data)
+    assert factor == 1 and img.shape == (2400, 3200, 3)
@@ -0,0 +1,97 @@
+import sys
+import os
+import asyncio
+
+# Adjust path to find backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.index_share import IndexShare
+from services.vector_search import VectorSearch
+from tests.vectors import unit_vectors
+
+
+def _worker(tmp_path, **kwargs):
+    vs = VectorSearch(index_path=str(tmp_path / "faiss_index.bin"), mapping_path=str(tmp_path / "id_labels.json"), load_on_init=False, **kwargs)
+    return IndexShare(index=vs, enabled=True, poll_seconds=0.01)
+
+
+def test_one_owner_and_followers_swap_generations(tmp_path):
+    owner, follower = _worker(tmp_path), _worker(tmp_path)
+    assert owner.claim() == "owner"
+    assert follower.claim() == "follower"
+
+    vecs = unit_vectors(20)
+    owner.owned.bulk_load([f"s{i}" for i in range(20)], vecs, ["A"] * 20)
+    assert follower.refresh()
+    before = follower.index
+    assert before.generation == owner.owned.generation
+    assert before.search(vecs[3])[0][0] == "s3"
+    assert not follower.refresh()
+
+    owner.upsert(["s3"], vecs[4:5])
+    assert follower.refresh()
+    # Swapped by reference: the old instance is left untouched for in-flight queries
+    assert follower.index is not before and before.search(vecs[3])[0][0] == "s3"
+    assert follower.index.search(vecs[4], k=2)[0][0] in ("s3", "s4")
+    assert follower.stats()["swaps"] == 2
+
+
+def test_follower_refresh_skips_checksums(tmp_path, monkeypatch):
+    import services.index_snapshot as index_snapshot
+    owner, follower = _worker(tmp_path), _worker(tmp_path)
+    owner.claim(), follower.claim()
+    owner.owned.bulk_load(["a", "b"], unit_vectors(2))
+
+    hashed = []
+    real_checksum = index_snapshot._checksum
+    monkeypatch.setattr(index_snapshot, "_checksum", lambda path: hashed.append(path) or real_checksum(path))
+    # Startup load is fully verified, later generations only by size
+    asyncio.run(follower.wait_for_snapshot())
+    assert len(hashed) == 1
+    owner.upsert(["c"], unit_vectors(1, seed=3))
+    hashed.clear()
+    assert follower.refresh() and hashed == []
+    assert follower.index.index.ntotal == 3
+
+
+def test_follower_writes_reach_owner_through_inbox(tmp_path):
+    owner, follower = _worker(tmp_path), _worker(tmp_path)
+    owner.claim(), follower.claim()
+    vecs = unit_vectors(10)
+    owner.owned.bulk_load([f"s{i}" for i in range(5)], vecs[:5], ["A"] * 5)
+
+    follower.upsert(["new"], vecs[5:6], ["B"])
+    follower.upsert(["new"], vecs[6:7])
+    follower.request_sync("delta")
+    assert follower.stats()["pending_writes"] == 3
+
+    syncs = []
+    assert owner.drain_inbox(syncs.append) == 3
+    assert syncs == ["delta"]
+    # The newest write wins and keeps the section given earlier
+    assert owner.owned.search(vecs[6])[0][0] == "new"
+    assert owner.owned.template_counts()["new"] == 1
+    follower.refresh()
+    ids, _ = follower.index.search_batch(vecs[6:7], section_id="B")
+    assert ids[0][0] == "new"
+    assert owner.stats()["pending_writes"] == 0
+
+
+def test_drained_writes_are_published_without_waiting_for_the_save_delay(tmp_path):
+    owner, follower = _worker(tmp_path, save_delay_seconds=60), _worker(tmp_path)
+    owner.claim(), follower.claim()
+    vecs = unit_vectors(3)
+    owner.owned.bulk_load(["a", "b"], vecs[:2])
+    follower.refresh()
+
+    follower.upsert(["c"], vecs[2:3])
+    owner.drain_inbox(lambda mode: None)
+    assert follower.refresh()
+    assert follower.index.search(vecs[2])[0][0] == "c"
+
+
+def test_disabled_sharing_is_a_pass_through(tmp_path):
+    share = IndexShare(index=VectorSearch(index_path=str(tmp_path / "faiss_index.bin"), load_on_init=False))
+    assert share.claim() == "single"
+    share.upsert(["a"], unit_vectors(1))
+    assert share.index is share.owned and share.index.index.ntotal == 1
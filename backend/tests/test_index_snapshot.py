@@ -0,0 +1,93 @@
+import sys
+import os
+import json
+import faiss
+import numpy as np
+import pytest
+
+# Adjust path to find backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.index_snapshot import SnapshotError, current_generation, read_snapshot
+from services.vector_search import VectorSearch
+from tests.vectors import unit_vectors
+
+
+def _index(tmp_path, **kwargs):
+    return VectorSearch(index_path=str(tmp_path / "faiss_index.bin"), mapping_path=str(tmp_path / "id_labels.json"), **kwargs)
+
+
+def test_snapshot_roundtrip_is_memory_mapped(tmp_path):
+    vecs = unit_vectors(30)
+    vs = _index(tmp_path)
+    vs.bulk_load([f"s{i}" for i in range(30)], vecs, ["A"] * 15 + ["B"] * 15)
+
+    snapshot = read_snapshot(vs.snapshot_dir)
+    assert snapshot.generation == 1 and snapshot.manifest["count"] == 30
+    assert sorted(os.listdir(snapshot.path)) == ["index.faiss", "manifest.json"]
+
+    reloaded = _index(tmp_path)
+    assert reloaded._read_only
+    assert reloaded.search(vecs[20])[0][0] == "s20"
+    assert reloaded.search_batch(vecs[3], section_id="A")[0][0, 0] == "s3"
+
+    # First write copies the mapped index into memory, then saves a new generation
+    reloaded.add_vector("new", unit_vectors(1, seed=5)[0], "B")
+    assert not reloaded._read_only and reloaded.index.ntotal == 31
+    assert current_generation(vs.snapshot_dir) == 2
+
+
+def test_corrupt_snapshot_is_rejected(tmp_path):
+    vs = _index(tmp_path)
+    vs.bulk_load(["a", "b"], unit_vectors(2))
+    path = os.path.join(vs.snapshot_dir, "gen-00000001", "index.faiss")
+    with open(path, "r+b") as f:
+        f.seek(-4, os.SEEK_END)
+        f.write(b"\x00\x00\x80\x7f")
+
+    with pytest.raises(SnapshotError):
+        read_snapshot(vs.snapshot_dir)
+    assert _index(tmp_path).index.ntotal == 0
+
+
+def test_checksums_only_with_full_verification(tmp_path):
+    vs = _index(tmp_path)
+    vs.bulk_load(["a", "b"], unit_vectors(2))
+    path = os.path.join(vs.snapshot_dir, "gen-00000001", "index.faiss")
+    with open(path, "r+b") as f:
+        f.seek(-4, os.SEEK_END)
+        f.write(b"\x00\x00\x80\x7f")
+
+    # Same size: only a full verification reads and hashes the file
+    assert read_snapshot(vs.snapshot_dir, verify=False).manifest["count"] == 2
+    with pytest.raises(SnapshotError):
+        read_snapshot(vs.snapshot_dir, verify=True)
+    # A truncated or grown file is caught either way
+    with open(path, "ab") as f:
+        f.write(b"\x00")
+    with pytest.raises(SnapshotError):
+        read_snapshot(vs.snapshot_dir, verify=False)
+
+
+def test_old_generations_are_pruned(tmp_path):
+    vs = _index(tmp_path)
+    for i in range(4):
+        vs.add_vector(f"s{i}", unit_vectors(1, seed=i)[0])
+    names = sorted(n for n in os.listdir(vs.snapshot_dir) if n.startswith("gen-"))
+    assert names == ["gen-00000003", "gen-00000004"]
+    with open(os.path.join(vs.snapshot_dir, "CURRENT")) as f:
+        assert f.read() == "gen-00000004"
+
+
+def test_legacy_files_are_migrated(tmp_path):
+    vecs = unit_vectors(3)
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(512))
+    index.add_with_ids(vecs, np.array([11, 12, 13], dtype=np.int64))
+    faiss.write_index(index, str(tmp_path / "faiss_index.bin"))
+    with open(tmp_path / "id_labels.json", "w") as f:
+        json.dump({"labels": {"11": "a", "12": "b", "13": "c"}, "sections": {}}, f)
+
+    vs = _index(tmp_path)
+    assert vs.search(vecs[1])[0][0] == "b"
+    vs.compact()
+    assert sorted(read_snapshot(vs.snapshot_dir).manifest["labels"].values()) == ["a", "b", "c"]
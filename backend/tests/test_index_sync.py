@@ -0,0 +1,140 @@
+import sys
+import os
+import numpy as np
+
+# Adjust path to find backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.vector_search import VectorSearch
+from services.index_sync import IndexSync, parse_pgvector_page
+from tests.fake_supabase import FakeSupabase
+
+
+T0 = "2026-01-05T08:00:00+00:00"
+T1 = "2026-01-05T09:30:00+00:00"
+
+
+def _pgvector(vec):
+    return "[" + ",".join(f"{x:.7g}" for x in vec) + "]"
+
+
+def _rows(n, seed=0):
+    vecs = np.random.default_rng(seed).standard_normal((n, 512)).astype('float32')
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    rows = [
+        {"id": i + 1, "face_embedding": _pgvector(vec), "section_id": "A" if i % 2 else "B", "updated_at": T0}
+        for i, vec in enumerate(vecs)
+    ]
+    return rows, vecs
+
+
+def _index(tmp_path):
+    return VectorSearch(index_path=str(tmp_path / "idx.bin"), mapping_path=str(tmp_path / "labels.json"))
+
+
+def test_parse_pgvector_page():
+    rows, vecs = _rows(3)
+    matrix, ok = parse_pgvector_page([r["face_embedding"] for r in rows], 512)
+    assert matrix.dtype == np.float32 and ok.all()
+    assert np.allclose(matrix, vecs, atol=1e-6)
+
+    # One bad row must not poison the whole page
+    values = [rows[0]["face_embedding"], "[1,2,3]", vecs[2].tolist()]
+    matrix, ok = parse_pgvector_page(values, 512)
+    assert list(ok) == [True, False, True]
+    assert np.allclose(matrix[2], vecs[2])
+
+
+def test_full_sync_pages_past_server_row_cap(tmp_path):
+    rows, vecs = _rows(250)
+    # Server caps at 40 rows even though we ask for 100 per page
+    client = FakeSupabase({"students": rows}, max_rows=40)
+    vs = _index(tmp_path)
+    sync = IndexSync(client_factory=lambda: client, index=vs, page_size=100)
+
+    stats = sync.full_sync()
+
+    assert stats["rows"] == 250
+    assert stats["pages"] == 7
+    # 7 pages + the final empty one, plus the two watermark probes
+    assert client.calls.count(("students", "select")) == 9
+    assert vs.index.ntotal == 250
+    assert vs.search(vecs[199])[0][0] == "200"
+    assert vs.search_batch(vecs[[199]], section_id="A")[0][0, 0] == "200"
+
+
+def test_full_sync_without_client(tmp_path):
+    vs = _index(tmp_path)
+    assert IndexSync(client_factory=lambda: None, index=vs).full_sync() is None
+
+
+def test_delta_sync_applies_upserts_and_removals(tmp_path):
+    rows, vecs = _rows(10)
+    client = FakeSupabase({"students": rows, "student_face_tombstones": []}, max_rows=3)
+    vs = _index(tmp_path)
+    sync = IndexSync(client_factory=lambda: client, index=vs, page_size=3, overlap_seconds=0)
+    sync.full_sync()
+    assert vs.index.ntotal == 10
+
+    new_vecs, _ = _rows(2, seed=1)
+    students = client.tables["students"]
+    # Student 3 re-registered, student 5 cleared, student 7 deleted, student 11 is new
+    students[2].update(face_embedding=new_vecs[0]["face_embedding"], section_id="C", updated_at=T1)
+    students[4].update(face_embedding=None, updated_at=T1)
+    client.tables["students"] = [r for r in students if r["id"] != 7]
+    client.tables["student_face_tombstones"].append({"student_id": 7, "deleted_at": T1})
+    client.tables["students"].append({"id": 11, "face_embedding": new_vecs[1]["face_embedding"], "updated_at": T1})
+
+    stats = sync.delta_sync()
+
+    assert stats["mode"] == "delta"
+    assert stats["upserted"] == 2 and stats["removed"] == 2
+    assert vs.index.ntotal == 9
+    labels = set(vs.id_mapping.values())
+    assert "5" not in labels and "7" not in labels and "11" in labels
+    query = np.fromstring(new_vecs[0]["face_embedding"][1:-1], dtype=np.float32, sep=",")
+    student_id, distance = vs.search(query)[0]
+    assert student_id == "3" and distance < 1e-4
+    assert vs.search_batch(query, section_id="C")[0][0, 0] == "3"
+
+    # Nothing changed since: the next delta is a no-op
+    assert sync.delta_sync()["upserted"] == 0
+
+
+def test_delta_sync_falls_back_without_change_tracking(tmp_path):
+    rows, _ = _rows(5)
+    client = FakeSupabase({"students": [{k: v for k, v in r.items() if k != "updated_at"} for r in rows]})
+    client.fail_tables["student_face_tombstones"] = RuntimeError("relation does not exist")
+    vs = _index(tmp_path)
+    sync = IndexSync(client_factory=lambda: client, index=vs)
+
+    sync.full_sync()
+    assert sync.watermark is None
+    assert sync.delta_sync()["mode"] == "full"
+
+
+def test_sync_loads_face_templates(tmp_path):
+    rows, _ = _rows(4)
+    extra, extra_vecs = _rows(3, seed=2)
+    templates = [
+        {"id": 1, "student_id": 2, "template_no": 1, "embedding": extra[0]["face_embedding"]},
+        {"id": 2, "student_id": 2, "template_no": 2, "embedding": extra[1]["face_embedding"]},
+        # Student 9 has no primary embedding, so its template is ignored
+        {"id": 3, "student_id": 9, "template_no": 1, "embedding": extra[2]["face_embedding"]},
+    ]
+    client = FakeSupabase({"students": rows, "student_face_tombstones": [], "student_face_templates": templates})
+    vs = VectorSearch(index_path=str(tmp_path / "idx.bin"), mapping_path=str(tmp_path / "labels.json"), max_templates=3)
+    sync = IndexSync(client_factory=lambda: client, index=vs, overlap_seconds=0)
+
+    stats = sync.full_sync()
+    assert stats["rows"] == 4 and stats["templates"] == 6
+    assert vs.search(extra_vecs[1])[0][0] == "2"
+    assert vs.search_batch(extra_vecs[1], section_id="A")[0][0, 0] == "2"
+
+    # Dropping a template touches the student, and the delta reloads its whole set
+    client.tables["student_face_templates"] = templates[:1] + templates[2:]
+    client.tables["students"][1]["updated_at"] = T1
+    stats = sync.delta_sync()
+    assert stats["upserted"] == 1
+    assert vs.template_counts()["2"] == 2
+    assert vs.index.ntotal == 5
@@ -0,0 +1,97 @@
+import sys
+import os
+import asyncio
+import threading
+
+# Adjust path to find backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.inference import InferenceExecutor, InferenceQueueFull
+from services.metrics import Metrics
+
+
+class SlowService:
+    def __init__(self, release):
+        self.release = release
+
+    def get_embeddings_batch(self, image_bytes):
+        self.release.wait(timeout=5)
+        return [image_bytes]
+
+
+def test_runs_off_event_loop():
+    release = threading.Event()
+    executor = InferenceExecutor(workers=1, queue_size=0, service=SlowService(release))
+
+    async def scenario():
+        task = asyncio.create_task(executor.run("get_embeddings_batch", b"img"))
+        await asyncio.sleep(0.05)
+        # The loop is still responsive while the worker is busy
+        assert not task.done()
+        assert executor.stats()["in_flight"] == 1
+        release.set()
+        return await task
+
+    assert asyncio.run(scenario()) == [b"img"]
+    assert executor.stats()["completed"] == 1
+    executor.shutdown()
+
+
+def test_cancelled_request_keeps_its_slot_until_the_worker_finishes():
+    release = threading.Event()
+    executor = InferenceExecutor(workers=1, queue_size=0, service=SlowService(release))
+
+    async def scenario():
+        task = asyncio.create_task(executor.run("get_embeddings_batch", b"a"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.sleep(0.05)
+        # The worker is still busy with the abandoned call
+        assert executor.stats()["in_flight"] == 1
+        try:
+            await executor.run("get_embeddings_batch", b"b")
+            raise AssertionError("expected InferenceQueueFull")
+        except InferenceQueueFull:
+            pass
+        release.set()
+        for _ in range(100):
+            if executor.stats()["in_flight"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert executor.stats()["in_flight"] == 0
+        return await executor.run("get_embeddings_batch", b"c")
+
+    assert asyncio.run(scenario()) == [b"c"]
+    executor.shutdown()
+
+
+def test_rejects_when_queue_full():
+    release = threading.Event()
+    metrics = Metrics()
+    executor = InferenceExecutor(workers=1, queue_size=1, retry_after=3, service=SlowService(release), metrics=metrics)
+
+    async def scenario():
+        first = asyncio.create_task(executor.run("get_embeddings_batch", b"a"))
+        second = asyncio.create_task(executor.run("get_embeddings_batch", b"b"))
+        await asyncio.sleep(0.05)
+        assert executor.stats()["queue_depth"] == 1
+        assert metrics.inference_in_flight.value() == 2 and metrics.inference_queue_depth.value() == 1
+        try:
+            await executor.run("get_embeddings_batch", b"c")
+            raise AssertionError("expected InferenceQueueFull")
+        except InferenceQueueFull as e:
+            assert e.retry_after == 3
+        release.set()
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(scenario()) == [[b"a"], [b"b"]]
+    stats = executor.stats()
+    assert stats["rejected"] == 1
+    assert stats["in_flight"] == 0
+    assert stats["max_wait_ms"] > 0
+    # The same backpressure is visible at /metrics
+    text = metrics.render()
+    assert "attendu_inference_rejected_total 1" in text
+    assert "attendu_inference_in_flight 0" in text and "attendu_inference_queue_depth 0" in text
+    assert "attendu_inference_wait_seconds_count 2" in text
+    executor.shutdown()
@@ -0,0 +1,44 @@
+import sys
+import os
+
+# Adjust path to find backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.metrics import Counter, Histogram, Metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram("t_seconds", "test", buckets=(0.01, 0.1))
+    for value in (0.005, 0.05, 0.05, 3.0):
+        h.observe(value, stage="x")
+    lines = h.render()
+    assert 't_seconds_bucket{stage="x",le="0.01"} 1' in lines
+    assert 't_seconds_bucket{stage="x",le="0.1"} 3' in lines
+    assert 't_seconds_bucket{stage="x",le="+Inf"} 4' in lines
+    assert 't_seconds_count{stage="x"} 4' in lines
+
+
+def test_label_values_are_escaped():
+    c = Counter("t_total", "test")
+    c.inc(path='a"b\\c\nd')
+    assert c.render()[-1] == 't_total{path="a\\"b\\\\c\\nd"} 1'
+
+
+def test_pipeline_timings_map_to_stages():
+    m = Metrics()
+    timings = m.begin_request()
+    m.record_pipeline({"decode_ms": 4.0, "brightness_ms": 1.0, "enhance_ms": 0.0, "detect_ms": 30.0,
+                       "embed_ms": 12.0, "faces_detected": 3, "enhanced": 1.0})
+    m.record_match(0.5, 2)
+    assert set(timings) == {"decode", "brightness", "enhance", "detect", "recognize", "search"}
+    assert m.faces_detected.value() == 3 and m.faces_matched.value() == 2 and m.images_enhanced.value() == 1
+    assert m.server_timing_header({"detect": 30.0}, 0.05) == "detect;dur=30.0, total;dur=50.0"
+
+
+def test_disabled_metrics_record_nothing():
+    m = Metrics(enabled=False)
+    timings = m.begin_request()
+    with m.timer("db"):
+        pass
+    m.record_pipeline({"detect_ms": 5.0, "faces_detected": 1})
+    assert timings == {} and m.faces_detected.value() == 0 and "stage=" not in m.render()
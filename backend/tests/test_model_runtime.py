@@ -0,0 +1,54 @@
+import sys
+import os
+import pytest
+
+# Adjust path to find backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.model_runtime import ModelRuntime, RuntimeApp, module_of
+
+
+def test_pack_files_map_to_pipeline_modules():
+    assert module_of("/m/buffalo_l/det_10g.onnx") == "detection"
+    assert module_of("/m/buffalo_s/det_500m.onnx") == "detection"
+    assert module_of("/m/buffalo_l/w600k_r50.onnx") == "recognition"
+    assert module_of("/m/buffalo_s/w600k_mbf.onnx") == "recognition"
+    assert module_of("/m/buffalo_l/2d106det.onnx") is None
+    assert module_of("/m/buffalo_l/genderage.onnx") is None
+
+
+def test_options_are_validated():
+    runtime = ModelRuntime(detector_pack="buffalo_s", quantize="recognition")
+    assert runtime.detector_pack == "buffalo_s" and runtime.pack == "buffalo_l"
+    assert runtime.quantized("recognition") and not runtime.quantized("detection")
+    assert ModelRuntime().detector_pack == "buffalo_l"
+    with pytest.raises(ValueError):
+        ModelRuntime(quantize="int4")
+    with pytest.raises(ValueError):
+        ModelRuntime(optimization="max")
+
+
+def test_runtime_app_prepares_like_face_analysis():
+    calls = []
+
+    class Model:
+        def __init__(self, name):
+            self.name = name
+
+        def prepare(self, ctx_id, **kwargs):
+            calls.append((self.name, kwargs))
+
+    app = RuntimeApp({"detection": Model("det"), "recognition": Model("rec")})
+    app.prepare(ctx_id=0, det_size=(320, 320))
+    assert app.det_model.name == "det"
+    assert calls == [("det", {"input_size": (320, 320), "det_thresh": 0.5}), ("rec", {})]
+
+
+def test_session_options_and_optimized_cache(tmp_path):
+    ort = pytest.importorskip("onnxruntime")
+    runtime = ModelRuntime(intra_op_threads=2, optimization="extended", cache_dir=str(tmp_path))
+    opts = runtime.session_options()
+    assert opts.intra_op_num_threads == 2 and opts.inter_op_num_threads == 1
+    assert opts.graph_optimization_level == ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    path = runtime._cache_path("/m/buffalo_l/w600k_r50.onnx", "-int8-optall")
+    assert os.path.basename(path) == f"buffalo_l-w600k_r50-int8-optall-ort{ort.__version__}.onnx"
@@ -0,0 +1,260 @@
+import sys
+import os
+import numpy as np
+import pytest
+
+# Adjust path to find backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.vector_search import VectorSearch, student_key
+from tests.vectors import unit_vectors
+
+
+def _fresh_index(tmp_path):
+    return VectorSearch(index_path=str(tmp_path / "faiss_index.bin"), mapping_path=str(tmp_path / "id_labels.json"))
+
+
+def test_search_batch_matches_single_search(tmp_path):
+    vs = _fresh_index(tmp_path)
+    vecs = unit_vectors(20)
+    for i, vec in enumerate(vecs):
+        vs.add_vector(f"student_{i}", vec)
+
+    queries = vecs[[3, 7, 11]]
+    student_ids, distances = vs.search_batch(queries, k=1)
+
+    assert student_ids.shape == (3, 1)
+    assert list(student_ids[:, 0]) == ["student_3", "student_7", "student_11"]
+    for row, query in enumerate(queries):
+        single_id, single_dist = vs.search(query, k=1)[0]
+        assert single_id == student_ids[row, 0]
+        assert np.isclose(single_dist, distances[row, 0], atol=1e-5)
+
+
+def test_search_batch_on_empty_index(tmp_path):
+    vs = _fresh_index(tmp_path)
+    student_ids, distances = vs.search_batch(unit_vectors(2), k=1)
+
+    assert student_ids.shape == (2, 1)
+    assert all(s is None for s in student_ids[:, 0])
+    assert np.all(np.isinf(distances))
+    assert vs.search(unit_vectors(1)[0]) == []
+
+
+def test_rebuild_index_persists_once(tmp_path):
+    vs = _fresh_index(tmp_path)
+    vecs = unit_vectors(50)
+    vs.rebuild_index({f"student_{i}": vec.tolist() for i, vec in enumerate(vecs)})
+
+    assert vs.index.ntotal == 50
+    assert vs.search(vecs[42])[0][0] == "student_42"
+    assert sorted(os.listdir(tmp_path)) == ["faiss_index.snapshot"]
+    assert sorted(os.listdir(tmp_path / "faiss_index.snapshot")) == ["CURRENT", "gen-00000001"]
+
+    reloaded = _fresh_index(tmp_path)
+    assert reloaded.index.ntotal == 50
+    assert reloaded.search(vecs[7])[0][0] == "student_7"
+
+
+def test_reregistering_replaces_instead_of_duplicating(tmp_path):
+    vs = _fresh_index(tmp_path)
+    old, new, other = unit_vectors(3)
+    vs.add_vector("student_a", old)
+    vs.add_vector("student_b", other)
+    vs.add_vector("student_a", new)
+
+    assert vs.index.ntotal == 2
+    assert sorted(vs.id_mapping.values()) == ["student_a", "student_b"]
+    # The stale face no longer matches anyone exactly
+    assert vs.search(old)[0][1] > 0.1
+    student_id, distance = vs.search(new)[0]
+    assert student_id == "student_a" and distance < 1e-5
+
+
+def test_remove_and_compact(tmp_path):
+    vs = _fresh_index(tmp_path)
+    vecs = unit_vectors(10)
+    vs.upsert_vectors([f"s{i}" for i in range(10)], vecs)
+
+    assert vs.remove_vectors(["s2", "s5", "missing"]) == 2
+    assert vs.index.ntotal == 8
+    assert vs.search(vecs[2])[0][0] != "s2"
+
+    vs.compact()
+    assert vs.index.ntotal == 8
+    assert vs.search(vecs[9])[0][0] == "s9"
+
+    reloaded = _fresh_index(tmp_path)
+    assert reloaded.index.ntotal == 8
+    assert "s5" not in reloaded.id_mapping.values()
+
+
+def test_search_runs_while_snapshot_is_written(tmp_path, monkeypatch):
+    import threading
+    import services.vector_search as vector_search_module
+
+    vs = _fresh_index(tmp_path)
+    vecs = unit_vectors(4)
+    vs.upsert_vectors(["s0", "s1"], vecs[:2])
+
+    writing, release = threading.Event(), threading.Event()
+    real_write = vector_search_module.write_snapshot
+
+    def slow_write(*args):
+        writing.set()
+        assert release.wait(5)
+        return real_write(*args)
+
+    monkeypatch.setattr(vector_search_module, "write_snapshot", slow_write)
+    writer = threading.Thread(target=vs.upsert_vectors, args=(["s2"], vecs[2:3]))
+    writer.start()
+    try:
+        assert writing.wait(5)
+        # The new vector is already searchable; the disk write does not hold the search lock
+        assert vs.search(vecs[2])[0][0] == "s2"
+        assert vs.generation == 1
+    finally:
+        release.set()
+        writer.join(5)
+    assert vs.generation == 2
+    assert _fresh_index(tmp_path).index.ntotal == 3
+
+
+def test_incremental_saves_are_coalesced(tmp_path):
+    import time
+
+    vs = VectorSearch(index_path=str(tmp_path / "faiss_index.bin"), save_delay_seconds=60)
+    vecs = unit_vectors(5)
+    for i in range(3):
+        vs.upsert_vectors([f"s{i}"], vecs[i:i + 1])
+    vs.remove_vectors(["s0"])
+    assert vs.generation == 0
+    assert vs.flush() and vs.generation == 1
+    assert not vs.flush()
+    assert _fresh_index(tmp_path).index.ntotal == 2
+
+    # Without a flush the timer saves once the delay has passed
+    vs.save_delay_seconds = 0.05
+    vs.upsert_vectors(["s3", "s4"], vecs[3:5])
+    deadline = time.monotonic() + 5
+    while vs.generation == 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert vs.generation == 2
+    assert _fresh_index(tmp_path).index.ntotal == 4
+
+
+def test_student_keys_are_stable():
+    assert student_key("42") == 42
+    uuid = "8f14e45f-ceea-467f-a8d5-2b6b5b0a8a1c"
+    assert student_key(uuid) == student_key(uuid) >= 0
+    assert student_key(uuid) != student_key("8f14e45f-ceea-467f-a8d5-2b6b5b0a8a1d")
+
+
+def test_section_scoped_search(tmp_path):
+    vs = VectorSearch(index_path=str(tmp_path / "faiss_index.bin"), mapping_path=str(tmp_path / "id_labels.json"), section_cache_size=1)
+    vecs = unit_vectors(6)
+    vs.bulk_load([f"s{i}" for i in range(6)], vecs, ["A", "A", "A", "B", "B", None])
+
+    # A face from section B never matches inside section A
+    ids, _ = vs.search_batch(vecs[[3, 0]], k=1, section_id="A")
+    assert ids[0, 0] in ("s0", "s1", "s2")
+    assert ids[1, 0] == "s0"
+    assert vs.search_batch(vecs[[3]], k=1, section_id="B")[0][0, 0] == "s3"
+    assert vs.search_batch(vecs[[0]], k=1, section_id="unknown")[0][0, 0] is None
+
+    # Moving a student invalidates both sections' cached sub-indexes
+    vs.add_vector("s0", vecs[0], "B")
+    assert vs.search_batch(vecs[[0]], k=1, section_id="A")[0][0, 0] != "s0"
+    assert vs.search_batch(vecs[[0]], k=1, section_id="B")[0][0, 0] == "s0"
+    # Re-registering without a section keeps the current one
+    vs.add_vector("s0", vecs[0])
+    assert vs.sections[student_key("s0")] == "B"
+
+    reloaded = VectorSearch(index_path=str(tmp_path / "faiss_index.bin"), mapping_path=str(tmp_path / "id_labels.json"))
+    assert reloaded.search_batch(vecs[[4]], k=1, section_id="B")[0][0, 0] == "s4"
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "ivfpq", "hnsw"])
+def test_index_types_support_upsert_remove_and_reload(tmp_path, index_type):
+    def make():
+        return VectorSearch(index_path=str(tmp_path / "faiss_index.bin"), mapping_path=str(tmp_path / "id_labels.json"),
+                            index_type=index_type, nlist=8, nprobe=8)
+
+    vs = make()
+    vecs = unit_vectors(600)
+    vs.bulk_load([f"s{i}" for i in range(600)], vecs)
+    assert vs.index_kind == index_type
+
+    ids, distances = vs.search_batch(vecs[:50], k=1)
+    assert np.mean(ids[:, 0] == np.array([f"s{i}" for i in range(50)], dtype=object)) >= 0.95
+    if index_type != "ivfpq":
+        assert np.all(distances[:, 0] < 1e-4)
+
+    new = unit_vectors(1, seed=5)[0]
+    vs.add_vector("s1", new)
+    assert vs.remove_vectors(["s2"]) == 1
+    assert vs.index.ntotal == 599
+    assert vs.search(new)[0][0] == "s1"
+    assert vs.search(vecs[2])[0][0] != "s2"
+
+    assert make().index.ntotal == 599
+
+
+def test_ivf_starts_flat_until_trained(tmp_path):
+    vs = VectorSearch(index_path=str(tmp_path / "faiss_index.bin"), mapping_path=str(tmp_path / "id_labels.json"), index_type="ivf")
+    assert vs.index_kind == "flat"
+    vs.add_vector("early", unit_vectors(1)[0])
+    assert vs.search(unit_vectors(1)[0])[0][0] == "early"
+
+
+def _templated_index(tmp_path, aggregation):
+    return VectorSearch(index_path=str(tmp_path / "faiss_index.bin"), mapping_path=str(tmp_path / "id_labels.json"),
+                        max_templates=3, aggregation=aggregation)
+
+
+def test_templates_return_distinct_students(tmp_path):
+    vs = _templated_index(tmp_path, "max")
+    vecs = unit_vectors(8)
+    # Student "a" enrolled from three photos, the rest from one
+    vs.bulk_load(["a", "a", "a", "b", "c", "d", "e", "f"], vecs)
+
+    assert vs.index.ntotal == 8
+    assert vs.template_counts()["a"] == 3
+
+    student_ids, distances = vs.search_batch(vecs[[1, 3]], k=3)
+    assert student_ids[0, 0] == "a" and distances[0, 0] < 1e-4
+    assert student_ids[1, 0] == "b"
+    # Each student appears at most once per row
+    for row in student_ids:
+        assert len(set(row)) == 3
+
+
+def test_centroid_aggregation_scores_mean_template(tmp_path):
+    vecs = unit_vectors(3)
+    query = vecs[0]
+    for aggregation in ("max", "centroid"):
+        vs = _templated_index(tmp_path / aggregation, aggregation)
+        vs.add_templates("a", vecs[[0, 1]])
+        student_ids, distances = vs.search_batch(query, k=1)
+
+        centroid = vecs[[0, 1]].mean(axis=0)
+        centroid /= np.linalg.norm(centroid)
+        expected = 0.0 if aggregation == "max" else 2 - 2 * float(query @ centroid)
+        assert student_ids[0, 0] == "a"
+        assert np.isclose(distances[0, 0], expected, atol=1e-4)
+
+
+def test_add_templates_replaces_template_set(tmp_path):
+    vs = _templated_index(tmp_path, "max")
+    vecs = unit_vectors(6)
+    vs.add_templates("a", vecs[:3], section_id="S1")
+    vs.add_templates("a", vecs[3:5], section_id="S1")
+
+    assert vs.index.ntotal == 2
+    assert vs.search(vecs[0])[0][1] > 0.5
+    assert vs.search_batch(vecs[4], section_id="S1")[0][0, 0] == "a"
+
+    reloaded = _templated_index(tmp_path, "max")
+    assert reloaded.template_counts() == {"a": 2}
+    assert reloaded.remove_vectors(["a"]) == 1
+    assert reloaded.index.ntotal == 0
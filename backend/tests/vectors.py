@@ -0,0 +1,12 @@
+"""
+Deterministic test embeddings shaped like the face model's output.
+"""
+import numpy as np
+
+
+def unit_vectors(n, seed=0, dimension=512):
+    """
+    (n, dimension) float32 rows of unit length, the same for the same seed.
+    """
+    vecs = np.random.default_rng(seed).standard_normal((n, dimension)).astype('float32')
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)